@@ -8,9 +8,11 @@ from app.core.config import settings
 from app.db.base import Base
 from app.models.user import User
 from app.models.link import Link
-from app.models.analytics import ClickEvent
+from app.models.analytics import ClickEvent, LinkDailyClicks, LinkDimensionClicks
 from app.models.campaign import Campaign
 from app.models.audit import AuditLog
+from app.models.link_change import LinkChange
+from app.models.refresh_token import RefreshToken
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,54 @@
+"""add_hot_query_indexes
+
+Revision ID: a4c7e2f9b3d6
+Revises: f7a3c9d2e8b1
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c7e2f9b3d6'
+down_revision: Union[str, Sequence[str], None] = 'f7a3c9d2e8b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The composites lead with the columns the single-column indexes covered, which they replace
+    op.create_index('ix_click_events_link_id_timestamp', 'click_events', ['link_id', 'timestamp'], unique=False)
+    op.drop_index('ix_click_events_link_id', table_name='click_events')
+    # Without it a link's pending rows are found by walking all of its events
+    op.create_index(
+        'ix_click_events_pending_link', 'click_events', ['link_id', 'id'], unique=False,
+        sqlite_where=sa.text('enriched = 0'), postgresql_where=sa.text('NOT enriched'),
+    )
+
+    op.create_index(
+        'ix_links_owner_created_live', 'links', ['owner_id', 'created_at'], unique=False,
+        sqlite_where=sa.text('is_deleted = 0'), postgresql_where=sa.text('NOT is_deleted'),
+    )
+
+    op.create_index('ix_audit_logs_user_id_timestamp', 'audit_logs', ['user_id', 'timestamp'], unique=False)
+    op.create_index('ix_audit_logs_action_timestamp', 'audit_logs', ['action', 'timestamp'], unique=False)
+    op.drop_index('ix_audit_logs_user_id', table_name='audit_logs')
+    op.drop_index('ix_audit_logs_action', table_name='audit_logs')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_audit_logs_action', 'audit_logs', ['action'], unique=False)
+    op.create_index('ix_audit_logs_user_id', 'audit_logs', ['user_id'], unique=False)
+    op.drop_index('ix_audit_logs_action_timestamp', table_name='audit_logs')
+    op.drop_index('ix_audit_logs_user_id_timestamp', table_name='audit_logs')
+
+    op.drop_index('ix_links_owner_created_live', table_name='links')
+
+    op.drop_index('ix_click_events_pending_link', table_name='click_events')
+    op.create_index('ix_click_events_link_id', 'click_events', ['link_id'], unique=False)
+    op.drop_index('ix_click_events_link_id_timestamp', table_name='click_events')
@@ -0,0 +1,44 @@
+"""add_click_rollup_tables
+
+Revision ID: b7c1e9d2f4a8
+Revises: 23c980b95413
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c1e9d2f4a8'
+down_revision: Union[str, Sequence[str], None] = '23c980b95413'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('link_daily_clicks',
+        sa.Column('link_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('clicks', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['link_id'], ['links.id'], ),
+        sa.PrimaryKeyConstraint('link_id', 'day')
+    )
+    op.create_table('link_dimension_clicks',
+        sa.Column('link_id', sa.Integer(), nullable=False),
+        sa.Column('dimension', sa.String(), nullable=False),
+        sa.Column('value', sa.String(), nullable=False),
+        sa.Column('clicks', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['link_id'], ['links.id'], ),
+        sa.PrimaryKeyConstraint('link_id', 'dimension', 'value')
+    )
+    # Existing events are rolled up with `python -m app.cli.rollups backfill`
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('link_dimension_clicks')
+    op.drop_table('link_daily_clicks')
@@ -0,0 +1,46 @@
+"""add_campaign_indexes
+
+Revision ID: b8d1f5a3c7e9
+Revises: a4c7e2f9b3d6
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d1f5a3c7e9'
+down_revision: Union[str, Sequence[str], None] = 'a4c7e2f9b3d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (index, table, columns)
+INDEXES = [
+    ('ix_campaigns_owner_id', 'campaigns', ['owner_id']),
+    ('ix_links_campaign_created', 'links', ['campaign_id', 'created_at']),
+]
+
+
+def _existing(indexes):
+    # e7a3075d62bf left the campaigns table and links.campaign_id to be created by hand,
+    # so a database built from the migrations alone may not have them
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for index, table, columns in indexes:
+        if table in tables and columns[0] in {c['name'] for c in inspector.get_columns(table)}:
+            yield index, table, columns
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for index, table, columns in list(_existing(INDEXES)):
+        op.create_index(index, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for index, table, _ in list(_existing(INDEXES)):
+        op.drop_index(index, table_name=table)
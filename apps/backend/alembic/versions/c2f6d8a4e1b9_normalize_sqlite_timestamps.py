@@ -0,0 +1,64 @@
+"""normalize_sqlite_timestamps
+
+Revision ID: c2f6d8a4e1b9
+Revises: b8d1f5a3c7e9
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.functions import SQLITE_UTCNOW
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2f6d8a4e1b9'
+down_revision: Union[str, Sequence[str], None] = 'b8d1f5a3c7e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, column) defaulting to the current time
+COLUMNS = [
+    ('links', 'created_at'),
+    ('campaigns', 'created_at'),
+    ('click_events', 'timestamp'),
+    ('audit_logs', 'timestamp'),
+    ('link_changes', 'created_at'),
+]
+
+
+def _existing():
+    # Like b8d1f5a3c7e9: campaigns may not have been created by the migrations
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    return [(table, column) for table, column in COLUMNS if table in tables]
+
+
+def _set_default(default: str) -> None:
+    for table, column in _existing():
+        # SQLite can't change a column's default in place
+        # and the rebuilt table doesn't carry AUTOINCREMENT over unless told (d9e2a7b4c1f3)
+        table_kwargs = {'sqlite_autoincrement': True} if table == 'link_changes' else {}
+        with op.batch_alter_table(table, table_kwargs=table_kwargs) as batch_op:
+            batch_op.alter_column(column, existing_type=sa.DateTime(timezone=True), server_default=sa.text(default))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # PostgreSQL stores real timestamps; only SQLite's text needs one form
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table, column in _existing():
+        # CURRENT_TIMESTAMP's 'YYYY-MM-DD HH:MM:SS' in SQLAlchemy's form
+        op.execute(f"UPDATE {table} SET {column} = {column} || '.000000' WHERE length({column}) = 19")
+    _set_default(SQLITE_UTCNOW)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    # The rewritten values stay: SQLAlchemy reads both forms
+    _set_default('(CURRENT_TIMESTAMP)')
@@ -0,0 +1,67 @@
+"""add_redirect_url_to_links
+
+Revision ID: c3d8f1a2b6e4
+Revises: b7c1e9d2f4a8
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+from urllib.parse import urlencode, urlparse, parse_qs, urlunparse
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d8f1a2b6e4'
+down_revision: Union[str, Sequence[str], None] = 'b7c1e9d2f4a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+UTM_FIELDS = ("utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content")
+
+
+def _redirect_url(row) -> str:
+    # Frozen copy of app.crud.link.build_redirect_url as of this revision
+    utm_params = {field: getattr(row, field) for field in UTM_FIELDS if getattr(row, field)}
+    if not utm_params:
+        return row.original_url
+    parsed = urlparse(row.original_url)
+    existing_params = parse_qs(parsed.query, keep_blank_values=True)
+    existing_params.update({k: [v] for k, v in utm_params.items()})
+    new_query = urlencode({k: v[0] for k, v in existing_params.items()})
+    return urlunparse(parsed._replace(query=new_query))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('links', sa.Column('redirect_url', sa.String(), nullable=True))
+
+    # Backfill in id-ordered batches so large tables aren't loaded (or locked) all at once
+    links = sa.table(
+        'links',
+        sa.column('id', sa.Integer), sa.column('original_url', sa.String), sa.column('redirect_url', sa.String),
+        *(sa.column(field, sa.String) for field in UTM_FIELDS),
+    )
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(links.c.id, links.c.original_url, *(links.c[field] for field in UTM_FIELDS))
+            .where(links.c.id > last_id)
+            .order_by(links.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            links.update().where(links.c.id == sa.bindparam('b_id')).values(redirect_url=sa.bindparam('b_url')),
+            [{"b_id": row.id, "b_url": _redirect_url(row)} for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('links', 'redirect_url')
@@ -0,0 +1,41 @@
+"""add_refresh_tokens_table
+
+Revision ID: d4a8e3c6f2b5
+Revises: c2f6d8a4e1b9
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.functions import utcnow
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8e3c6f2b5'
+down_revision: Union[str, Sequence[str], None] = 'c2f6d8a4e1b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('refresh_tokens',
+        sa.Column('jti', sa.String(), nullable=False),
+        sa.Column('keyn_id', sa.String(), nullable=False),
+        sa.Column('keyn_token', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=utcnow(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('jti')
+    )
+    op.create_index(op.f('ix_refresh_tokens_keyn_id'), 'refresh_tokens', ['keyn_id'], unique=False)
+    op.create_index(op.f('ix_refresh_tokens_expires_at'), 'refresh_tokens', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_refresh_tokens_expires_at'), table_name='refresh_tokens')
+    op.drop_index(op.f('ix_refresh_tokens_keyn_id'), table_name='refresh_tokens')
+    op.drop_table('refresh_tokens')
@@ -0,0 +1,39 @@
+"""add_link_changes_table
+
+Revision ID: d9e2a7b4c1f3
+Revises: c3d8f1a2b6e4
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9e2a7b4c1f3'
+down_revision: Union[str, Sequence[str], None] = 'c3d8f1a2b6e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('link_changes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('origin', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        # Never reuse ids (SERIAL's sequence doesn't on PostgreSQL)
+        sqlite_autoincrement=True,
+    )
+    op.create_index(op.f('ix_link_changes_created_at'), 'link_changes', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_link_changes_created_at'), table_name='link_changes')
+    op.drop_table('link_changes')
@@ -0,0 +1,36 @@
+"""add_enriched_to_click_events
+
+Revision ID: e1f4b8c2d7a5
+Revises: d9e2a7b4c1f3
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1f4b8c2d7a5'
+down_revision: Union[str, Sequence[str], None] = 'd9e2a7b4c1f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing events were enriched when they were written
+    op.add_column('click_events', sa.Column('enriched', sa.Boolean(), server_default=sa.true(), nullable=False))
+    op.create_index(
+        'ix_click_events_pending', 'click_events', ['id'], unique=False,
+        sqlite_where=sa.text('enriched = 0'), postgresql_where=sa.text('NOT enriched'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_click_events_pending', table_name='click_events')
+    # SQLite can't drop a column in place
+    with op.batch_alter_table('click_events') as batch_op:
+        batch_op.drop_column('enriched')
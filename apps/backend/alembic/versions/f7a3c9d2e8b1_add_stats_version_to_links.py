@@ -0,0 +1,30 @@
+"""add_stats_version_to_links
+
+Revision ID: f7a3c9d2e8b1
+Revises: e1f4b8c2d7a5
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a3c9d2e8b1'
+down_revision: Union[str, Sequence[str], None] = 'e1f4b8c2d7a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('links', sa.Column('stats_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # SQLite can't drop a column in place
+    with op.batch_alter_table('links') as batch_op:
+        batch_op.drop_column('stats_version')
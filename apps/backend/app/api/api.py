@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.endpoints import auth, links, users, verify, campaigns, export, audit
+from app.api.endpoints import auth, links, users, verify, campaigns, export, audit, metrics, snapshot
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
@@ -9,3 +9,5 @@ api_router.include_router(verify.router, prefix="/verify", tags=["verify"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(export.router, prefix="/export", tags=["export"])
 api_router.include_router(audit.router, prefix="/audit", tags=["audit"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
+api_router.include_router(snapshot.router, prefix="/snapshot", tags=["snapshot"])
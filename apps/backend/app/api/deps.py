@@ -1,36 +1,77 @@
+import hashlib
 from typing import Generator, Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-import requests
 
+from app.core import security
+from app.core.http import keyn
 from app.core.config import settings
 from app.db.session import get_db
 from app.models.user import User
-from app.crud.user import get_user_by_keyn_id
+from app.crud.user import get_cached_user_by_keyn_id
+from app.utils import pagination
+from app.utils.cache import LRUCache, SingleFlight
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
-def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> User:
-    # Validate token with KeyN
-    user_info_url = f"{settings.KEYN_AUTH_URL}/api/user-scoped"
+# KeyN introspection results keyed by a hash of the token (raw tokens are never kept)
+keyn_token_cache = LRUCache(maxsize=settings.KEYN_TOKEN_CACHE_SIZE, ttl=settings.KEYN_TOKEN_CACHE_TTL)
+keyn_negative_cache = LRUCache(maxsize=settings.KEYN_TOKEN_CACHE_SIZE, ttl=settings.KEYN_NEGATIVE_CACHE_TTL)
+keyn_single_flight = SingleFlight()
+
+class KeyNTokenRejected(HTTPException):
+    """KeyN answered 401 for the token, as opposed to KeyN being unreachable or erroring."""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def fetch_keyn_user_info(token: str, use_cache: bool = True) -> dict:
+    """
+    Asks KeyN who a KeyN access token belongs to.
+    Only used at login/refresh and for legacy KeyN bearer tokens.
+
+    Results are cached per token hash (401s in a short negative cache), and
+    concurrent requests carrying the same token share one upstream call.
+    Pass use_cache=False to force a fresh check (e.g. on refresh).
+    """
+    key = _token_key(token)
+    if use_cache:
+        user_data = keyn_token_cache.get(key)
+        if user_data is not None:
+            return user_data
+        if key in keyn_negative_cache:
+            raise KeyNTokenRejected()
+
+    try:
+        user_data = keyn_single_flight.do(key, _introspect_keyn_token, token)
+    except KeyNTokenRejected:
+        keyn_negative_cache.set(key, True)
+        raise
+    keyn_token_cache.set(key, user_data)
+    keyn_negative_cache.invalidate(key)
+    return user_data
+
+def _introspect_keyn_token(token: str) -> dict:
     headers = {"Authorization": f"Bearer {token}"}
     
     try:
-        # Verify token and get user info from KeyN
-        res = requests.get(user_info_url, headers=headers)
+        # Verify token and get user info from KeyN (fails fast while KeyN's circuit is open)
+        res = keyn.get("/api/user-scoped", headers=headers)
         if res.status_code == 401:
-             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+            raise KeyNTokenRejected()
         res.raise_for_status()
-        user_data = res.json()
+        return res.json()
+    except HTTPException:
+        raise
     except Exception as e:
         # Fallback/Error handling
         raise HTTPException(
@@ -39,9 +80,29 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+def get_current_user(
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+) -> User:
+    if security.is_nololink_token(token):
+        # Self-issued access token: validated locally, no KeyN round trip
+        try:
+            claims = security.decode_token(token, security.ACCESS)
+        except security.TokenError as e:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail=str(e),
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        keyn_id = claims["sub"]
+    else:
+        # Legacy: a raw KeyN token (issued before NoloLink minted its own)
+        user_data = fetch_keyn_user_info(token)
+        keyn_id = str(user_data["id"])
+
     # Validate that this KeyN user exists in our local DB
     # (They should have been created during the callback flow)
-    user = get_user_by_keyn_id(db, keyn_id=str(user_data["id"]))
+    user = get_cached_user_by_keyn_id(db, keyn_id=keyn_id)
     
     if not user:
         # Secure fallback: if user has a valid token but isn't in DB, maybe create them?
@@ -83,3 +144,19 @@ def get_current_active_user_optional(
     if current_user and not current_user.is_active:
         return None
     return current_user
+
+def page_cursor(*types: type):
+    """
+    Dependency for a list endpoint's `cursor` query parameter: the decoded
+    sort key (see app.utils.pagination), or None for the first page.
+    """
+    def dependency(
+        cursor: Optional[str] = Query(None, description=f"{pagination.NEXT_CURSOR_HEADER} of the previous page"),
+    ) -> Optional[list]:
+        if cursor is None:
+            return None
+        try:
+            return pagination.decode_cursor(cursor, *types)
+        except pagination.InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return dependency
@@ -1,5 +1,6 @@
+from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.orm import Session
 
 from app.db.session import get_db
@@ -8,22 +9,26 @@ from app.schemas.audit import AuditLog as AuditLogSchema
 from app.api import deps
 from app.models.user import User
 from app.crud import user as crud_user
+from app.utils import pagination
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[AuditLogSchema])
 def get_audit_logs(
+    response: Response,
     action: Optional[str] = Query(None, description="Filter by action: create, update, delete"),
     target_type: Optional[str] = Query(None, description="Filter by target: link, campaign"),
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[list] = Depends(deps.page_cursor(datetime, int)),
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_active_user),
 ):
     """
-    Get audit logs. Regular users see only their own logs.
-    Admins see all logs.
+    Get audit logs, newest first. Regular users see only their own logs.
+    Admins see all logs. A full page carries the cursor for the next one
+    in X-Next-Cursor.
     """
     user_id_filter = None if current_user.is_superuser else current_user.id
 
@@ -34,7 +39,11 @@ def get_audit_logs(
         target_type=target_type,
         skip=skip,
         limit=limit,
+        cursor=cursor,
     )
+    token = pagination.next_cursor(logs, limit, "timestamp", "id")
+    if token:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = token
 
     # Enrich with usernames
     user_cache = {}
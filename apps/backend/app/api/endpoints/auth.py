@@ -1,14 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
-import requests
 import secrets
 from urllib.parse import urlencode
 
+from app.api import deps
+from app.core import security
 from app.core.config import settings
+from app.core.http import keyn
 from app.db.session import get_db
 from app.crud import user as crud_user
+from app.crud import refresh_token as crud_refresh_token
 from app.schemas import user as user_schema
+from app.schemas.token import Token, TokenRefresh
 
 router = APIRouter()
 
@@ -32,7 +36,6 @@ def login(request: Request):
 @router.get("/callback")
 def callback(code: str, state: str, db: Session = Depends(get_db)):
     # 1. Exchange code for token
-    token_url = f"{settings.KEYN_AUTH_URL}/oauth/token"
     token_data = {
         "grant_type": "authorization_code",
         "code": code,
@@ -42,7 +45,8 @@ def callback(code: str, state: str, db: Session = Depends(get_db)):
     }
     
     try:
-        token_res = requests.post(token_url, data=token_data)
+        # Not retried: an authorization code can only be redeemed once
+        token_res = keyn.post("/oauth/token", data=token_data)
         token_res.raise_for_status()
         token_json = token_res.json()
         access_token = token_json["access_token"]
@@ -50,11 +54,10 @@ def callback(code: str, state: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail=f"Failed to exchange token: {str(e)}")
 
     # 2. Get user info
-    user_info_url = f"{settings.KEYN_AUTH_URL}/api/user-scoped"
     headers = {"Authorization": f"Bearer {access_token}"}
     
     try:
-        user_res = requests.get(user_info_url, headers=headers)
+        user_res = keyn.get("/api/user-scoped", headers=headers)
         user_res.raise_for_status()
         user_data = user_res.json()
     except Exception as e:
@@ -78,11 +81,53 @@ def callback(code: str, state: str, db: Session = Depends(get_db)):
     else:
         db_user = crud_user.create_user(db, user_in)
 
-    # 4. Create Session/Token for Frontend (simplified for MVP)
-    # For now, redirect to frontend with access_token or a session cookie
-    # Ideally, issue our own JWT. For MVP speed, passing the existing data might be enough or just a simple cookie.
-    # Let's redirect to frontend with the raw token for now (NOT SECURE FOR PROD, but okay for checking flow).
-    # TODO: Implement proper JWT issuance.
-    
-    frontend_url = f"{settings.FRONTEND_URL}?token={access_token}&username={db_user.username}"
+    # 4. Issue our own short-lived access token (validated locally on every request)
+    # plus a refresh token; KeyN is only consulted again at refresh time.
+    params = {
+        "token": security.create_access_token(db_user.keyn_id),
+        "refresh_token": crud_refresh_token.issue_refresh_token(db, db_user.keyn_id, access_token),
+        "username": db_user.username,
+    }
+    frontend_url = f"{settings.FRONTEND_URL}?{urlencode(params)}"
     return RedirectResponse(frontend_url)
+
+def _refresh_claims(refresh_token: str) -> dict:
+    try:
+        return security.decode_token(refresh_token, security.REFRESH)
+    except security.TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+@router.post("/refresh", response_model=Token)
+def refresh(token_in: TokenRefresh, db: Session = Depends(get_db)):
+    """
+    Exchange a refresh token for a new access token and a new refresh token;
+    the one presented stops working. Re-checks the KeyN session (kept
+    server-side), so revoking it at KeyN stops refreshes.
+    """
+    stored = crud_refresh_token.get_refresh_token(db, _refresh_claims(token_in.refresh_token))
+    if stored is None:
+        raise HTTPException(status_code=401, detail="Refresh token revoked")
+
+    user_data = deps.fetch_keyn_user_info(stored.keyn_token, use_cache=False)
+    if str(user_data["id"]) != stored.keyn_id:
+        raise HTTPException(status_code=401, detail="Refresh token does not match KeyN session")
+
+    user = crud_user.get_user_by_keyn_id(db, keyn_id=stored.keyn_id)
+    if not user or not user.is_active:
+        raise HTTPException(status_code=401, detail="User not found or inactive")
+
+    refresh_token = crud_refresh_token.rotate_refresh_token(db, stored)
+    if refresh_token is None:
+        # A concurrent refresh with the same token got there first
+        raise HTTPException(status_code=401, detail="Refresh token revoked")
+    return Token(
+        access_token=security.create_access_token(user.keyn_id),
+        refresh_token=refresh_token,
+        expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    )
+
+@router.post("/logout", status_code=204)
+def logout(token_in: TokenRefresh, db: Session = Depends(get_db)):
+    """Revoke a refresh token (again is fine). Access tokens already issued run out on their own."""
+    claims = _refresh_claims(token_in.refresh_token)
+    crud_refresh_token.revoke_refresh_token(db, claims.get("jti") or "")
@@ -1,13 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.db.session import get_db
 from app.crud import campaign as crud_campaign
 from app.crud import audit as crud_audit
 from app.schemas.campaign import Campaign, CampaignCreate, CampaignUpdate
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, page_cursor
 from app.models.user import User
+from app.utils import pagination
 
 router = APIRouter()
 
@@ -27,12 +28,18 @@ def create_campaign(
 
 @router.get("/", response_model=List[Campaign])
 def read_campaigns(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[list] = Depends(page_cursor(int)),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    return crud_campaign.get_campaigns(db, owner_id=current_user.id, skip=skip, limit=limit)
+    campaigns = crud_campaign.get_campaigns(db, owner_id=current_user.id, skip=skip, limit=limit, cursor=cursor)
+    token = pagination.next_cursor(campaigns, limit, "id")
+    if token:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = token
+    return campaigns
 
 @router.get("/{campaign_id}", response_model=Campaign)
 def read_campaign(
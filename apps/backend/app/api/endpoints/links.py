@@ -1,6 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.db.session import get_db
 from app.crud import link as crud_link
@@ -8,25 +11,36 @@ from app.crud import audit as crud_audit
 from app.schemas import link as link_schema
 from app.api import deps
 from app.models.user import User
+from app.utils import pagination, stats_cache
+from app.utils.http_cache import is_not_modified
 
 router = APIRouter()
 
 @router.get("/", response_model=List[link_schema.Link])
 def read_links(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
     search: str = None,
     campaign_id: int = None,
     is_active: bool = None,
+    cursor: Optional[list] = Depends(deps.page_cursor(datetime, int)),
     db: Session = Depends(get_db), 
     current_user: User = Depends(deps.get_current_active_user)
 ):
+    """Newest first. A full page carries the cursor for the next one in X-Next-Cursor."""
     filters = {
         "search": search,
         "campaign_id": campaign_id,
         "is_active": is_active
     }
-    return crud_link.get_links(db, owner_id=current_user.id, skip=skip, limit=limit, filters=filters)
+    links = crud_link.get_links(
+        db, owner_id=current_user.id, skip=skip, limit=limit, filters=filters, cursor=cursor
+    )
+    token = pagination.next_cursor(links, limit, "created_at", "id")
+    if token:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = token
+    return links
 
 @router.post("/", response_model=link_schema.Link)
 def create_link(
@@ -169,6 +183,7 @@ def delete_link(
 @router.get("/{short_code}/stats", response_model=link_schema.Link)
 def get_link_stats(
     short_code: str,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_active_user)
 ):
@@ -180,51 +195,15 @@ def get_link_stats(
     if link.owner_id != current_user.id and not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Not authorized to view stats for this link")
     
-    # Aggregate Stats
-    from sqlalchemy import func
-    from app.models.analytics import ClickEvent
-    from datetime import datetime, timedelta
-
-    # 1. Clicks Over Time (Last 30 Days)
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    clicks_over_time_query = db.query(
-        func.date(ClickEvent.timestamp).label('date'),
-        func.count(ClickEvent.id).label('count')
-    ).filter(
-        ClickEvent.link_id == link.id,
-        ClickEvent.timestamp >= thirty_days_ago
-    ).group_by('date').all()
-    
-    link.clicks_over_time = [{"date": str(row.date), "count": row.count} for row in clicks_over_time_query]
-
-    # 2. Top Countries
-    top_countries_query = db.query(
-        ClickEvent.country_code,
-        func.count(ClickEvent.id).label('count')
-    ).filter(
-        ClickEvent.link_id == link.id
-    ).group_by(ClickEvent.country_code).order_by(func.count(ClickEvent.id).desc()).limit(10).all()
-    
-    link.top_countries = [{"country": row.country_code or "Unknown", "count": row.count} for row in top_countries_query]
-
-    # 3. Top Referrers
-    top_referrers_query = db.query(
-        ClickEvent.referrer,
-        func.count(ClickEvent.id).label('count')
-    ).filter(
-        ClickEvent.link_id == link.id
-    ).group_by(ClickEvent.referrer).order_by(func.count(ClickEvent.id).desc()).limit(10).all()
-    
-    link.top_referrers = [{"referrer": row.referrer or "Direct", "count": row.count} for row in top_referrers_query]
-
-    # 4. Device Breakdown
-    device_breakdown_query = db.query(
-        ClickEvent.device_type,
-        func.count(ClickEvent.id).label('count')
-    ).filter(
-        ClickEvent.link_id == link.id
-    ).group_by(ClickEvent.device_type).all()
-    
-    link.device_breakdown = [{"device": row.device_type or "Unknown", "count": row.count} for row in device_breakdown_query]
-        
-    return link
+    # Aggregate Stats (read from the rollup tables, cached per stats version; see app.utils.stats_cache)
+    for name, value in stats_cache.get_link_stats(db, link).items():
+        setattr(link, name, value)
+
+    response = JSONResponse(jsonable_encoder(link_schema.Link.model_validate(link)))
+    etag = stats_cache.etag_for(response.body)
+    # Owner-only data: browsers may keep it, but must revalidate on every refresh
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if is_not_modified(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return response
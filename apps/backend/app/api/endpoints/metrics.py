@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends
+
+from app.api import deps
+from app.core.config import settings
+from app.core.http import http_client
+from app.crud.user import user_cache
+from app.models.user import User
+from app.utils.link_cache import redirect_cache, missing_codes
+from app.utils.code_filter import short_code_filter
+from app.utils.redirect_index import redirect_index
+from app.utils import http_cache
+from app.utils.invalidation import invalidation_bus
+from app.utils.click_counter import click_counter
+from app.utils.analytics import click_queue, click_spool, user_agent_cache
+from app.utils.enrichment import click_enricher
+from app.utils.stats_cache import stats_cache, stats_single_flight
+
+router = APIRouter()
+
+
+@router.get("/")
+def read_metrics(
+    current_user: User = Depends(deps.get_current_active_superuser),
+):
+    """
+    In-process runtime metrics for this worker (admin only).
+    """
+    return {
+        "redirect_cache": redirect_cache.stats(),
+        "short_code_filter": short_code_filter.stats(),
+        "missing_code_cache": missing_codes.stats(),
+        "redirect_index": redirect_index.stats(),
+        "click_counter": click_counter.stats(),
+        "click_queue": click_queue.stats(),
+        "click_spool": click_spool.stats() if settings.CLICK_INGEST == "spool" else None,
+        "click_enricher": click_enricher.stats(),
+        "stats_cache": stats_cache.stats(),
+        "stats_single_flight": stats_single_flight.stats(),
+        "user_agent_cache": user_agent_cache.stats(),
+        "keyn_token_cache": deps.keyn_token_cache.stats(),
+        "keyn_negative_cache": deps.keyn_negative_cache.stats(),
+        "keyn_single_flight": deps.keyn_single_flight.stats(),
+        "user_cache": user_cache.stats(),
+        "upstreams": http_client.stats(),
+        "invalidation": invalidation_bus.stats(),
+        "cdn_purge": http_cache.purge_hook.stats(),
+    }
@@ -1,68 +1,94 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
-from app.db.session import get_db
+import logging
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_async_db
 from app.crud import link as crud_link
-from app.crud.link import build_redirect_url
-from datetime import datetime
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 from app.core.config import settings
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from app.utils.analytics import capture_click
+from app.utils.analytics import capture_click, capture_may_block
+from app.utils.http_cache import NO_STORE, is_not_modified, redirect_headers
+from app.utils.link_cache import RedirectEntry
 
 @router.get("/{short_code}")
-def redirect_to_url(short_code: str, request: Request, db: Session = Depends(get_db)):
-    print(f"DEBUG: Redirecting short_code='{short_code}'")
+async def redirect_to_url(short_code: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    # Runs on the event loop: the lookup goes through the async engine and
+    # everything else on this path is in-memory, so no threadpool slot is held.
     # Check for stats request (glory to the +)
     if short_code.endswith("+"):
         real_code = short_code[:-1]
         # Redirect to Frontend Stats Page
         # The frontend will handle auth check and redirect back here if needed
-        return RedirectResponse(f"{settings.FRONTEND_URL}/stats/{real_code}", status_code=status.HTTP_302_FOUND)
+        return RedirectResponse(
+            f"{settings.FRONTEND_URL}/stats/{real_code}",
+            status_code=status.HTTP_302_FOUND,
+            headers={"Cache-Control": NO_STORE},
+        )
 
     # Check for favico or common browser requests to ignore
     if short_code == "favicon.ico":
         raise HTTPException(status_code=404)
         
-    link = crud_link.get_link_by_code(db, short_code=short_code)
+    # Served from the redirect cache when warm; the session is only used on a miss
+    link = await crud_link.get_redirect_entry_async(db, short_code=short_code)
+    location, status_code, counted = resolve_target(short_code, link)
+    if counted:
+        await record_click(link, request)
+    headers = redirect_headers(link, status_code, counted)
+    if is_not_modified(request.headers.get("if-none-match"), headers.get("ETag")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return RedirectResponse(location, status_code=status_code, headers=headers)
+
+
+def resolve_target(short_code: str, link: Optional[RedirectEntry]) -> Tuple[str, int, bool]:
+    """
+    Decides where a resolved short code sends the visitor.
+    Returns (location, status code, whether the visit counts as a click).
+    Shared by the route above and the ASGI fast path.
+    """
     if not link:
         # Redirect to frontend 404 page
-        return RedirectResponse(f"{settings.FRONTEND_URL}/404", status_code=status.HTTP_302_FOUND)
+        return f"{settings.FRONTEND_URL}/404", status.HTTP_302_FOUND, False
     
     if not link.is_active:
-         return RedirectResponse(f"{settings.FRONTEND_URL}/error?type=disabled", status_code=status.HTTP_302_FOUND)
-
+         return f"{settings.FRONTEND_URL}/error?type=disabled", status.HTTP_302_FOUND, False
 
-
-    if link.expires_at and link.expires_at.replace(tzinfo=None) < datetime.utcnow():
-         return RedirectResponse(f"{settings.FRONTEND_URL}/error?type=expired", status_code=status.HTTP_302_FOUND)
+    if link.is_expired():
+         return f"{settings.FRONTEND_URL}/error?type=expired", status.HTTP_302_FOUND, False
 
     # Build verification params
     verify_params = []
-    if link.password_hash:
+    if link.requires_password:
         verify_params.append("pwd=1")
     if link.require_login:
         verify_params.append("login=1")
 
     if verify_params:
         query_string = "&".join(verify_params)
-        return RedirectResponse(
-            f"{settings.FRONTEND_URL}/verify/{short_code}?{query_string}", 
-            status_code=status.HTTP_302_FOUND
-        )
+        return f"{settings.FRONTEND_URL}/verify/{short_code}?{query_string}", status.HTTP_302_FOUND, False
 
-    # Increment statistics (async task in prod)
-    crud_link.increment_clicks(db, link)
+    # Destination already has UTM parameters applied
+    return link.destination, link.redirect_type, True
+
+
+async def record_click(link: RedirectEntry, request: Request):
+    # Increment statistics (buffered, flushed in batches)
+    crud_link.increment_clicks(link.id)
 
     # Capture detailed analytics
-    try:
-        capture_click(db, link, request)
-    except Exception as e:
-        print(f"Error capturing click analytics: {e}")
-    
-    # Build final redirect URL with UTM parameters appended
-    redirect_url = build_redirect_url(link)
-    return RedirectResponse(redirect_url, status_code=link.redirect_type or 302)
+    if link.track_activity:
+        try:
+            if capture_may_block():
+                # A full queue or an fsync may make the producer wait; keep that off the event loop
+                await run_in_threadpool(capture_click, link, request)
+            else:
+                capture_click(link, request)
+        except Exception:
+            logger.exception("Error capturing click analytics for link %s", link.id)
@@ -0,0 +1,48 @@
+import os
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from app.api import deps
+from app.core.config import settings
+from app.db.session import get_db
+from app.models.user import User
+from app.utils.snapshot import FILENAMES, FORMATS, build_snapshot
+
+router = APIRouter()
+
+MEDIA_TYPES = {"tsv": "text/tab-separated-values", "nginx": "text/plain", "json": "application/json"}
+
+
+@router.post("/")
+def rebuild_snapshot(
+    full: bool = Query(False, description="Rebuild from scratch instead of applying changes since the last build"),
+    formats: Optional[List[str]] = Query(None, description="tsv, nginx, json (default: all)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_superuser),
+):
+    """
+    Recompile the static redirect snapshot (admin only).
+    """
+    try:
+        return build_snapshot(db, formats=formats or FORMATS, full=full)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/{fmt}")
+def download_snapshot(
+    fmt: str,
+    current_user: User = Depends(deps.get_current_active_superuser),
+):
+    """
+    Download the current snapshot artifact in the given format (admin only).
+    """
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=404, detail="Unknown snapshot format")
+    path = os.path.join(settings.SNAPSHOT_DIR, FILENAMES[fmt])
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Snapshot not built yet")
+    return FileResponse(path, media_type=MEDIA_TYPES[fmt], filename=FILENAMES[fmt])
@@ -99,7 +99,7 @@ def verify_link_access(
         raise HTTPException(status_code=403, detail="Access denied")
 
     # Increment statistics
-    crud_link.increment_clicks(db, link)
+    crud_link.increment_clicks(link.id)
 
     print(f"VERIFY SUCCESS: {short_code} -> {link.original_url}")
     return {"original_url": link.original_url}
@@ -0,0 +1,100 @@
+"""
+Raw ASGI fast path for short-code redirects.
+
+Sits in front of the FastAPI app and answers `GET /<code>` itself: reserved
+names are served statically, codes are resolved from the redirect cache,
+the memory-mapped redirect index (when configured) or a single Core query,
+and the 30x is written straight to the ASGI `send`, with no routing sweep,
+dependency injection or Response objects. Any other request is passed
+through untouched.
+"""
+from urllib.parse import quote
+
+from starlette.requests import Request
+
+from app.api.endpoints.redirect import record_click, resolve_target
+from app.core.config import settings
+from app.crud import link as crud_link
+from app.db.session import get_async_db
+from app.utils.http_cache import NO_STORE, is_not_modified, redirect_headers
+
+# Answered without a lookup: (status, content type, body)
+STATIC_RESPONSES = {
+    "favicon.ico": (404, b"text/plain", b""),
+    "robots.txt": (200, b"text/plain; charset=utf-8", b"User-agent: *\nDisallow: /api/\n"),
+}
+
+# Characters RedirectResponse leaves unescaped in the Location header
+_LOCATION_SAFE = ":/%#?=@[]!$&'()*+,;"
+
+
+class FastRedirectMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._reserved = None
+
+    def _reserved_names(self, scope) -> set:
+        # Single-segment routes the app itself serves (/docs, /redoc, /openapi.json, ...)
+        if self._reserved is None:
+            reserved = {"api"}
+            for route in getattr(scope.get("app"), "routes", []):
+                path = getattr(route, "path", "")
+                if "{" not in path and path.count("/") == 1:
+                    reserved.add(path[1:])
+            self._reserved = reserved
+        return self._reserved
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return await self.app(scope, receive, send)
+        code = scope["path"][1:]
+        if not code or "/" in code or code in self._reserved_names(scope):
+            return await self.app(scope, receive, send)
+
+        static = STATIC_RESPONSES.get(code)
+        if static is not None:
+            return await _respond(send, scope, static[0], [(b"content-type", static[1])], static[2])
+
+        if code.endswith("+"):
+            # Stats page for the code (glory to the +)
+            location, status_code = f"{settings.FRONTEND_URL}/stats/{code[:-1]}", 302
+            cache_headers = {"Cache-Control": NO_STORE}
+        else:
+            answered, entry = crud_link.lookup_redirect_entry(code)
+            if not answered:
+                entry = await _lookup(scope, code)
+            location, status_code, counted = resolve_target(code, entry)
+            if counted:
+                await record_click(entry, Request(scope))
+            cache_headers = redirect_headers(entry, status_code, counted)
+
+        headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in cache_headers.items()]
+        if is_not_modified(_header(scope, b"if-none-match"), cache_headers.get("ETag")):
+            return await _respond(send, scope, 304, headers, b"")
+        headers.append((b"location", quote(location, safe=_LOCATION_SAFE).encode("latin-1")))
+        await _respond(send, scope, status_code, headers, b"")
+
+
+def _header(scope, name: bytes):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _lookup(scope, code: str):
+    # Goes through the get_async_db dependency so overrides (tests) still apply
+    app = scope.get("app")
+    provider = getattr(app, "dependency_overrides", {}).get(get_async_db, get_async_db)
+    sessions = provider()
+    db = await sessions.__anext__()
+    try:
+        return await crud_link.load_redirect_entry_async(db, short_code=code)
+    finally:
+        await sessions.aclose()
+
+
+async def _respond(send, scope, status_code: int, headers: list, body: bytes):
+    headers.append((b"content-length", str(len(body)).encode()))
+    await send({"type": "http.response.start", "status": status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
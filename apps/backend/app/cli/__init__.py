@@ -0,0 +1,7 @@
+"""
+Command-line tools, run as `python -m app.cli.<tool>` from apps/backend.
+
+Importing the models here registers every mapper, so relationships resolve
+without going through main.py (the same set alembic/env.py imports).
+"""
+from app.models import user, link, analytics, campaign, audit, link_change, refresh_token  # noqa: F401
@@ -0,0 +1,107 @@
+"""
+GeoIP range database tooling.
+
+Usage (from apps/backend):
+    python -m app.cli.geoip import dbip-country-lite.csv
+    python -m app.cli.geoip import networks.csv --format cidr
+    python -m app.cli.geoip lookup 8.8.8.8 2001:4860::8888
+
+`import` accepts either:
+  - range: start,end,country  (DB-IP lite / IP2Location LITE style; addresses or integers)
+  - cidr:  network,country    (e.g. 203.0.113.0/24,AU)
+and atomically replaces the normalized range file read by the app, so a
+refresh is just re-running `import` with a newer source. Running workers
+pick the new file up within GEOIP_RELOAD_INTERVAL seconds.
+"""
+import argparse
+import csv
+import ipaddress
+import sys
+import time
+from typing import Iterator, Optional
+
+from app.core.config import settings
+from app.utils.geoip import Range, RangeDatabaseResolver, write_ranges
+
+UNKNOWN_COUNTRIES = {"", "-", "ZZ"}
+
+
+def _parse_address(value: str):
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        return 4 if number < 2 ** 32 else 6, number
+    address = ipaddress.ip_address(value)
+    return address.version, int(address)
+
+
+def _parse_row(row: list, fmt: str) -> Optional[Range]:
+    if fmt == "cidr":
+        network = ipaddress.ip_network(row[0].strip(), strict=False)
+        family, start, end = network.version, int(network.network_address), int(network.broadcast_address)
+        country = row[1]
+    else:
+        family, start = _parse_address(row[0])
+        end_family, end = _parse_address(row[1])
+        if end_family != family and not row[0].strip().isdigit():
+            raise ValueError("range endpoints have different address families")
+        # Integer-only sources put IPv4 in the low range; an IPv6 end means an IPv6 range
+        family = max(family, end_family)
+        country = row[-1]
+    country = country.strip().upper()
+    if country in UNKNOWN_COUNTRIES:
+        return None
+    return family, start, end, country
+
+
+def iter_source(path: str, fmt: str) -> Iterator[Range]:
+    with open(path, newline="", encoding="utf-8") as f:
+        for line_no, row in enumerate(csv.reader(f), start=1):
+            if not row or row[0].startswith("#"):
+                continue
+            try:
+                parsed = _parse_row(row, fmt)
+            except ValueError:
+                if line_no == 1:
+                    continue  # header row
+                raise ValueError(f"{path}:{line_no}: could not parse {row!r}")
+            if parsed:
+                yield parsed
+
+
+def cmd_import(args) -> int:
+    started = time.perf_counter()
+    count = write_ranges(args.output, iter_source(args.source, args.format))
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {count} ranges to {args.output} in {elapsed:.2f}s")
+    return 0
+
+
+def cmd_lookup(args) -> int:
+    resolver = RangeDatabaseResolver.from_file(args.database)
+    for ip in args.ips:
+        print(f"{ip}\t{resolver.lookup(ip) or '-'}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli.geoip", description="Manage the local GeoIP range database.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="Import or refresh the range database from a CSV source")
+    p_import.add_argument("source")
+    p_import.add_argument("--format", choices=("range", "cidr"), default="range")
+    p_import.add_argument("--output", default=settings.GEOIP_DB_PATH)
+    p_import.set_defaults(func=cmd_import)
+
+    p_lookup = sub.add_parser("lookup", help="Resolve addresses against the range database")
+    p_lookup.add_argument("ips", nargs="+")
+    p_lookup.add_argument("--database", default=settings.GEOIP_DB_PATH)
+    p_lookup.set_defaults(func=cmd_lookup)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Memory-mapped redirect index.
+
+Usage (from apps/backend):
+    python -m app.cli.redirect_index build                 # to REDIRECT_INDEX_PATH
+    python -m app.cli.redirect_index build --out idx.bin
+    python -m app.cli.redirect_index lookup abc123 promo
+    python -m app.cli.redirect_index bench --lookups 100000
+
+`build` writes the index next to its destination and atomically replaces
+it; running workers map the new file within REDIRECT_INDEX_RELOAD_INTERVAL
+seconds, so a refresh is just re-running `build` (e.g. from cron).
+"""
+import argparse
+import random
+import sys
+import time
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.link import Link
+from app.utils.redirect_index import RedirectIndex, build_index
+
+
+def _path(args) -> str:
+    path = getattr(args, "out", None) or args.index or settings.REDIRECT_INDEX_PATH
+    if not path:
+        raise SystemExit("No index path: pass --index/--out or set REDIRECT_INDEX_PATH")
+    return path
+
+
+def cmd_build(args) -> int:
+    db = SessionLocal()
+    try:
+        result = build_index(db, _path(args), batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(
+        f"Indexed {result['entries']} links ({result['bytes']} bytes, key width {result['key_width']}) "
+        f"in {result['elapsed_seconds']:.2f}s -> {result['path']}"
+    )
+    if result["skipped"]:
+        print(f"  skipped {result['skipped']} unindexable short codes")
+    return 0
+
+
+def cmd_lookup(args) -> int:
+    index = RedirectIndex(_path(args))
+    for code in args.codes:
+        entry = index.get(code)
+        if entry is None:
+            print(f"{code}\tnot found")
+        else:
+            flags = [name for name, on in (
+                ("inactive", not entry.is_active), ("password", entry.requires_password),
+                ("login", entry.require_login), ("tracked", entry.track_activity),
+            ) if on]
+            print(f"{code}\t{entry.redirect_type}\t{entry.destination}\t{','.join(flags)}")
+    return 0
+
+
+def cmd_bench(args) -> int:
+    index = RedirectIndex(_path(args))
+    if not len(index):
+        print("Index is empty")
+        return 1
+    db = SessionLocal()
+    try:
+        codes = list(db.scalars(select(Link.short_code).where(Link.is_deleted == False).limit(10000)))
+    finally:
+        db.close()
+    sample = [random.choice(codes) for _ in range(args.lookups)]
+    started = time.perf_counter()
+    for code in sample:
+        index.get(code)
+    elapsed = time.perf_counter() - started
+    print(f"{args.lookups} lookups over {len(index)} entries: {elapsed / args.lookups * 1e6:.2f} us/lookup")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli.redirect_index", description="Maintain the memory-mapped redirect index.")
+    parser.add_argument("--index", help="Index file (default: REDIRECT_INDEX_PATH)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Rebuild the index from the links table and swap it in")
+    p_build.add_argument("--out", help="Write here instead of REDIRECT_INDEX_PATH")
+    p_build.add_argument("--batch-size", type=int, default=1000, help="Rows fetched per round trip")
+    p_build.set_defaults(func=cmd_build)
+
+    p_lookup = sub.add_parser("lookup", help="Look short codes up in the index")
+    p_lookup.add_argument("codes", nargs="+")
+    p_lookup.set_defaults(func=cmd_lookup)
+
+    p_bench = sub.add_parser("bench", help="Time random lookups of existing codes")
+    p_bench.add_argument("--lookups", type=int, default=100000)
+    p_bench.set_defaults(func=cmd_bench)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Historical re-enrichment of click events, after a user agent parser or
+GeoIP database upgrade.
+
+Usage (from apps/backend):
+    python -m app.cli.reenrich run                          # all sources, one worker per CPU
+    python -m app.cli.reenrich run --only geo --max-rows-per-second 20000
+    python -m app.cli.reenrich run --dry-run --workers 0    # count what would change
+    python -m app.cli.reenrich status
+
+`run` resumes from its checkpoint file (default ./data/reenrich-checkpoint.json)
+until the id range recorded by the first run is done; `--restart` starts a
+new pass over everything up to the current maximum id. Interrupting it
+(Ctrl-C, deploy) loses at most the windows in flight.
+"""
+import argparse
+import sys
+
+from app.utils import geoip
+from app.utils.reenrichment import SOURCES, ReenrichJob, load_checkpoint
+
+DEFAULT_CHECKPOINT = "./data/reenrich-checkpoint.json"
+
+
+def cmd_run(args) -> int:
+    sources = args.only or list(SOURCES)
+    if "geo" in sources and isinstance(geoip.get_resolver(), geoip.IPApiResolver):
+        print("GeoIP resolves through ip-api.com, which can't take a bulk job: import a local database "
+              "(python -m app.cli.geoip import) or pass --only ua")
+        return 1
+    job = ReenrichJob(
+        checkpoint_path=args.checkpoint,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        max_rows_per_second=args.max_rows_per_second,
+        sources=sources,
+        dry_run=args.dry_run,
+        report_interval=args.report_interval,
+    )
+    try:
+        result = job.run(restart=args.restart)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted after {job.scanned} rows ({job.updated} updated); re-run to resume from {args.checkpoint}")
+        return 130
+    verb = "would change" if result["dry_run"] else "updated"
+    print(
+        f"Re-enriched ids {result['resumed_from'] + 1}..{result['max_id']} ({', '.join(sources)}): "
+        f"{result['scanned']} rows scanned, {result['updated']} {verb} "
+        f"in {result['elapsed_seconds']:.2f}s ({result['rows_per_second']:,} rows/s)"
+    )
+    return 0
+
+
+def cmd_status(args) -> int:
+    state = load_checkpoint(args.checkpoint)
+    if state is None:
+        print(f"No checkpoint at {args.checkpoint}")
+        return 1
+    done = "complete" if state["next_id"] >= state["max_id"] else "in progress"
+    print(f"id {state['next_id']}/{state['max_id']} ({done}): {state['scanned']} rows scanned, {state['updated']} updated")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli.reenrich", description="Recompute derived click event columns.")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Progress file (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="Re-enrich click events, resuming from the checkpoint")
+    p_run.add_argument("--only", choices=list(SOURCES), action="append", help="Only recompute from this source (repeatable)")
+    p_run.add_argument("--chunk-size", type=int, default=5000, help="Ids per window (one transaction each)")
+    p_run.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count; 0 = none)")
+    p_run.add_argument("--max-rows-per-second", type=float, default=None, help="Throttle the scan to this rate")
+    p_run.add_argument("--report-interval", type=float, default=10.0, help="Seconds between progress lines")
+    p_run.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    p_run.add_argument("--dry-run", action="store_true", help="Count changes without writing anything")
+    p_run.set_defaults(func=cmd_run)
+
+    p_status = sub.add_parser("status", help="Show the checkpoint")
+    p_status.set_defaults(func=cmd_status)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
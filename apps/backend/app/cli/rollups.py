@@ -0,0 +1,59 @@
+"""
+Click rollup maintenance.
+
+Usage (from apps/backend):
+    python -m app.cli.rollups backfill               # every link
+    python -m app.cli.rollups backfill --link-id 42  # a single link
+
+Rebuilds link_daily_clicks / link_dimension_clicks from click_events,
+committing one chunk of links at a time so the write lock is never held
+for the whole table.
+"""
+import argparse
+import sys
+import time
+
+from sqlalchemy import select
+
+from app.db.session import SessionLocal
+from app.models.link import Link
+from app.utils.rollups import rebuild_rollups
+
+
+def cmd_backfill(args) -> int:
+    db = SessionLocal()
+    try:
+        if args.link_id:
+            link_ids = args.link_id
+        else:
+            link_ids = list(db.scalars(select(Link.id).order_by(Link.id)))
+
+        started = time.perf_counter()
+        events = 0
+        for i in range(0, len(link_ids), args.chunk_size):
+            chunk = link_ids[i:i + args.chunk_size]
+            events += rebuild_rollups(db, chunk)
+            db.commit()
+            print(f"  {min(i + args.chunk_size, len(link_ids))}/{len(link_ids)} links, {events} events")
+        elapsed = time.perf_counter() - started
+        print(f"Rebuilt rollups for {len(link_ids)} links ({events} events) in {elapsed:.2f}s")
+    finally:
+        db.close()
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli.rollups", description="Maintain click rollup tables.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_backfill = sub.add_parser("backfill", help="Rebuild rollups from existing click_events")
+    p_backfill.add_argument("--link-id", type=int, action="append", help="Only rebuild these links (repeatable)")
+    p_backfill.add_argument("--chunk-size", type=int, default=200, help="Links per transaction")
+    p_backfill.set_defaults(func=cmd_backfill)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
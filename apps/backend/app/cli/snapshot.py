@@ -0,0 +1,68 @@
+"""
+Static redirect snapshot for edge serving.
+
+Usage (from apps/backend):
+    python -m app.cli.snapshot build                    # incremental when possible
+    python -m app.cli.snapshot build --full --format nginx
+    python -m app.cli.snapshot build --watch 30         # rebuild every 30 seconds
+
+Writes redirects.tsv / redirects.map / redirects.json to SNAPSHOT_DIR (or
+--out). Each file is swapped in atomically, so nginx can be reloaded (or an
+edge can fetch the file) at any time. See app/utils/snapshot.py for which
+links are included.
+"""
+import argparse
+import sys
+import time
+
+from app.db.session import SessionLocal
+from app.utils.snapshot import FORMATS, build_snapshot
+
+
+def _build_once(args) -> dict:
+    db = SessionLocal()
+    try:
+        return build_snapshot(db, out_dir=args.out, formats=args.format or FORMATS,
+                              full=args.full, batch_size=args.batch_size)
+    finally:
+        db.close()
+
+
+def cmd_build(args) -> int:
+    while True:
+        result = _build_once(args)
+        if result["mode"] == "unchanged":
+            print(f"Snapshot up to date at cursor {result['cursor']}")
+        else:
+            print(
+                f"{result['mode'].capitalize()} snapshot: {result['entries']} links"
+                + (f" ({result['changed_codes']} changed)" if result["changed_codes"] is not None else "")
+                + f", cursor {result['cursor']}, {result['elapsed_seconds']:.2f}s -> {result['out_dir']}"
+            )
+        if result["skipped"]:
+            print(f"  skipped {result['skipped']} links with tabs or newlines in the destination")
+        if not args.watch:
+            return 0
+        # Only the first pass may be full; later ones apply the changes since
+        args.full = False
+        time.sleep(args.watch)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli.snapshot", description="Compile the static redirect snapshot.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Build or update the snapshot")
+    p_build.add_argument("--full", action="store_true", help="Rebuild from scratch instead of applying changes")
+    p_build.add_argument("--format", choices=FORMATS, action="append", help="Output format (repeatable, default: all)")
+    p_build.add_argument("--out", help="Output directory (default: SNAPSHOT_DIR)")
+    p_build.add_argument("--batch-size", type=int, default=1000, help="Rows fetched per round trip")
+    p_build.add_argument("--watch", type=float, metavar="SECONDS", help="Keep rebuilding at this interval")
+    p_build.set_defaults(func=cmd_build)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
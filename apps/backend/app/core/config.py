@@ -10,13 +10,107 @@ class Settings(BaseSettings):
     KEYN_CLIENT_SECRET: Optional[str] = None
     KEYN_REDIRECT_URI: str = "http://localhost:3071/auth/callback"
     KEYN_AUTH_URL: str = "https://auth-keyn.bynolo.ca"
-    
+
+    # Self-issued session tokens (HMAC-signed); required unless DEBUG is set
+    SECRET_KEY: Optional[str] = None
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+
+    # KeyN token introspection / user lookup caches
+    KEYN_TOKEN_CACHE_SIZE: int = 4096
+    KEYN_TOKEN_CACHE_TTL: float = 60.0 # seconds
+    KEYN_NEGATIVE_CACHE_TTL: float = 10.0 # seconds to remember rejected (401) tokens
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL: float = 30.0 # seconds
+
+    # Outbound HTTP (KeyN, ip-api): pooled connections, timeouts, retries, circuit breakers
+    HTTP_POOL_MAXSIZE: int = 20 # keep-alive connections per upstream
+    HTTP_RETRY_BACKOFF: float = 0.1 # seconds, base of the jittered exponential backoff
+    KEYN_TIMEOUT: float = 5.0 # seconds
+    KEYN_RETRIES: int = 2 # extra attempts for idempotent requests
+    GEOIP_HTTP_TIMEOUT: float = 2.0 # seconds
+    CIRCUIT_FAILURE_THRESHOLD: int = 5 # consecutive failures before failing fast
+    CIRCUIT_RESET_TIMEOUT: float = 30.0 # seconds before a trial request is allowed
+
     # Environment
+    DEBUG: bool = False # development: runs without SECRET_KEY on a random per-process key
     FRONTEND_URL: str = "http://localhost:3070"
     SERVER_HOST: str = "http://localhost:3071"
 
     # Database
     DATABASE_URL: str = "sqlite:///./nololink.db"
+    # Async engine used by the redirect path; derived from DATABASE_URL when unset
+    ASYNC_DATABASE_URL: Optional[str] = None
+
+    # Redirect resolution cache
+    REDIRECT_CACHE_SIZE: int = 4096
+    REDIRECT_CACHE_TTL: float = 60.0 # seconds
+
+    # Unknown short codes: Bloom filter of live codes + short negative cache
+    SHORT_CODE_FILTER_ENABLED: bool = True
+    SHORT_CODE_FILTER_ERROR_RATE: float = 0.01
+    SHORT_CODE_FILTER_MIN_CAPACITY: int = 100000
+    SHORT_CODE_FILTER_REBUILD_INTERVAL: float = 300.0 # seconds; also picks up links created by other workers
+    MISSING_CODE_CACHE_SIZE: int = 10000
+    MISSING_CODE_CACHE_TTL: float = 30.0 # seconds
+
+    # Cross-worker cache invalidation: database (link_changes table, polled) or local (single process)
+    INVALIDATION_TRANSPORT: str = "database"
+    INVALIDATION_POLL_INTERVAL: float = 1.0 # seconds; bounds how stale another worker's caches can be
+    INVALIDATION_REREAD_WINDOW: int = 100 # change ids below the cursor re-read each poll, for rows committed out of order
+    LINK_CHANGES_RETENTION_DAYS: int = 7
+
+    # Static redirect snapshot for edge serving (python -m app.cli.snapshot build)
+    SNAPSHOT_DIR: str = "./data/snapshot"
+    # Memory-mapped redirect index shared by workers (python -m app.cli.redirect_index build); unset to disable
+    REDIRECT_INDEX_PATH: Optional[str] = None # e.g. ./data/redirects.idx
+    REDIRECT_INDEX_RELOAD_INTERVAL: float = 5.0 # seconds between checks for a rebuilt index
+    REDIRECT_INDEX_MAX_CHANGED: int = 10000 # codes changed since the build before the index is set aside until the next one
+
+    # HTTP caching of redirects to untracked links (never past expires_at; 0 sends no-cache)
+    PERMANENT_REDIRECT_MAX_AGE: int = 86400 # seconds, 301/308
+    TEMPORARY_REDIRECT_MAX_AGE: int = 0 # seconds, 302/307
+    SURROGATE_KEY_HEADER: Optional[str] = "Surrogate-Key" # e.g. Cache-Tag for Cloudflare; empty to disable
+    # CDN purge on link edits: POSTed once per surrogate key, e.g. https://api.fastly.com/service/<id>/purge/{key}
+    CDN_PURGE_URL: Optional[str] = None
+    CDN_PURGE_TOKEN: Optional[str] = None
+
+    # Write-behind click counter
+    CLICK_FLUSH_INTERVAL_MS: int = 1000
+    CLICK_FLUSH_MAX_PENDING: int = 500
+
+    # Click event ingestion queue
+    CLICK_QUEUE_MAXSIZE: int = 10000
+    CLICK_QUEUE_BATCH_SIZE: int = 200
+    CLICK_QUEUE_FLUSH_INTERVAL_MS: int = 500
+    CLICK_QUEUE_POLICY: str = "drop" # drop, oldest, block
+    CLICK_QUEUE_WORKERS: int = 1
+    CLICK_QUEUE_BLOCK_TIMEOUT_MS: int = 50
+
+    # Where captured clicks go: queue (in memory) or spool (durable segment files, survives crashes and deploys)
+    CLICK_INGEST: str = "queue"
+    CLICK_SPOOL_DIR: str = "./data/click-spool"
+    CLICK_SPOOL_FSYNC: str = "interval" # always, interval, never
+    CLICK_SPOOL_FSYNC_INTERVAL_MS: int = 200
+    CLICK_SPOOL_SEGMENT_BYTES: int = 4 * 1024 * 1024
+    CLICK_SPOOL_SEGMENT_AGE_MS: int = 1000 # also bounds how long a click waits to be loaded
+    CLICK_SPOOL_BATCH_SIZE: int = 1000
+
+    # Background enrichment of stored clicks (user agent, GeoIP, referrer domain)
+    ENRICHMENT_BATCH_SIZE: int = 500
+    ENRICHMENT_INTERVAL_MS: int = 1000
+    ENRICHMENT_STATS_PENDING_LIMIT: int = 1000 # pending rows a stats read enriches on the fly
+
+    # Link stats responses, cached per link stats version (see app.utils.stats_cache)
+    STATS_CACHE_SIZE: int = 1024
+
+    # GeoIP: auto (local database if present, else ip-api.com), local, ip-api, none
+    GEOIP_PROVIDER: str = "auto"
+    GEOIP_DB_PATH: str = "./data/geoip-ranges.csv"
+    GEOIP_RELOAD_INTERVAL: float = 60.0 # seconds between checks for a refreshed database
+
+    # Parsed user agents kept in memory
+    UA_CACHE_SIZE: int = 2048
 
     class Config:
         env_file = ".env"
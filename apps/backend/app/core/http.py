@@ -0,0 +1,224 @@
+"""
+Shared outbound HTTP layer.
+
+Every call to an external service (KeyN, the ip-api GeoIP fallback) goes
+through a named `Upstream`, which owns:
+- a keep-alive connection pool (one requests.Session per upstream host)
+- a default per-call timeout
+- retries with full jitter for idempotent requests
+- a circuit breaker that fails fast while the upstream is degraded
+- latency / error metrics
+"""
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.core.config import settings
+
+RETRYABLE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class UpstreamUnavailable(Exception):
+    """Raised without touching the network while an upstream's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures; after `reset_timeout`
+    seconds a single trial request is let through (half-open), and its
+    outcome closes or re-opens the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def reset(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+
+class Upstream:
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        timeout: float = 5.0,
+        retries: int = 2,
+        backoff: float = 0.1,
+        pool_maxsize: int = 20,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=512)
+        self.requests = 0
+        self.errors = 0
+        self.retried = 0
+        self.short_circuited = 0
+
+    def _record(self, elapsed: float, failed: bool):
+        with self._lock:
+            self.requests += 1
+            self._latencies.append(elapsed)
+            if failed:
+                self.errors += 1
+
+    def request(self, method: str, path: str, retries: Optional[int] = None, **kwargs) -> requests.Response:
+        """
+        Sends a request to `base_url + path`. 5xx responses and connection
+        errors count as failures; idempotent methods are retried with jitter.
+        4xx responses are returned to the caller as-is.
+        """
+        method = method.upper()
+        url = path if path.startswith(("http://", "https://")) else f"{self.base_url}{path}"
+        kwargs.setdefault("timeout", self.timeout)
+        if retries is None:
+            retries = self.retries if method in RETRYABLE_METHODS else 0
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self.short_circuited += 1
+                raise UpstreamUnavailable(f"{self.name} circuit is open")
+
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                self._record(time.perf_counter() - started, failed=True)
+                self.breaker.record_failure()
+                error, response = e, None
+            else:
+                failed = response.status_code >= 500
+                self._record(time.perf_counter() - started, failed=failed)
+                if not failed:
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                error = None
+
+            if attempt >= retries:
+                if error is not None:
+                    raise error
+                return response
+            attempt += 1
+            self.retried += 1
+            # Full jitter: spread retries so callers don't stampede a recovering upstream
+            time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def reset(self):
+        """Close the circuit and zero the metrics (used by tests)."""
+        self.breaker.reset()
+        with self._lock:
+            self._latencies.clear()
+            self.requests = self.errors = self.retried = self.short_circuited = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+        return {
+            "base_url": self.base_url,
+            "circuit": self.breaker.state,
+            "requests": self.requests,
+            "errors": self.errors,
+            "retried": self.retried,
+            "short_circuited": self.short_circuited,
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": percentile(1.0)},
+        }
+
+
+class HTTPClient:
+    """Registry of named upstreams, shared by the whole process."""
+
+    def __init__(self):
+        self._upstreams: Dict[str, Upstream] = {}
+
+    def register(self, upstream: Upstream) -> Upstream:
+        self._upstreams[upstream.name] = upstream
+        return upstream
+
+    def upstream(self, name: str) -> Upstream:
+        return self._upstreams[name]
+
+    def stats(self) -> dict:
+        return {name: upstream.stats() for name, upstream in self._upstreams.items()}
+
+
+http_client = HTTPClient()
+
+keyn = http_client.register(Upstream(
+    "keyn",
+    settings.KEYN_AUTH_URL,
+    timeout=settings.KEYN_TIMEOUT,
+    retries=settings.KEYN_RETRIES,
+    backoff=settings.HTTP_RETRY_BACKOFF,
+    pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+    failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=settings.CIRCUIT_RESET_TIMEOUT,
+))
+
+geoip_api = http_client.register(Upstream(
+    "geoip",
+    "http://ip-api.com",
+    timeout=settings.GEOIP_HTTP_TIMEOUT,
+    retries=0, # a click is not worth waiting on; the next one will try again
+    pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+    failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=settings.CIRCUIT_RESET_TIMEOUT,
+))
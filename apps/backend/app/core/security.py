@@ -0,0 +1,113 @@
+"""
+Self-issued session tokens.
+
+After the KeyN OAuth exchange NoloLink mints its own short-lived access
+token and a longer-lived refresh token. Both are compact JWTs (HS256) signed
+with SECRET_KEY, so `get_current_user` validates them locally instead of
+asking KeyN on every request.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+from typing import Optional
+
+from app.core.config import settings
+
+ISSUER = "nololink"
+ACCESS = "access"
+REFRESH = "refresh"
+
+_HEADER = {"alg": "HS256", "typ": "JWT"}
+
+
+def _signing_key(secret_key: Optional[str], debug: bool) -> bytes:
+    if secret_key:
+        return secret_key.encode()
+    if not debug:
+        raise RuntimeError("SECRET_KEY is not set; set it (or DEBUG=true for a throwaway key in development)")
+    # Tokens will not survive a restart or validate across workers without a fixed key
+    print("WARNING: SECRET_KEY is not set, using a random per-process signing key")
+    return secrets.token_bytes(32)
+
+
+_secret = _signing_key(settings.SECRET_KEY, settings.DEBUG)
+
+
+class TokenError(ValueError):
+    """Raised when a token is malformed, badly signed, expired or of the wrong type."""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(signing_input: bytes) -> bytes:
+    return hmac.new(_secret, signing_input, hashlib.sha256).digest()
+
+
+def _encode(claims: dict) -> str:
+    header = _b64encode(json.dumps(_HEADER, separators=(",", ":")).encode())
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    signing_input = f"{header}.{payload}".encode("ascii")
+    return f"{header}.{payload}.{_b64encode(_sign(signing_input))}"
+
+
+def create_token(subject: str, token_type: str, expires_in: int, extra: Optional[dict] = None) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": ISSUER,
+        "sub": subject,
+        "typ": token_type,
+        "iat": now,
+        "exp": now + expires_in,
+    }
+    if extra:
+        claims.update(extra)
+    return _encode(claims)
+
+
+def create_access_token(keyn_id: str) -> str:
+    return create_token(keyn_id, ACCESS, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
+def create_refresh_token(keyn_id: str, jti: str) -> str:
+    # Only names the server-side row (app.crud.refresh_token) holding the KeyN token
+    return create_token(keyn_id, REFRESH, settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400, extra={"jti": jti})
+
+
+def is_nololink_token(token: str) -> bool:
+    """Cheap structural check: does this look like one of our tokens (vs. a KeyN token)?"""
+    parts = token.split(".")
+    if len(parts) != 3:
+        return False
+    try:
+        return json.loads(_b64decode(parts[0])) == _HEADER and json.loads(_b64decode(parts[1])).get("iss") == ISSUER
+    except (ValueError, AttributeError):
+        return False
+
+
+def decode_token(token: str, token_type: str = ACCESS) -> dict:
+    """Verifies signature, expiry and type, returning the claims."""
+    try:
+        header, payload, signature = token.split(".")
+        expected = _sign(f"{header}.{payload}".encode("ascii"))
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            raise TokenError("Invalid token signature")
+        claims = json.loads(_b64decode(payload))
+    except TokenError:
+        raise
+    except (ValueError, UnicodeError):
+        raise TokenError("Malformed token")
+
+    if claims.get("iss") != ISSUER or claims.get("typ") != token_type:
+        raise TokenError("Wrong token type")
+    if claims.get("exp", 0) < time.time():
+        raise TokenError("Token expired")
+    return claims
@@ -2,6 +2,7 @@ import json
 from typing import Optional
 from sqlalchemy.orm import Session
 from app.models.audit import AuditLog
+from app.utils import pagination
 
 
 def create_audit_entry(
@@ -33,9 +34,15 @@ def get_audit_logs(
     target_type: Optional[str] = None,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[list] = None,
 ):
-    """Get audit logs, optionally filtered by user, action, or target type."""
+    """
+    Get audit logs, newest first, optionally filtered by user, action, or target type.
+    `cursor` is a decoded (timestamp, id) key: the page after that entry.
+    """
     query = db.query(AuditLog)
+    if cursor is not None:
+        query = query.filter(pagination.after(db, (AuditLog.timestamp, AuditLog.id), cursor))
 
     if user_id is not None:
         query = query.filter(AuditLog.user_id == user_id)
@@ -44,4 +51,4 @@ def get_audit_logs(
     if target_type:
         query = query.filter(AuditLog.target_type == target_type)
 
-    return query.order_by(AuditLog.timestamp.desc()).offset(skip).limit(limit).all()
+    return query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).offset(skip).limit(limit).all()
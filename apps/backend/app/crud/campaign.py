@@ -1,12 +1,17 @@
 from sqlalchemy.orm import Session
 from app.models.campaign import Campaign
 from app.schemas.campaign import CampaignCreate, CampaignUpdate
+from app.utils import pagination
 
 def get_campaign(db: Session, campaign_id: int):
     return db.query(Campaign).filter(Campaign.id == campaign_id).first()
 
-def get_campaigns(db: Session, owner_id: int, skip: int = 0, limit: int = 100):
-    return db.query(Campaign).filter(Campaign.owner_id == owner_id).offset(skip).limit(limit).all()
+def get_campaigns(db: Session, owner_id: int, skip: int = 0, limit: int = 100, cursor: list = None):
+    # Oldest first; `cursor` is a decoded (id,) key: the page after that campaign
+    query = db.query(Campaign).filter(Campaign.owner_id == owner_id)
+    if cursor is not None:
+        query = query.filter(pagination.after(db, (Campaign.id,), cursor, descending=False))
+    return query.order_by(Campaign.id).offset(skip).limit(limit).all()
 
 def create_campaign(db: Session, campaign: CampaignCreate, owner_id: int):
     db_campaign = Campaign(**campaign.model_dump(), owner_id=owner_id)
@@ -1,8 +1,16 @@
 from urllib.parse import urlencode, urlparse, parse_qs, urlunparse
 
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models.link import Link
 from app.schemas.link import LinkCreate, LinkUpdate
+from app.utils.link_cache import (
+    RedirectEntry, redirect_cache, invalidate_codes, known_missing, record_missing,
+)
+from app.utils import pagination
+from app.utils.click_counter import click_counter
+from app.utils.redirect_index import redirect_index
 import shortuuid
 from passlib.context import CryptContext
 
@@ -39,14 +47,94 @@ def get_link(db: Session, link_id: int):
 def get_link_by_code(db: Session, short_code: str):
     return db.query(Link).filter(Link.short_code == short_code, Link.is_deleted == False).first()
 
+def make_redirect_entry(link) -> RedirectEntry:
+    # Accepts a Link or a Core row with the same column names
+    return RedirectEntry(
+        id=link.id,
+        short_code=link.short_code,
+        # Rows written before redirect_url existed fall back to building it
+        destination=link.redirect_url or build_redirect_url(link),
+        redirect_type=link.redirect_type or 302,
+        is_active=bool(link.is_active),
+        expires_at=link.expires_at,
+        requires_password=bool(link.password_hash),
+        require_login=bool(link.require_login),
+        track_activity=bool(link.track_activity),
+    )
+
+def lookup_redirect_entry(short_code: str):
+    """
+    The in-memory half of resolving a short code, shared by the sync and
+    async resolvers: (answered, entry). Checks the redirect cache, then the
+    short code filter and negative cache (the cheapest rejection), then the
+    redirect index. When not answered, the caller queries the database.
+    """
+    entry = redirect_cache.get(short_code)
+    if entry is not None:
+        return True, entry
+    if known_missing(short_code):
+        return True, None
+    return redirect_index.lookup(short_code)
+
+def get_redirect_entry(db: Session, short_code: str):
+    """
+    Resolve a short code for the redirect path, serving from the in-process
+    cache when possible. The session is only used on a cache miss, and not
+    at all for codes the short code filter or negative cache rule out.
+    """
+    answered, entry = lookup_redirect_entry(short_code)
+    if answered:
+        return entry
+
+    link = get_link_by_code(db, short_code=short_code)
+    if not link:
+        record_missing(short_code)
+        return None
+
+    entry = make_redirect_entry(link)
+    redirect_cache.set(short_code, entry)
+    return entry
+
+# Only the columns the redirect path needs, fetched as a plain Core row
+_redirect_columns = select(
+    Link.id, Link.short_code, Link.redirect_url, Link.original_url, Link.redirect_type, Link.is_active,
+    Link.expires_at, Link.password_hash, Link.require_login, Link.track_activity,
+    Link.utm_source, Link.utm_medium, Link.utm_campaign, Link.utm_term, Link.utm_content,
+)
+
+async def get_redirect_entry_async(db: AsyncSession, short_code: str):
+    """Async counterpart of `get_redirect_entry`, used by the redirect route."""
+    answered, entry = lookup_redirect_entry(short_code)
+    if answered:
+        return entry
+    return await load_redirect_entry_async(db, short_code)
+
+async def load_redirect_entry_async(db: AsyncSession, short_code: str):
+    """Database half of `get_redirect_entry_async`: query the row and cache the entry."""
+    result = await db.execute(
+        _redirect_columns.where(Link.short_code == short_code, Link.is_deleted == False)
+    )
+    row = result.first()
+    if not row:
+        record_missing(short_code)
+        return None
+
+    entry = make_redirect_entry(row)
+    redirect_cache.set(short_code, entry)
+    return entry
+
 def get_links(
     db: Session, 
     owner_id: int, 
     skip: int = 0, 
     limit: int = 100, 
-    filters: dict = None
+    filters: dict = None,
+    cursor: list = None,
 ):
+    """Newest first. `cursor` is a decoded (created_at, id) key: the page after that link."""
     query = db.query(Link).filter(Link.owner_id == owner_id, Link.is_deleted == False)
+    if cursor is not None:
+        query = query.filter(pagination.after(db, (Link.created_at, Link.id), cursor))
     
     if filters:
         if filters.get("campaign_id"):
@@ -62,7 +150,7 @@ def get_links(
                 (Link.short_code.ilike(search))
             )
 
-    return query.order_by(Link.created_at.desc()).offset(skip).limit(limit).all()
+    return query.order_by(Link.created_at.desc(), Link.id.desc()).offset(skip).limit(limit).all()
 
 def create_link(db: Session, link: LinkCreate, owner_id: int):
     code = link.short_code
@@ -102,9 +190,11 @@ def create_link(db: Session, link: LinkCreate, owner_id: int):
         utm_term=link.utm_term,
         utm_content=link.utm_content,
     )
+    db_link.redirect_url = build_redirect_url(db_link)
     db.add(db_link)
     db.commit()
     db.refresh(db_link)
+    invalidate_codes(db_link.short_code)
     return db_link
 
 def update_link(db: Session, db_link: Link, link_update: LinkUpdate):
@@ -113,6 +203,7 @@ def update_link(db: Session, db_link: Link, link_update: LinkUpdate):
         if get_link_by_code(db, link_update.short_code):
             return None # Collision
 
+    old_code = db_link.short_code
     if link_update.short_code:
         db_link.short_code = link_update.short_code
     
@@ -141,10 +232,12 @@ def update_link(db: Session, db_link: Link, link_update: LinkUpdate):
             db_link.password_hash = None
         else:
             db_link.password_hash = pwd_context.hash(link_update.password)
-    
+
+    db_link.redirect_url = build_redirect_url(db_link)
     db.add(db_link)
     db.commit()
     db.refresh(db_link)
+    invalidate_codes(old_code, db_link.short_code)
     return db_link
 
 def delete_link(db: Session, db_link: Link):
@@ -152,10 +245,11 @@ def delete_link(db: Session, db_link: Link):
     db_link.is_active = False
     db.add(db_link)
     db.commit()
+    invalidate_codes(db_link.short_code)
 
-def increment_clicks(db: Session, db_link: Link):
-    db.add(db_link)
-    db.commit()
+def increment_clicks(link_id: int, n: int = 1):
+    """Buffer a click; the write-behind counter flushes it to Link.clicks in batches."""
+    click_counter.add(link_id, n)
 
 def create_links_bulk(db: Session, links: list[LinkCreate], owner_id: int):
     created_links = []
@@ -194,12 +288,14 @@ def create_links_bulk(db: Session, links: list[LinkCreate], owner_id: int):
             utm_term=link_data.utm_term,
             utm_content=link_data.utm_content,
         )
+        db_link.redirect_url = build_redirect_url(db_link)
         db.add(db_link)
         created_links.append(db_link)
     
     db.commit()
     for link in created_links:
         db.refresh(link)
+    invalidate_codes(*(link.short_code for link in created_links))
     return created_links
 
 from app.schemas.link import LinkBulkUpdate
@@ -257,10 +353,12 @@ def update_links_bulk(db: Session, bulk_update: LinkBulkUpdate, owner_id: int):
             link.utm_term = bulk_update.utm_term or None
         if bulk_update.utm_content is not None:
             link.utm_content = bulk_update.utm_content or None
-        
+
+        link.redirect_url = build_redirect_url(link)
         updated_count += 1
         db.add(link)
 
     db.commit()
+    invalidate_codes(*(link.short_code for link in links_to_update))
     # We return the updated links to refresh frontend state
     return links_to_update
@@ -0,0 +1,49 @@
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+from app.core import security
+from app.core.config import settings
+from app.models.refresh_token import RefreshToken
+
+
+def issue_refresh_token(db: Session, keyn_id: str, keyn_token: str) -> str:
+    """Stores the KeyN token under a new jti and returns the refresh JWT naming it."""
+    now = datetime.utcnow()
+    # Tokens nobody came back to refresh; cheap on ix_refresh_tokens_expires_at
+    db.execute(delete(RefreshToken).where(RefreshToken.expires_at < now))
+    jti = secrets.token_urlsafe(16)
+    db.add(RefreshToken(
+        jti=jti,
+        keyn_id=keyn_id,
+        keyn_token=keyn_token,
+        expires_at=now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    db.commit()
+    return security.create_refresh_token(keyn_id, jti)
+
+
+def get_refresh_token(db: Session, claims: dict) -> Optional[RefreshToken]:
+    """The live row behind decoded refresh token claims, or None if it was rotated, revoked or expired."""
+    return db.query(RefreshToken).filter(
+        RefreshToken.jti == (claims.get("jti") or ""),
+        RefreshToken.keyn_id == claims.get("sub"),
+        RefreshToken.expires_at > datetime.utcnow(),
+    ).first()
+
+
+def revoke_refresh_token(db: Session, jti: str) -> bool:
+    """Deletes the row; False if it was already gone (so two refreshes can't both rotate one token)."""
+    revoked = db.execute(delete(RefreshToken).where(RefreshToken.jti == jti)).rowcount == 1
+    db.commit()
+    return revoked
+
+
+def rotate_refresh_token(db: Session, stored: RefreshToken) -> Optional[str]:
+    """Swaps a refresh token for a new one carrying the same KeyN token; None if it was used meanwhile."""
+    keyn_id, keyn_token = stored.keyn_id, stored.keyn_token
+    if not revoke_refresh_token(db, stored.jti):
+        return None
+    return issue_refresh_token(db, keyn_id, keyn_token)
+
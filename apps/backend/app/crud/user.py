@@ -1,6 +1,12 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app.core.config import settings
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
+from app.utils.cache import LRUCache
+from app.utils.invalidation import invalidation_bus
+
+# keyn_id -> detached User snapshot, used by get_current_user
+user_cache = LRUCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
 
 def get_user(db: Session, user_id: int):
     return db.query(User).filter(User.id == user_id).first()
@@ -11,6 +17,38 @@ def get_user_by_email(db: Session, email: str):
 def get_user_by_keyn_id(db: Session, keyn_id: str):
     return db.query(User).filter(User.keyn_id == keyn_id).first()
 
+def _snapshot(db_user: User) -> User:
+    """A detached copy of the row's column values, safe to share between sessions."""
+    copy = User(**{c.key: getattr(db_user, c.key) for c in User.__table__.columns})
+    make_transient_to_detached(copy)
+    return copy
+
+def get_cached_user_by_keyn_id(db: Session, keyn_id: str):
+    """
+    Like get_user_by_keyn_id, but served from the user cache when warm.
+    A hit is merged into the session without emitting any SQL.
+    """
+    cached = user_cache.get(keyn_id)
+    if cached is not None:
+        return db.merge(cached, load=False)
+
+    db_user = get_user_by_keyn_id(db, keyn_id=keyn_id)
+    if db_user:
+        user_cache.set(keyn_id, _snapshot(db_user))
+    return db_user
+
+def _invalidate_local(*keyn_ids: str):
+    for keyn_id in keyn_ids:
+        user_cache.invalidate(keyn_id)
+
+def invalidate_user(db_user: User, *other_keyn_ids: str):
+    """Drop the cached user here and, through the invalidation bus, in every other worker."""
+    keyn_ids = {db_user.keyn_id, *other_keyn_ids}
+    _invalidate_local(*keyn_ids)
+    invalidation_bus.publish("user", *keyn_ids)
+
+invalidation_bus.subscribe("user", _invalidate_local)
+
 def create_user(db: Session, user: UserCreate):
     db_user = User(
         keyn_id=user.keyn_id,
@@ -26,11 +64,13 @@ def create_user(db: Session, user: UserCreate):
 
 def update_user(db: Session, db_user: User, user_update: UserUpdate):
     update_data = user_update.dict(exclude_unset=True)
+    old_keyn_id = db_user.keyn_id
     for key, value in update_data.items():
         setattr(db_user, key, value)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    invalidate_user(db_user, old_keyn_id)
     return db_user
 
 def set_approval_status(db: Session, db_user: User, is_approved: bool, request_status: str):
@@ -39,4 +79,5 @@ def set_approval_status(db: Session, db_user: User, is_approved: bool, request_s
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    invalidate_user(db_user)
     return db_user
@@ -0,0 +1,28 @@
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import func
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import DateTime
+
+# SQLAlchemy's text form of a datetime on SQLite, which CURRENT_TIMESTAMP doesn't match
+SQLITE_UTCNOW = "(strftime('%Y-%m-%d %H:%M:%f', 'now') || '000')"
+
+
+class utcnow(FunctionElement):
+    """
+    The current time, for server defaults. On SQLite, where datetimes are
+    text and compare as such, it is written the way SQLAlchemy binds them
+    ('YYYY-MM-DD HH:MM:SS.ffffff'): CURRENT_TIMESTAMP leaves out the
+    fraction, so its rows would sort before bound values of the same second.
+    """
+    type = DateTime(timezone=True)
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow(element, compiler, **kw):
+    return compiler.process(func.now(), **kw)
+
+
+@compiles(utcnow, "sqlite")
+def _utcnow_sqlite(element, compiler, **kw):
+    return SQLITE_UTCNOW
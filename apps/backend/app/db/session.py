@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
@@ -13,3 +14,33 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def to_async_url(url: str) -> str:
+    """Swap a sync driver URL for its asyncio equivalent (sqlite:/// -> sqlite+aiosqlite:///)."""
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}{sep}{rest}"
+
+def _create_async_engine(url: str):
+    # Only aiosqlite ships with the app; other databases bring their own driver
+    try:
+        return create_async_engine(url)
+    except ModuleNotFoundError as e:
+        raise RuntimeError(
+            f"The async engine ({url.partition('://')[0]}) needs the '{e.name}' package, which is not installed. "
+            f"Install it, or point ASYNC_DATABASE_URL at an asyncio driver that is."
+        ) from e
+
+# Async engine for the hot redirect path, so lookups don't hold a threadpool slot.
+# The admin API keeps using the sync engine and CRUD modules above.
+async_engine = _create_async_engine(settings.ASYNC_DATABASE_URL or to_async_url(settings.DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
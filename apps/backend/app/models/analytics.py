@@ -1,14 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Boolean, Column, Integer, String, Date, DateTime, ForeignKey, Index, text, true
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
 from app.db.base import Base
+from app.db.functions import utcnow
 
 class ClickEvent(Base):
     __tablename__ = "click_events"
 
     id = Column(Integer, primary_key=True, index=True)
-    link_id = Column(Integer, ForeignKey("links.id"), nullable=False, index=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    link_id = Column(Integer, ForeignKey("links.id"), nullable=False)
+    timestamp = Column(DateTime(timezone=True), server_default=utcnow(), index=True)
     
     # Analytics Data
     ip_address = Column(String, nullable=True)
@@ -20,6 +20,47 @@ class ClickEvent(Base):
     device_type = Column(String, nullable=True) # mobile, tablet, desktop
     browser = Column(String, nullable=True)
     os = Column(String, nullable=True)
+    # False until the enrichment stage (app.utils.enrichment) has filled the derived
+    # columns and normalized `referrer`, which holds the raw Referer header until then
+    enriched = Column(Boolean, nullable=False, default=True, server_default=true())
 
     # Relationships
     link = relationship("Link", back_populates="events")
+
+    __table_args__ = (
+        # A link's events in time order (rollup rebuilds, per-link time ranges);
+        # also serves every lookup by link_id alone
+        Index("ix_click_events_link_id_timestamp", "link_id", "timestamp"),
+        # Only the (few) rows still waiting for enrichment
+        Index(
+            "ix_click_events_pending", "id",
+            sqlite_where=text("enriched = 0"), postgresql_where=text("NOT enriched"),
+        ),
+        # ... and one link's, for the stats endpoint (pending_dimension_counts)
+        Index(
+            "ix_click_events_pending_link", "link_id", "id",
+            sqlite_where=text("enriched = 0"), postgresql_where=text("NOT enriched"),
+        ),
+    )
+
+
+class LinkDailyClicks(Base):
+    """Rollup: clicks per link per day, maintained as events are written."""
+    __tablename__ = "link_daily_clicks"
+
+    link_id = Column(Integer, ForeignKey("links.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    clicks = Column(Integer, nullable=False, default=0)
+
+
+class LinkDimensionClicks(Base):
+    """
+    Rollup: clicks per link per dimension value (country, referrer, device,
+    browser, os). Unknown values are stored as "" so they upsert like any other.
+    """
+    __tablename__ = "link_dimension_clicks"
+
+    link_id = Column(Integer, ForeignKey("links.id"), primary_key=True)
+    dimension = Column(String, primary_key=True)
+    value = Column(String, primary_key=True)
+    clicks = Column(Integer, nullable=False, default=0)
@@ -1,19 +1,26 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
 from app.db.base import Base
+from app.db.functions import utcnow
 
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
-    action = Column(String, nullable=False, index=True)  # create, update, delete, disable, enable
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    action = Column(String, nullable=False)  # create, update, delete, disable, enable
     target_type = Column(String, nullable=False)  # link, campaign
     target_id = Column(Integer, nullable=False)
     details = Column(String, nullable=True)  # JSON string of changed fields
-    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    timestamp = Column(DateTime(timezone=True), server_default=utcnow(), index=True)
 
     # Relationships
     user = relationship("User", backref="audit_logs")
+
+    __table_args__ = (
+        # get_audit_logs filters by user or action and pages newest first; the
+        # unfiltered (admin) listing walks ix_audit_logs_timestamp
+        Index("ix_audit_logs_user_id_timestamp", "user_id", "timestamp"),
+        Index("ix_audit_logs_action_timestamp", "action", "timestamp"),
+    )
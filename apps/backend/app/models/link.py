@@ -1,7 +1,7 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
 from app.db.base import Base
+from app.db.functions import utcnow
 
 class Link(Base):
     __tablename__ = "links"
@@ -21,7 +21,9 @@ class Link(Base):
     campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=True)
 
     clicks = Column(Integer, default=0)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Bumped whenever the link's click rollups change; keys the stats cache (app.utils.stats_cache)
+    stats_version = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime(timezone=True), server_default=utcnow())
     
     # Access Control
     password_hash = Column(String, nullable=True)
@@ -36,9 +38,23 @@ class Link(Base):
     utm_term = Column(String, nullable=True)
     utm_content = Column(String, nullable=True)
 
+    # original_url with the UTM parameters applied; recomputed on every write
+    redirect_url = Column(String, nullable=True)
+
 
 
     # Relationships
     owner = relationship("User", backref="links") # simplistic backref
     campaign = relationship("Campaign", back_populates="links")
     events = relationship("ClickEvent", back_populates="link", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # A user's live links, newest first (get_links, CSV export); deleted links stay out of it
+        Index(
+            "ix_links_owner_created_live", "owner_id", "created_at",
+            sqlite_where=text("is_deleted = 0"), postgresql_where=text("NOT is_deleted"),
+        ),
+        # A campaign's links, newest first (get_links' campaign filter); also
+        # finds the links to detach when a campaign is deleted
+        Index("ix_links_campaign_created", "campaign_id", "created_at"),
+    )
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from app.db.base import Base
+from app.db.functions import utcnow
+
+
+class LinkChange(Base):
+    """
+    Append-only change log: one row per changed cache key, in commit order.
+    Workers poll it by id to invalidate their in-process caches.
+    """
+    __tablename__ = "link_changes"
+    # Pruning may empty the table; ids must still never be handed out twice, or
+    # workers whose cursor is past them would skip the new changes
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)  # the sequence workers keep a cursor on
+    kind = Column(String, nullable=False)  # link (key = short_code), user (key = keyn_id)
+    key = Column(String, nullable=False)
+    origin = Column(String, nullable=False)  # publishing worker, so it can skip its own changes
+    created_at = Column(DateTime(timezone=True), server_default=utcnow(), index=True)
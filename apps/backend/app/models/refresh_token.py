@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, DateTime
+from app.db.base import Base
+from app.db.functions import utcnow
+
+
+class RefreshToken(Base):
+    """
+    Server-side half of a refresh token. The JWT handed to the client only
+    names its `jti`; the KeyN access token a refresh re-checks stays here.
+    A row is deleted when its token is rotated or revoked.
+    """
+    __tablename__ = "refresh_tokens"
+
+    jti = Column(String, primary_key=True)
+    keyn_id = Column(String, nullable=False, index=True)
+    keyn_token = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=utcnow())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
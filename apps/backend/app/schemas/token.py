@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+
+class Token(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int # seconds until access_token expires
+
+
+class TokenRefresh(BaseModel):
+    refresh_token: str
@@ -1,31 +1,67 @@
 from fastapi import Request
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
+from typing import List, NamedTuple
+from app.core.config import settings
 from app.models.analytics import ClickEvent
-from app.models.link import Link
+from app.utils.click_queue import ClickEventQueue, RawClick
+from app.utils.click_spool import ClickSpool
+from app.utils.cache import LRUCache
+from app.utils.link_cache import RedirectEntry
+from app.utils.rollups import RollupDelta, apply_rollups
 from datetime import datetime
 import user_agents
 
-import requests
+from app.utils import geoip
 from urllib.parse import urlparse
 
 def get_country_code(ip: str) -> str:
     """
-    Fetches the ISO country code for an IP address using ip-api.com.
+    Resolves the ISO country code for an IP address with the configured
+    GeoIP provider (local range database by default, see app.utils.geoip).
     Returns None if lookup fails or IP is local.
     """
     if ip in ("127.0.0.1", "localhost", "::1"):
         return "Local"
-    
-    try:
-        # Free API with 45 requests per minute limit
-        response = requests.get(f"http://ip-api.com/json/{ip}?fields=status,countryCode", timeout=2)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get("status") == "success":
-                return data.get("countryCode")
-    except Exception:
-        pass
-    return None
+    if not ip:
+        return None
+
+    return geoip.get_resolver().lookup(ip)
+
+class UserAgentInfo(NamedTuple):
+    device_type: str # mobile, tablet, desktop
+    os: str
+    browser: str
+    is_bot: bool
+
+# Raw UA string -> UserAgentInfo. Real traffic has very few distinct UAs,
+# so almost every click skips the user_agents regex chain.
+user_agent_cache = LRUCache(maxsize=settings.UA_CACHE_SIZE)
+
+def parse_user_agent(user_agent_string: str) -> UserAgentInfo:
+    """
+    Parses a user agent into the fields we store, memoized by the raw string.
+    """
+    info = user_agent_cache.get(user_agent_string)
+    if info is not None:
+        return info
+
+    ua_data = user_agents.parse(user_agent_string)
+
+    device_type = "desktop"
+    if ua_data.is_mobile:
+        device_type = "mobile"
+    elif ua_data.is_tablet:
+        device_type = "tablet"
+
+    info = UserAgentInfo(
+        device_type=device_type,
+        os=ua_data.os.family,
+        browser=ua_data.browser.family,
+        is_bot=ua_data.is_bot,
+    )
+    user_agent_cache.set(user_agent_string, info)
+    return info
 
 def normalize_referrer(referrer_url: str) -> str:
     """
@@ -60,47 +96,83 @@ def get_client_ip(request: Request) -> str:
         
     return request.client.host
 
-def capture_click(db: Session, link: Link, request: Request):
+def raw_click_row(click: RawClick) -> dict:
     """
-    Captures analytics data for a link click.
+    A click_events row holding only what was captured: the referrer is the raw
+    header and the derived columns are left for the enrichment stage.
     """
-    if not link.track_activity:
-        return
+    return {
+        "link_id": click.link_id,
+        "ip_address": click.ip_address,
+        "user_agent": click.user_agent,
+        "referrer": click.referrer or None,
+        "timestamp": click.timestamp,
+        "enriched": False,
+    }
 
-    ip_address = get_client_ip(request)
-    user_agent_string = request.headers.get("user-agent", "")
-    raw_referrer = request.headers.get("referer", "")
+def write_click_batch(db: Session, clicks: List[RawClick]):
+    """
+    Inserts a batch of raw clicks with a single executemany and upserts the
+    daily rollup in the same transaction. Parsing, GeoIP and the dimension
+    rollups are done later, in batches, by the enrichment stage.
+    """
+    rows = [raw_click_row(click) for click in clicks]
+    delta = RollupDelta()
+    for row in rows:
+        delta.add_daily(row)
+    db.execute(insert(ClickEvent.__table__), rows)
+    apply_rollups(db, delta)
+    db.commit()
 
-    # Normalize Referrer
-    referrer = normalize_referrer(raw_referrer)
+click_queue = ClickEventQueue(
+    writer=write_click_batch,
+    maxsize=settings.CLICK_QUEUE_MAXSIZE,
+    batch_size=settings.CLICK_QUEUE_BATCH_SIZE,
+    flush_interval_ms=settings.CLICK_QUEUE_FLUSH_INTERVAL_MS,
+    policy=settings.CLICK_QUEUE_POLICY,
+    workers=settings.CLICK_QUEUE_WORKERS,
+    block_timeout_ms=settings.CLICK_QUEUE_BLOCK_TIMEOUT_MS,
+)
 
-    # Parse User Agent
-    ua_data = user_agents.parse(user_agent_string)
-    
-    device_type = "desktop"
-    if ua_data.is_mobile:
-        device_type = "mobile"
-    elif ua_data.is_tablet:
-        device_type = "tablet"
-        
-    os = ua_data.os.family
-    browser = ua_data.browser.family
+click_spool = ClickSpool(
+    directory=settings.CLICK_SPOOL_DIR,
+    writer=write_click_batch,
+    fsync=settings.CLICK_SPOOL_FSYNC,
+    fsync_interval_ms=settings.CLICK_SPOOL_FSYNC_INTERVAL_MS,
+    segment_max_bytes=settings.CLICK_SPOOL_SEGMENT_BYTES,
+    segment_max_age_ms=settings.CLICK_SPOOL_SEGMENT_AGE_MS,
+    batch_size=settings.CLICK_SPOOL_BATCH_SIZE,
+)
 
-    # GeoIP Lookup
-    country_code = get_country_code(ip_address)
+def capture_may_block() -> bool:
+    """
+    Whether capture_click can wait: queue full under "block", or an fsync per
+    spooled click under "always" (the other spool policies leave sealing and
+    fsyncs to the drainer thread, see ClickSpool).
+    """
+    if settings.CLICK_INGEST == "spool":
+        return click_spool.fsync == "always"
+    return click_queue.policy == "block"
+
+def capture_click(link: RedirectEntry, request: Request) -> bool:
+    """
+    Captures analytics data for a link click.
+    Accepts anything with `id` and `track_activity` (a RedirectEntry or a Link).
 
-    event = ClickEvent(
+    Only the raw facts are recorded here (queued in memory, or appended to
+    the on-disk spool when CLICK_INGEST is "spool"); the INSERT and, later,
+    parsing and GeoIP happen in the background, off the redirect path.
+    """
+    if not link.track_activity:
+        return False
+
+    click = RawClick(
         link_id=link.id,
-        ip_address=ip_address,
-        user_agent=user_agent_string,
-        referrer=referrer,
-        device_type=device_type,
-        os=os,
-        browser=browser,
-        country_code=country_code,
-        timestamp=datetime.utcnow()
+        ip_address=get_client_ip(request),
+        user_agent=request.headers.get("user-agent", ""),
+        referrer=request.headers.get("referer", ""),
+        timestamp=datetime.utcnow(),
     )
-    
-    db.add(event)
-    db.commit()
-
+    if settings.CLICK_INGEST == "spool":
+        return click_spool.append(click)
+    return click_queue.put(click)
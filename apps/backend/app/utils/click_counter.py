@@ -0,0 +1,139 @@
+import threading
+from collections import defaultdict
+from typing import Callable, Optional
+
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.link import Link
+
+links_table = Link.__table__
+
+# One statement, executed with a parameter list (executemany) per flush
+_increment_stmt = (
+    update(links_table)
+    .where(links_table.c.id == bindparam("link_id"))
+    .values(clicks=func.coalesce(links_table.c.clicks, 0) + bindparam("n"))
+)
+
+
+class ClickCounter:
+    """
+    Write-behind aggregator for Link.clicks.
+
+    Increments are summed in memory per link id and written out as a single
+    batched `UPDATE links SET clicks = clicks + :n` either every
+    `flush_interval_ms` or as soon as `max_pending` clicks are buffered.
+    """
+
+    def __init__(
+        self,
+        flush_interval_ms: int = 1000,
+        max_pending: int = 500,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self.session_factory = session_factory
+        self._pending: "defaultdict[int, int]" = defaultdict(int)
+        self._pending_clicks = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushes = 0
+        self.flushed_clicks = 0
+        self.errors = 0
+
+    def add(self, link_id: int, n: int = 1):
+        with self._lock:
+            self._pending[link_id] += n
+            self._pending_clicks += n
+            full = self._pending_clicks >= self.max_pending
+        if full:
+            if self._thread and self._thread.is_alive():
+                self._wakeup.set()
+            else:
+                self.flush()
+
+    def flush(self, db: Optional[Session] = None) -> int:
+        """Write all buffered increments in one transaction. Returns clicks written."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, defaultdict(int)
+                self._pending_clicks = 0
+
+            own_session = db is None
+            db = db or self.session_factory()
+            try:
+                db.execute(_increment_stmt, [{"link_id": k, "n": v} for k, v in batch.items()])
+                db.commit()
+            except Exception:
+                db.rollback()
+                self.errors += 1
+                # Put the batch back so the next flush retries it
+                with self._lock:
+                    for link_id, n in batch.items():
+                        self._pending[link_id] += n
+                        self._pending_clicks += n
+                raise
+            finally:
+                if own_session:
+                    db.close()
+
+            written = sum(batch.values())
+            self.flushes += 1
+            self.flushed_clicks += written
+            return written
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing click counts: {e}")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="click-counter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background flusher and write whatever is still buffered."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def reset(self):
+        """Discard buffered increments and counters (used by tests)."""
+        with self._lock:
+            self._pending.clear()
+            self._pending_clicks = 0
+        self.flushes = self.flushed_clicks = self.errors = 0
+
+    def stats(self) -> dict:
+        return {
+            "pending_links": len(self._pending),
+            "pending_clicks": self._pending_clicks,
+            "flushes": self.flushes,
+            "flushed_clicks": self.flushed_clicks,
+            "errors": self.errors,
+        }
+
+
+click_counter = ClickCounter(
+    flush_interval_ms=settings.CLICK_FLUSH_INTERVAL_MS,
+    max_pending=settings.CLICK_FLUSH_MAX_PENDING,
+)
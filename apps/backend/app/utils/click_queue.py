@@ -0,0 +1,187 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+
+POLICIES = ("drop", "oldest", "block")
+
+
+class RawClick(NamedTuple):
+    """The raw facts of a click, captured on the request path without any parsing."""
+    link_id: int
+    ip_address: Optional[str]
+    user_agent: str
+    referrer: str
+    timestamp: datetime
+
+
+class ClickEventQueue:
+    """
+    Bounded in-process queue between the redirect path and the click_events table.
+
+    Redirects only append a RawClick; background workers drain it in batches
+    and hand each batch to `writer(db, clicks)`, which is expected to insert
+    the whole batch in one transaction.
+
+    When the queue is full, `policy` decides what happens to a new click:
+    - "drop":   discard the new click
+    - "oldest": discard the oldest queued click to make room
+    - "block":  wait up to `block_timeout_ms` for room, then discard
+    """
+
+    def __init__(
+        self,
+        writer: Callable[[Session, List[RawClick]], None],
+        maxsize: int = 10000,
+        batch_size: int = 200,
+        flush_interval_ms: int = 500,
+        policy: str = "drop",
+        workers: int = 1,
+        block_timeout_ms: int = 50,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy '{policy}', expected one of {POLICIES}")
+        self.writer = writer
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.policy = policy
+        self.workers = workers
+        self.block_timeout = block_timeout_ms / 1000
+        self.session_factory = session_factory
+
+        self._items: "deque[RawClick]" = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.inserted = 0
+        self.batches = 0
+        self.errors = 0
+
+    # -- producer side -----------------------------------------------------
+
+    def put(self, click: RawClick) -> bool:
+        """Enqueue a click. Returns False if it was dropped by the backpressure policy."""
+        with self._lock:
+            if len(self._items) >= self.maxsize:
+                if self.policy == "oldest":
+                    self._items.popleft()
+                    self.dropped += 1
+                elif self.policy == "block":
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._items) >= self.maxsize:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or not self._not_full.wait(remaining):
+                            self.dropped += 1
+                            return False
+                else:
+                    self.dropped += 1
+                    return False
+            self._items.append(click)
+            self.enqueued += 1
+            if len(self._items) >= self.batch_size:
+                self._not_empty.notify()
+            return True
+
+    # -- consumer side -----------------------------------------------------
+
+    def _take(self, limit: int) -> List[RawClick]:
+        # Caller holds the lock
+        batch = []
+        while self._items and len(batch) < limit:
+            batch.append(self._items.popleft())
+        if batch:
+            self._not_full.notify_all()
+        return batch
+
+    def _write(self, batch: List[RawClick], db: Optional[Session] = None):
+        own_session = db is None
+        db = db or self.session_factory()
+        try:
+            self.writer(db, batch)
+            self.inserted += len(batch)
+            self.batches += 1
+        except Exception as e:
+            db.rollback()
+            self.errors += 1
+            self.dropped += len(batch)
+            print(f"Error writing click events batch: {e}")
+        finally:
+            if own_session:
+                db.close()
+
+    def drain(self, db: Optional[Session] = None) -> int:
+        """Synchronously write out everything queued. Returns the number of clicks taken."""
+        taken = 0
+        while True:
+            with self._lock:
+                batch = self._take(self.batch_size)
+            if not batch:
+                return taken
+            taken += len(batch)
+            self._write(batch, db)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if len(self._items) < self.batch_size and not self._stopping:
+                    self._not_empty.wait(self.flush_interval)
+                if self._stopping and not self._items:
+                    return
+                batch = self._take(self.batch_size)
+            if batch:
+                self._write(batch)
+
+    def start(self):
+        if any(t.is_alive() for t in self._threads):
+            return
+        self._stopping = False
+        self._threads = [
+            threading.Thread(target=self._run, name=f"click-queue-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        """Stop the workers once the queue has been fully drained."""
+        with self._lock:
+            self._stopping = True
+            self._not_empty.notify_all()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+        self.drain()
+
+    def clear(self):
+        """Discard queued clicks and reset counters (used by tests)."""
+        with self._lock:
+            self._items.clear()
+            self._not_full.notify_all()
+        self.enqueued = self.dropped = self.inserted = self.batches = self.errors = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._items),
+            "maxsize": self.maxsize,
+            "policy": self.policy,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "inserted": self.inserted,
+            "batches": self.batches,
+            "errors": self.errors,
+        }
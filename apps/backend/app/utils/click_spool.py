@@ -0,0 +1,371 @@
+import fcntl
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.utils.click_queue import RawClick
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+# Record framing: payload length, CRC32 of the payload
+_FRAME = struct.Struct("<II")
+# Payload: link id, timestamp (epoch seconds), then the lengths of ip, user agent, referrer
+_FIXED = struct.Struct("<IdHHH")
+_NO_IP = 0xFFFF
+
+# Segment files: clicks-<writer>-<seq>.open while being appended to, .seg once sealed
+OPEN_SUFFIX = ".open"
+SEALED_SUFFIX = ".seg"
+OFFSET_SUFFIX = ".offset"
+
+
+def encode_click(click: RawClick) -> bytes:
+    ip = click.ip_address.encode("utf-8") if click.ip_address is not None else b""
+    ua = click.user_agent.encode("utf-8")[:0xFFFF]
+    referrer = click.referrer.encode("utf-8")[:0xFFFF]
+    timestamp = click.timestamp.replace(tzinfo=timezone.utc).timestamp()
+    payload = _FIXED.pack(
+        click.link_id, timestamp, len(ip) if click.ip_address is not None else _NO_IP, len(ua), len(referrer)
+    ) + ip + ua + referrer
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_click(payload: bytes) -> RawClick:
+    link_id, timestamp, ip_len, ua_len, referrer_len = _FIXED.unpack_from(payload, 0)
+    pos = _FIXED.size
+    ip = None
+    if ip_len != _NO_IP:
+        ip = payload[pos:pos + ip_len].decode("utf-8")
+        pos += ip_len
+    ua = payload[pos:pos + ua_len].decode("utf-8", "replace")
+    pos += ua_len
+    referrer = payload[pos:pos + referrer_len].decode("utf-8", "replace")
+    return RawClick(
+        link_id=link_id,
+        ip_address=ip,
+        user_agent=ua,
+        referrer=referrer,
+        timestamp=datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None),
+    )
+
+
+def read_segment(f, offset: int = 0) -> Iterator[Tuple[int, RawClick]]:
+    """
+    Yields (offset after the record, click) from `offset` on. Stops at the
+    first torn or corrupt record: a crash can only leave one at the tail.
+    """
+    f.seek(offset)
+    while True:
+        frame = f.read(_FRAME.size)
+        if len(frame) < _FRAME.size:
+            return
+        length, crc = _FRAME.unpack(frame)
+        payload = f.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            raise EOFError(f"corrupt record at offset {offset}")
+        offset += _FRAME.size + length
+        yield offset, decode_click(payload)
+
+
+class ClickSpool:
+    """
+    Durable, append-only spool between the redirect path and click_events.
+
+    `append` frames a RawClick (length, CRC32, compact binary payload) and
+    writes it to the current segment with a single `os.write`, so a click is
+    in the kernel as soon as it returns and survives a worker crash or
+    deploy. `fsync` decides when it also reaches the disk:
+    - "always":   fsync after every record (survives power loss; slowest)
+    - "interval": fsync every `fsync_interval_ms` (loses at most that window on power loss)
+    - "never":    leave it to the OS
+
+    `append` never waits on the disk (except under "always"): a full
+    segment is only handed over, and the drainer thread seals it (fsync,
+    rename) and runs the "interval" fsyncs outside the append lock.
+
+    Segments are rotated by size and age. A drainer thread loads sealed
+    segments into click_events in batches through `writer(db, clicks)`
+    (committing each batch), records the committed offset next to the
+    segment, and deletes the segment once it is fully loaded. Delivery is
+    at-least-once: a crash between a commit and its offset write replays
+    that one batch.
+
+    Several workers can share a directory. Each appends to its own segment
+    and holds an flock on it; a drainer only touches segments it can lock,
+    so on startup (and every pass) it also replays whatever a crashed
+    worker left behind, including that worker's unsealed segment.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        writer: Callable[[Session, List[RawClick]], None],
+        fsync: str = "interval",
+        fsync_interval_ms: int = 200,
+        segment_max_bytes: int = 4 * 1024 * 1024,
+        segment_max_age_ms: int = 1000,
+        batch_size: int = 1000,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}', expected one of {FSYNC_POLICIES}")
+        self.directory = directory
+        self.writer = writer
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval_ms / 1000
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_age = segment_max_age_ms / 1000
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+        self.writer_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._path: Optional[str] = None
+        self._seq = 0
+        self._size = 0
+        self._opened_at = 0.0
+        self._dirty = False
+        # Full segments (fd, path, dirty) waiting for the drainer thread to seal them
+        self._retired: List[Tuple[int, str, bool]] = []
+        self._drain_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.appended = 0
+        self.inserted = 0
+        self.segments_drained = 0
+        self.replayed = 0
+        self.corrupt = 0
+        self.errors = 0
+
+    # -- producer side -----------------------------------------------------
+
+    def _open_segment(self):
+        # Caller holds the lock
+        os.makedirs(self.directory, exist_ok=True)
+        self._seq += 1
+        self._path = os.path.join(self.directory, f"clicks-{self.writer_id}-{self._seq:08d}{OPEN_SUFFIX}")
+        self._fd = os.open(self._path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._size = 0
+        self._opened_at = time.monotonic()
+
+    def _retire(self):
+        # Caller holds the lock. No I/O: the segment stays locked and .open until sealed
+        if self._fd is None:
+            return
+        self._retired.append((self._fd, self._path, self._dirty))
+        self._fd = self._path = None
+        self._dirty = False
+
+    def _seal_retired(self):
+        with self._lock:
+            retired, self._retired = self._retired, []
+        for fd, path, dirty in retired:
+            if self.fsync != "never" and dirty:
+                os.fsync(fd)
+            # Rename before unlocking, so a drainer never sees an unlocked .open of a live writer
+            os.rename(path, path[:-len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+            os.close(fd)
+
+    def append(self, click: RawClick) -> bool:
+        record = encode_click(click)
+        with self._lock:
+            if self._fd is None:
+                self._open_segment()
+            os.write(self._fd, record)
+            self._size += len(record)
+            self.appended += 1
+            if self.fsync == "always":
+                os.fsync(self._fd)
+            else:
+                self._dirty = True
+            if self._size >= self.segment_max_bytes:
+                self._retire()
+        return True
+
+    def rotate(self, min_age: float = 0.0):
+        """Seal the current segment (if any and at least `min_age` seconds old) and any full ones."""
+        with self._lock:
+            if self._fd is not None and self._size and time.monotonic() - self._opened_at >= min_age:
+                self._retire()
+        self._seal_retired()
+
+    def sync(self):
+        with self._lock:
+            if self._fd is None or not self._dirty:
+                return
+            # fsync a duplicate outside the lock, so appends don't wait for the disk
+            fd = os.dup(self._fd)
+            self._dirty = False
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # -- drainer side ------------------------------------------------------
+
+    def _segments(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            os.path.join(self.directory, name) for name in names
+            if name.endswith(SEALED_SUFFIX) or name.endswith(OPEN_SUFFIX)
+        )
+
+    def _write(self, db: Session, batch: List[RawClick]):
+        try:
+            self.writer(db, batch)
+        except Exception:
+            db.rollback()
+            raise
+
+    def _drain_segment(self, path: str, db: Session) -> int:
+        """Load one segment if nobody else holds it. Returns the number of clicks written."""
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return 0
+        with f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0  # a live writer's segment, or another drainer has it
+            try:
+                if os.stat(path).st_ino != os.fstat(f.fileno()).st_ino:
+                    return 0
+            except FileNotFoundError:
+                return 0  # drained and deleted while we waited to open it
+
+            offset_path = path.rsplit(".", 1)[0] + OFFSET_SUFFIX
+            offset = 0
+            if os.path.exists(offset_path):
+                with open(offset_path) as marker:
+                    offset = int(marker.read() or 0)
+
+            written = 0
+            batch: List[RawClick] = []
+            position = offset
+            try:
+                for position, click in read_segment(f, offset):
+                    batch.append(click)
+                    if len(batch) >= self.batch_size:
+                        self._write(db, batch)
+                        written += len(batch)
+                        batch = []
+                        self._save_offset(offset_path, position)
+            except EOFError as e:
+                # Only the tail can be torn; everything before it is loaded below
+                self.corrupt += 1
+                print(f"Click spool segment {os.path.basename(path)}: {e}")
+            if batch:
+                self._write(db, batch)
+                written += len(batch)
+
+            os.unlink(path)
+            if os.path.exists(offset_path):
+                os.unlink(offset_path)
+            if path.endswith(OPEN_SUFFIX) or f"-{self.writer_id}-" not in path:
+                self.replayed += written
+            self.segments_drained += 1
+            self.inserted += written
+            return written
+
+    @staticmethod
+    def _save_offset(path: str, offset: int):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as marker:
+            marker.write(str(offset))
+        os.replace(tmp, path)
+
+    def drain(self, db: Optional[Session] = None, rotate: bool = True) -> int:
+        """
+        Seal the current segment (unless `rotate` is False) and load every
+        segment this process can lock. Returns the number of clicks written.
+        """
+        if rotate:
+            self.rotate()
+        own_session = db is None
+        with self._drain_lock:
+            db = db or self.session_factory()
+            try:
+                written = 0
+                for path in self._segments():
+                    written += self._drain_segment(path, db)
+                return written
+            finally:
+                if own_session:
+                    db.close()
+
+    def _run(self):
+        last_sync = time.monotonic()
+        interval = min(self.segment_max_age, self.fsync_interval) if self.fsync == "interval" else self.segment_max_age
+        while not self._stopping.wait(interval):
+            try:
+                if self.fsync == "interval" and time.monotonic() - last_sync >= self.fsync_interval:
+                    self.sync()
+                    last_sync = time.monotonic()
+                self.rotate(min_age=self.segment_max_age)
+                self.drain(rotate=False)
+            except Exception as e:
+                # The segment stays on disk and is retried on the next pass
+                self.errors += 1
+                print(f"Error draining click spool: {e}")
+
+    def start(self):
+        """Replay leftover segments, then keep draining in the background."""
+        if self._thread and self._thread.is_alive():
+            return
+        try:
+            self.drain(rotate=False)
+        except Exception as e:
+            self.errors += 1
+            print(f"Error replaying click spool: {e}")
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="click-spool", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the drainer, then seal and load what is left."""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.drain()
+        except Exception as e:
+            # Sealed on disk: the next start replays it
+            self.errors += 1
+            print(f"Error draining click spool on shutdown: {e}")
+
+    def close(self):
+        """Seal the current segment without draining (used by tests and benchmarks)."""
+        with self._lock:
+            self._retire()
+        self._seal_retired()
+
+    def stats(self) -> dict:
+        segments = self._segments()
+        return {
+            "directory": self.directory,
+            "fsync": self.fsync,
+            "segments": len(segments),
+            "pending_bytes": sum(os.path.getsize(p) for p in segments if os.path.exists(p)),
+            "appended": self.appended,
+            "inserted": self.inserted,
+            "replayed": self.replayed,
+            "segments_drained": self.segments_drained,
+            "corrupt_segments": self.corrupt,
+            "errors": self.errors,
+        }
@@ -0,0 +1,166 @@
+import threading
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.link import Link
+from app.utils.bloom import BloomFilter
+
+
+class ShortCodeFilter:
+    """
+    Bloom filter of every live short code, so lookups for codes that were
+    never created (scanners, typos) are answered without a database query.
+
+    Until the first build completes every code is a "maybe" and lookups
+    behave exactly as without the filter. Codes are added as links are
+    written (see `invalidate_codes`); a Bloom filter can't forget, so deleted
+    codes stay "maybe" until the periodic rebuild, which also picks up links
+    created by other workers.
+    """
+
+    def __init__(
+        self,
+        error_rate: float = 0.01,
+        min_capacity: int = 100000,
+        rebuild_interval: float = 300.0,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        self.error_rate = error_rate
+        self.min_capacity = min_capacity
+        self.rebuild_interval = rebuild_interval
+        self.session_factory = session_factory
+        self._filter: Optional[BloomFilter] = None
+        self._lock = threading.Lock()
+        self._building = False
+        self._added_during_build: List[str] = []
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.built_at: Optional[float] = None
+        self.builds = 0
+        self.rejected = 0
+        self.false_positives = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def might_contain(self, short_code: str) -> bool:
+        bloom = self._filter
+        if bloom is None or short_code in bloom:
+            return True
+        self.rejected += 1
+        return False
+
+    def record_false_positive(self):
+        """The filter said "maybe" but the database had no such code."""
+        if self._filter is not None:
+            self.false_positives += 1
+
+    def add(self, short_code: str):
+        with self._lock:
+            if self._building:
+                self._added_during_build.append(short_code)
+            if self._filter is not None:
+                self._filter.add(short_code)
+
+    def build(self, db: Optional[Session] = None) -> int:
+        """(Re)build from the links table and swap it in. Returns the number of codes."""
+        with self._lock:
+            self._building = True
+            self._added_during_build = []
+        own_session = db is None
+        db = db or self.session_factory()
+        try:
+            codes = db.execute(
+                select(Link.short_code).where(Link.is_deleted == False)
+            ).scalars().all()
+        except Exception:
+            with self._lock:
+                self._building = False
+            raise
+        finally:
+            if own_session:
+                db.close()
+
+        # Headroom so codes created before the next rebuild don't degrade the error rate
+        bloom = BloomFilter(max(self.min_capacity, 2 * len(codes)), self.error_rate)
+        bloom.update(codes)
+        with self._lock:
+            # Codes written while we were reading may be missing from the snapshot
+            bloom.update(self._added_during_build)
+            self._added_during_build = []
+            self._building = False
+            self._filter = bloom
+            self.built_at = time.time()
+            self.builds += 1
+            self.rejected = self.false_positives = 0
+        return len(codes)
+
+    def _run(self):
+        while not self._stopping.wait(self.rebuild_interval):
+            try:
+                self.build()
+            except Exception as e:
+                print(f"Error rebuilding short code filter: {e}")
+
+    def start(self):
+        """Build now, then rebuild every `rebuild_interval` seconds in the background."""
+        if self._thread and self._thread.is_alive():
+            return
+        try:
+            self.build()
+        except Exception as e:
+            # Not fatal: without a filter every lookup simply goes to the database
+            print(f"Error building short code filter: {e}")
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="short-code-filter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def reset(self):
+        """Drop the filter so every code is a "maybe" again (used by tests)."""
+        with self._lock:
+            self._filter = None
+            self._building = False
+            self._added_during_build = []
+        self.built_at = None
+        self.builds = self.rejected = self.false_positives = 0
+
+    def stats(self) -> dict:
+        bloom = self._filter
+        if bloom is None:
+            return {"ready": False}
+        # Observed rate: of the lookups for codes that don't exist, how many got past the filter
+        negatives = self.rejected + self.false_positives
+        return {
+            "ready": True,
+            "codes": bloom.count,
+            "capacity": bloom.capacity,
+            "bits": bloom.num_bits,
+            "hashes": bloom.num_hashes,
+            "memory_bytes": bloom.memory_bytes,
+            "target_fp_rate": bloom.error_rate,
+            "estimated_fp_rate": round(bloom.estimated_false_positive_rate(), 6),
+            "observed_fp_rate": round(self.false_positives / negatives, 6) if negatives else 0.0,
+            "rejected": self.rejected,
+            "false_positives": self.false_positives,
+            "built_at": self.built_at,
+            "builds": self.builds,
+        }
+
+
+short_code_filter = ShortCodeFilter(
+    error_rate=settings.SHORT_CODE_FILTER_ERROR_RATE,
+    min_capacity=settings.SHORT_CODE_FILTER_MIN_CAPACITY,
+    rebuild_interval=settings.SHORT_CODE_FILTER_REBUILD_INTERVAL,
+)
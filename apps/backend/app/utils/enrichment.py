@@ -0,0 +1,214 @@
+"""
+Background enrichment of click events.
+
+Ingestion stores only what the redirect captured (IP, user agent, raw
+Referer) with `enriched = false`. `ClickEnricher` picks those rows up in id
+order, a batch at a time, and fills `device_type`, `os`, `browser`,
+`country_code` and the normalized `referrer`. Within a batch every distinct
+user agent, IP and referrer is resolved once.
+
+Rows are claimed with `UPDATE ... WHERE id IN (...) AND NOT enriched`,
+grouped by their derived values, and the dimension rollups are incremented
+by the claimed row counts in the same transaction. Several enrichers (one
+per worker) can run at once without counting a row twice.
+
+Until a row is enriched it is in the daily rollup but not the dimension
+rollup; `pending_dimension_counts` enriches a link's pending rows on the fly
+so stats reads still add up. It resolves countries only from a local GeoIP
+database: with a remote provider they count as unknown until the enricher
+gets to them, rather than costing the request a lookup per distinct IP.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.analytics import ClickEvent
+from app.utils import geoip
+from app.utils.analytics import get_country_code, normalize_referrer, parse_user_agent
+from app.utils.rollups import DIMENSIONS, RollupDelta, apply_rollups
+
+DERIVED_COLUMNS = ("referrer", "device_type", "os", "browser", "country_code")
+
+click_events = ClickEvent.__table__
+
+_pending_columns = select(
+    ClickEvent.id, ClickEvent.link_id, ClickEvent.ip_address, ClickEvent.user_agent, ClickEvent.referrer,
+).where(ClickEvent.enriched == False)
+
+
+def enrich_rows(rows: Sequence, local_only: bool = False) -> List[dict]:
+    """
+    Derived column values for each raw row, resolving each distinct UA/IP/referrer once.
+    With `local_only`, countries are left unresolved (None) if that takes network calls.
+    """
+    resolve_countries = not (local_only and geoip.get_resolver().remote)
+    agents: Dict[str, tuple] = {}
+    countries: Dict[Optional[str], Optional[str]] = {}
+    referrers: Dict[Optional[str], Optional[str]] = {}
+    derived = []
+    for row in rows:
+        ua = row.user_agent or ""
+        if ua not in agents:
+            agents[ua] = parse_user_agent(ua)
+        if row.ip_address not in countries:
+            countries[row.ip_address] = get_country_code(row.ip_address) if resolve_countries else None
+        if row.referrer not in referrers:
+            referrers[row.referrer] = normalize_referrer(row.referrer)
+        info = agents[ua]
+        derived.append({
+            "referrer": referrers[row.referrer],
+            "device_type": info.device_type,
+            "os": info.os,
+            "browser": info.browser,
+            "country_code": countries[row.ip_address],
+        })
+    return derived
+
+
+def pending_dimension_counts(db: Session, link_id: int, limit: Optional[int] = None) -> Counter:
+    """
+    (dimension, value) -> clicks for a link's rows not enriched yet, derived
+    on the fly, without remote GeoIP lookups. Rows past `limit` are counted
+    as unknown ("").
+    """
+    limit = settings.ENRICHMENT_STATS_PENDING_LIMIT if limit is None else limit
+    pending = _pending_columns.where(ClickEvent.link_id == link_id)
+    rows = db.execute(pending.order_by(ClickEvent.id).limit(limit)).all()
+    counts: Counter = Counter()
+    for values in enrich_rows(rows, local_only=True):
+        for dimension, column in DIMENSIONS.items():
+            counts[(dimension, values[column] or "")] += 1
+    if len(rows) == limit:
+        rest = db.execute(
+            select(func.count()).select_from(pending.order_by(None).subquery())
+        ).scalar() - limit
+        for dimension in DIMENSIONS:
+            if rest > 0:
+                counts[(dimension, "")] += rest
+    return counts
+
+
+class ClickEnricher:
+    def __init__(
+        self,
+        batch_size: int = 500,
+        interval_ms: int = 1000,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000
+        self.session_factory = session_factory
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.enriched = 0
+        self.batches = 0
+        self.lost_claims = 0
+        self.errors = 0
+        self.last_batch_seconds = 0.0
+
+    def enrich_batch(self, db: Session) -> int:
+        """Enrich the oldest pending batch and commit. Returns the number of rows this call claimed."""
+        rows = db.execute(_pending_columns.order_by(ClickEvent.id).limit(self.batch_size)).all()
+        if not rows:
+            return 0
+        started = time.perf_counter()
+
+        groups: Dict[tuple, List[int]] = defaultdict(list)
+        for row, values in zip(rows, enrich_rows(rows)):
+            groups[(row.link_id,) + tuple(values[column] for column in DERIVED_COLUMNS)].append(row.id)
+
+        delta = RollupDelta()
+        claimed = 0
+        for key, ids in groups.items():
+            values = dict(zip(DERIVED_COLUMNS, key[1:]))
+            result = db.execute(
+                update(click_events)
+                .where(click_events.c.id.in_(ids), click_events.c.enriched == False)
+                .values(enriched=True, **values)
+            )
+            # Another enricher may have claimed some of these rows first
+            if result.rowcount:
+                delta.add_dimensions({"link_id": key[0], **values}, result.rowcount)
+            claimed += result.rowcount
+        apply_rollups(db, delta)
+        db.commit()
+
+        self.enriched += claimed
+        self.lost_claims += len(rows) - claimed
+        self.batches += 1
+        self.last_batch_seconds = time.perf_counter() - started
+        return claimed
+
+    def run_pending(self, db: Optional[Session] = None, max_batches: Optional[int] = None) -> int:
+        """Enrich batches until nothing is pending (or `max_batches`). Returns rows enriched."""
+        own_session = db is None
+        db = db or self.session_factory()
+        total = 0
+        batches = 0
+        try:
+            while max_batches is None or batches < max_batches:
+                try:
+                    claimed = self.enrich_batch(db)
+                except Exception:
+                    db.rollback()
+                    raise
+                batches += 1
+                if not claimed:
+                    # Nothing pending, or every row was taken by another enricher
+                    if not db.execute(_pending_columns.limit(1)).first():
+                        break
+                total += claimed
+            return total
+        finally:
+            if own_session:
+                db.close()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                # Bounded, so stop() is never kept waiting behind a large backlog
+                self.run_pending(max_batches=20)
+            except Exception as e:
+                # The rows stay pending and are retried on the next pass
+                self.errors += 1
+                print(f"Error enriching click events: {e}")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="click-enricher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread. Pending rows stay pending for the next start."""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def reset(self):
+        self.enriched = self.batches = self.lost_claims = self.errors = 0
+        self.last_batch_seconds = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "enriched": self.enriched,
+            "batches": self.batches,
+            "lost_claims": self.lost_claims,
+            "errors": self.errors,
+            "last_batch_seconds": round(self.last_batch_seconds, 4),
+        }
+
+
+click_enricher = ClickEnricher(
+    batch_size=settings.ENRICHMENT_BATCH_SIZE,
+    interval_ms=settings.ENRICHMENT_INTERVAL_MS,
+)
@@ -0,0 +1,212 @@
+"""
+Pluggable IP -> country resolution.
+
+The default provider is a local IP-range database: a normalized text file
+(one `family,start,end,country` line per range, see `app.cli.geoip`) that is
+loaded into sorted integer arrays and searched with bisect. No network I/O
+happens on lookup.
+"""
+import os
+import socket
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from typing import Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.http import geoip_api
+
+# (family, start, end, country_code)
+Range = Tuple[int, int, int, str]
+
+
+def ip_to_int(ip: str) -> Tuple[int, int]:
+    """Returns (family, integer value) for an IPv4 or IPv6 address string."""
+    if ":" in ip:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")
+    return 4, int.from_bytes(socket.inet_aton(ip), "big")
+
+
+class GeoIPResolver:
+    """Base resolver: maps an IP address string to an ISO country code or None."""
+
+    name = "none"
+    remote = False  # lookups make a network call
+
+    def lookup(self, ip: str) -> Optional[str]:
+        return None
+
+    def stats(self) -> dict:
+        return {"provider": self.name}
+
+
+class RangeDatabaseResolver(GeoIPResolver):
+    """
+    Resolves countries from sorted, non-overlapping IP ranges held in
+    integer arrays (IPv4 ends in a compact `array`, IPv6 as Python ints).
+    """
+
+    name = "local"
+
+    def __init__(self, ranges: Iterable[Range], source: Optional[str] = None):
+        self.source = source
+        ranges = list(ranges)
+        v4 = sorted(r for r in ranges if r[0] == 4)
+        v6 = sorted(r for r in ranges if r[0] == 6)
+        # Starts stay a plain list: bisect over an array("I") re-boxes an int on
+        # every comparison and is about twice as slow. Ends are read once per lookup.
+        self._v4_starts: List[int] = [r[1] for r in v4]
+        self._v4_ends = array("I", (r[2] for r in v4))
+        self._v4_countries: List[str] = [r[3] for r in v4]
+        self._v6_starts: List[int] = [r[1] for r in v6]
+        self._v6_ends: List[int] = [r[2] for r in v6]
+        self._v6_countries: List[str] = [r[3] for r in v6]
+        self.lookups = 0
+        self.found = 0
+
+    @classmethod
+    def from_file(cls, path: str) -> "RangeDatabaseResolver":
+        return cls(read_ranges(path), source=path)
+
+    def lookup(self, ip: str) -> Optional[str]:
+        self.lookups += 1
+        try:
+            family, value = ip_to_int(ip)
+        except (OSError, ValueError):
+            return None
+        if family == 4:
+            starts, ends, countries = self._v4_starts, self._v4_ends, self._v4_countries
+        else:
+            starts, ends, countries = self._v6_starts, self._v6_ends, self._v6_countries
+        i = bisect_right(starts, value) - 1
+        if i >= 0 and value <= ends[i]:
+            self.found += 1
+            return countries[i]
+        return None
+
+    def __len__(self) -> int:
+        return len(self._v4_starts) + len(self._v6_starts)
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.name,
+            "source": self.source,
+            "ipv4_ranges": len(self._v4_starts),
+            "ipv6_ranges": len(self._v6_starts),
+            "lookups": self.lookups,
+            "found": self.found,
+        }
+
+
+class IPApiResolver(GeoIPResolver):
+    """
+    Legacy network provider using ip-api.com.
+    Free tier: 45 requests per minute, so not suitable under real load.
+    Goes through the shared `geoip` upstream, so an outage trips its circuit
+    breaker instead of adding a timeout to every click.
+    """
+
+    name = "ip-api"
+    remote = True
+
+    def lookup(self, ip: str) -> Optional[str]:
+        try:
+            response = geoip_api.get(f"/json/{ip}", params={"fields": "status,countryCode"})
+            if response.status_code == 200:
+                data = response.json()
+                if data.get("status") == "success":
+                    return data.get("countryCode")
+        except Exception:
+            pass
+        return None
+
+
+def read_ranges(path: str) -> Iterable[Range]:
+    """Reads a normalized range file written by `write_ranges`."""
+    with open(path, "r", encoding="ascii") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            family, start, end, country = line.split(",")
+            yield int(family), int(start), int(end), country
+
+
+def write_ranges(path: str, ranges: Iterable[Range]) -> int:
+    """
+    Sorts, merges adjacent same-country ranges and atomically writes the
+    normalized range file. Returns the number of ranges written.
+    """
+    merged: List[list] = []
+    for family, start, end, country in sorted(ranges):
+        if start > end:
+            continue
+        last = merged[-1] if merged else None
+        if last and last[0] == family and last[3] == country and start <= last[2] + 1:
+            last[2] = max(last[2], end)
+        elif last and last[0] == family and start <= last[2]:
+            # Overlap with a different country: keep the earlier range's claim
+            if end > last[2]:
+                merged.append([family, last[2] + 1, end, country])
+        else:
+            merged.append([family, start, end, country])
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="ascii") as f:
+        f.write("# family,start,end,country\n")
+        for family, start, end, country in merged:
+            f.write(f"{family},{start},{end},{country}\n")
+    os.replace(tmp_path, path)
+    return len(merged)
+
+
+_resolver: Optional[GeoIPResolver] = None
+_resolver_mtime: Optional[float] = None
+_last_check = 0.0
+_lock = threading.Lock()
+
+
+def _build_resolver() -> GeoIPResolver:
+    provider = settings.GEOIP_PROVIDER
+    path = settings.GEOIP_DB_PATH
+    if provider == "local" or (provider == "auto" and os.path.exists(path)):
+        if not os.path.exists(path):
+            print(f"GeoIP database '{path}' not found, country lookups disabled")
+            return GeoIPResolver()
+        return RangeDatabaseResolver.from_file(path)
+    if provider in ("ip-api", "auto"):
+        return IPApiResolver()
+    return GeoIPResolver()
+
+
+def get_resolver() -> GeoIPResolver:
+    """
+    Returns the configured resolver, reloading the local database when the
+    file has been refreshed (checked at most every GEOIP_RELOAD_INTERVAL seconds).
+    """
+    global _resolver, _resolver_mtime, _last_check
+    now = time.monotonic()
+    if _resolver is not None and now - _last_check < settings.GEOIP_RELOAD_INTERVAL:
+        return _resolver
+    with _lock:
+        _last_check = now
+        try:
+            mtime = os.path.getmtime(settings.GEOIP_DB_PATH)
+        except OSError:
+            mtime = None
+        if _resolver is None or mtime != _resolver_mtime:
+            _resolver = _build_resolver()
+            _resolver_mtime = mtime
+        return _resolver
+
+
+def reset_resolver():
+    """Forget the current resolver so the next lookup rebuilds it from settings."""
+    global _resolver, _resolver_mtime, _last_check
+    with _lock:
+        _resolver = None
+        _resolver_mtime = None
+        _last_check = 0.0
@@ -0,0 +1,140 @@
+"""
+HTTP caching for redirect responses, and CDN purging when links change.
+
+Policy per response:
+- Redirects to a link's destination are cacheable unless the link tracks
+  activity (every visit has to reach us to be recorded): permanent
+  redirects (301/308) for PERMANENT_REDIRECT_MAX_AGE, temporary ones for
+  TEMPORARY_REDIRECT_MAX_AGE, never past the link's `expires_at`. They carry
+  an ETag for conditional requests and a surrogate key for CDN purges.
+- Everything else (not found, disabled, expired, password/login gates,
+  stats) is `no-store`. None of these depend on the visitor's credentials
+  (gated links always send to the verify page), so nothing needs `Vary`.
+"""
+import hashlib
+import threading
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from app.core.config import settings
+from app.core.http import Upstream, http_client
+
+NO_STORE = "no-store"
+
+
+def surrogate_key(short_code: str) -> str:
+    return f"code-{short_code}"
+
+
+def etag_for(link, status_code: int) -> str:
+    digest = hashlib.blake2b(
+        f"{link.id}|{link.destination}|{status_code}|{link.expires_at}".encode(), digest_size=8
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+def max_age_for(link, status_code: int, now: Optional[datetime] = None) -> int:
+    if status_code in (301, 308):
+        max_age = settings.PERMANENT_REDIRECT_MAX_AGE
+    else:
+        max_age = settings.TEMPORARY_REDIRECT_MAX_AGE
+    if link.expires_at and max_age > 0:
+        now = now or datetime.utcnow()
+        remaining = (link.expires_at.replace(tzinfo=None) - now).total_seconds()
+        max_age = min(max_age, max(0, int(remaining)))
+    return max_age
+
+
+def redirect_headers(link, status_code: int, is_destination: bool) -> dict:
+    """Cache headers for a redirect response (see module docstring for the policy)."""
+    if not is_destination or link.track_activity:
+        return {"Cache-Control": NO_STORE}
+
+    max_age = max_age_for(link, status_code)
+    headers = {
+        "Cache-Control": f"public, max-age={max_age}" if max_age > 0 else "no-cache",
+        "ETag": etag_for(link, status_code),
+    }
+    if settings.SURROGATE_KEY_HEADER:
+        headers[settings.SURROGATE_KEY_HEADER] = surrogate_key(link.short_code)
+    return headers
+
+
+def is_not_modified(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" matches "x"
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+class PurgeHook:
+    """Called with surrogate keys whenever links change. The default does nothing."""
+
+    name = "none"
+
+    def purge(self, keys: List[str]):
+        pass
+
+    def stats(self) -> dict:
+        return {"hook": self.name}
+
+
+class HTTPPurgeHook(PurgeHook):
+    """
+    Purges each key with a POST to `url_template` (e.g. Fastly's
+    https://api.fastly.com/service/<id>/purge/{key}), through the shared
+    outbound HTTP layer. Runs on a background thread unless `background=False`.
+    """
+
+    name = "http"
+
+    def __init__(self, url_template: str, token: Optional[str] = None, background: bool = True):
+        self.url_template = url_template
+        self.token = token
+        self.background = background
+        try:
+            self.upstream = http_client.upstream("cdn")
+        except KeyError:
+            self.upstream = http_client.register(Upstream("cdn", "", timeout=5.0, retries=2))
+        self.purged = 0
+        self.errors = 0
+
+    def _purge(self, keys: List[str]):
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        for key in keys:
+            try:
+                # Purging is idempotent, so it is safe to retry
+                response = self.upstream.post(self.url_template.format(key=key), headers=headers, retries=2)
+                response.raise_for_status()
+                self.purged += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"Error purging CDN key {key}: {e}")
+
+    def purge(self, keys: List[str]):
+        if self.background:
+            threading.Thread(target=self._purge, args=(keys,), name="cdn-purge", daemon=True).start()
+        else:
+            self._purge(keys)
+
+    def stats(self) -> dict:
+        return {"hook": self.name, "purged": self.purged, "errors": self.errors}
+
+
+purge_hook: PurgeHook = (
+    HTTPPurgeHook(settings.CDN_PURGE_URL, settings.CDN_PURGE_TOKEN) if settings.CDN_PURGE_URL else PurgeHook()
+)
+
+
+def set_purge_hook(hook: PurgeHook):
+    global purge_hook
+    purge_hook = hook
+
+
+def purge_codes(short_codes: Iterable[str]):
+    keys = [surrogate_key(code) for code in dict.fromkeys(short_codes) if code]
+    if keys:
+        purge_hook.purge(keys)
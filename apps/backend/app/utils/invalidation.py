@@ -0,0 +1,272 @@
+"""
+Cross-worker cache invalidation.
+
+Each worker keeps in-process caches (redirect entries, the short code
+filter, resolved users). When one worker changes a link or user it
+invalidates its own caches directly and publishes the changed keys on the
+bus; every other worker's bus delivers them to the handlers subscribed for
+that kind, which drop the stale entries.
+
+Transports are pluggable:
+- DatabaseTransport: rows in the `link_changes` table, polled by id; the
+  staleness window is bounded by the poll interval. Works for any number of
+  workers sharing the database. Ids can commit out of order on PostgreSQL
+  (a sequence hands them out before the transaction commits), so each poll
+  also re-reads the last `reread_window` ids below the cursor and skips the
+  ones already delivered. A change that commits later than that many newer
+  ones is missed.
+- LocalTransport: synchronous in-process fan-out (tests, single process).
+A broker-backed transport (Redis pub/sub, ...) only needs `publish`,
+`start` and `stop`.
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.link_change import LinkChange
+
+# deliver(origin, kind, keys)
+Deliver = Callable[[str, str, List[str]], None]
+
+
+class Transport:
+    name = "none"
+
+    def publish(self, origin: str, kind: str, keys: List[str]):
+        raise NotImplementedError
+
+    def start(self, deliver: Deliver):
+        pass
+
+    def stop(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"transport": self.name}
+
+
+class LocalTransport(Transport):
+    """Delivers to every started bus in this process, synchronously."""
+
+    name = "local"
+
+    def __init__(self):
+        self._subscribers: List[Deliver] = []
+
+    def publish(self, origin: str, kind: str, keys: List[str]):
+        for deliver in list(self._subscribers):
+            deliver(origin, kind, keys)
+
+    def start(self, deliver: Deliver):
+        if deliver not in self._subscribers:
+            self._subscribers.append(deliver)
+
+    def stop(self):
+        self._subscribers.clear()
+
+
+class DatabaseTransport(Transport):
+    """
+    Appends changes to `link_changes` and polls it for rows past a cursor,
+    and for rows in the `reread_window` ids below it that were not delivered
+    yet. Rows older than `retention` are pruned now and then by whichever
+    worker gets there first.
+    """
+
+    name = "database"
+
+    def __init__(
+        self,
+        poll_interval: float = 1.0,
+        retention: timedelta = timedelta(days=7),
+        batch_size: int = 1000,
+        reread_window: int = 100,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.batch_size = batch_size
+        self.reread_window = reread_window
+        self.session_factory = session_factory
+        self.cursor: Optional[int] = None
+        # Ids delivered in the window below the cursor, so re-reads skip them
+        self._delivered: Set[int] = set()
+        self._deliver: Optional[Deliver] = None
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.polls = 0
+        self.errors = 0
+        self.last_poll: Optional[float] = None
+        self.late = 0
+
+    def publish(self, origin: str, kind: str, keys: List[str]):
+        db = self.session_factory()
+        try:
+            db.execute(insert(LinkChange), [{"kind": kind, "key": key, "origin": origin} for key in keys])
+            db.commit()
+        finally:
+            db.close()
+
+    def poll(self) -> int:
+        """
+        Deliver every change past the cursor, and any that committed late in
+        the window below it. Returns the number of rows delivered.
+        """
+        db = self.session_factory()
+        try:
+            if self.cursor is None:
+                # Start from "now": caches are empty at startup, nothing to catch up on
+                self.cursor = db.execute(select(func.coalesce(func.max(LinkChange.id), 0))).scalar()
+                self._delivered = set(db.execute(
+                    select(LinkChange.id).where(LinkChange.id > self.cursor - self.reread_window)
+                ).scalars())
+                return 0
+            read = 0
+            low = self.cursor - self.reread_window
+            while True:
+                rows = db.execute(
+                    select(LinkChange.id, LinkChange.origin, LinkChange.kind, LinkChange.key)
+                    .where(LinkChange.id > low)
+                    .order_by(LinkChange.id)
+                    .limit(self.batch_size)
+                ).all()
+                if not rows:
+                    break
+                low = rows[-1].id
+                rows = [row for row in rows if row.id not in self._delivered]
+                grouped: Dict[tuple, List[str]] = defaultdict(list)
+                for row in rows:
+                    grouped[(row.origin, row.kind)].append(row.key)
+                for (origin, kind), keys in grouped.items():
+                    self._deliver(origin, kind, keys)
+                for row in rows:
+                    if row.id < self.cursor:
+                        self.late += 1
+                    self._delivered.add(row.id)
+                self.cursor = max(self.cursor, low)
+                read += len(rows)
+            floor = self.cursor - self.reread_window
+            self._delivered = {row_id for row_id in self._delivered if row_id > floor}
+            self.polls += 1
+            self.last_poll = time.time()
+            if self.polls % 600 == 0:
+                self.prune(db)
+            return read
+        finally:
+            db.close()
+
+    def prune(self, db: Session):
+        db.execute(delete(LinkChange).where(LinkChange.created_at < datetime.utcnow() - self.retention))
+        db.commit()
+
+    def _run(self):
+        while not self._stopping.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                self.errors += 1
+                print(f"Error polling link changes: {e}")
+
+    def start(self, deliver: Deliver):
+        self._deliver = deliver
+        try:
+            self.poll()
+        except Exception as e:
+            print(f"Error reading link change cursor: {e}")
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="link-changes", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "transport": self.name,
+            "cursor": self.cursor,
+            "poll_interval": self.poll_interval,
+            "polls": self.polls,
+            "last_poll": self.last_poll,
+            "late": self.late,
+            "errors": self.errors,
+        }
+
+
+class InvalidationBus:
+    def __init__(self, transport: Transport, origin: Optional[str] = None):
+        self.transport = transport
+        self.origin = origin or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers: Dict[str, List[Callable[..., None]]] = defaultdict(list)
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+
+    def use(self, transport: Transport):
+        """Swap the transport (before start)."""
+        self.transport = transport
+
+    def subscribe(self, kind: str, handler: Callable[..., None]):
+        """`handler(*keys)` is called for changes of `kind` made by other workers."""
+        self._handlers[kind].append(handler)
+
+    def publish(self, kind: str, *keys: str):
+        keys = [key for key in keys if key]
+        if not keys:
+            return
+        try:
+            self.transport.publish(self.origin, kind, keys)
+            self.published += len(keys)
+        except Exception as e:
+            # The write itself succeeded; other workers catch up when their cache entries expire
+            self.errors += 1
+            print(f"Error publishing cache invalidation: {e}")
+
+    def deliver(self, origin: str, kind: str, keys: List[str]):
+        if origin == self.origin:
+            return  # already invalidated locally when we published
+        for handler in self._handlers.get(kind, ()):
+            handler(*keys)
+        self.received += len(keys)
+
+    def start(self):
+        self.transport.start(self.deliver)
+
+    def stop(self):
+        self.transport.stop()
+
+    def stats(self) -> dict:
+        return {
+            "origin": self.origin,
+            "published": self.published,
+            "received": self.received,
+            "errors": self.errors,
+            **self.transport.stats(),
+        }
+
+
+def _make_transport() -> Transport:
+    if settings.INVALIDATION_TRANSPORT == "local":
+        return LocalTransport()
+    return DatabaseTransport(
+        poll_interval=settings.INVALIDATION_POLL_INTERVAL,
+        reread_window=settings.INVALIDATION_REREAD_WINDOW,
+        retention=timedelta(days=settings.LINK_CHANGES_RETENTION_DAYS),
+    )
+
+
+invalidation_bus = InvalidationBus(_make_transport())
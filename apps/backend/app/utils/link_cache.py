@@ -0,0 +1,90 @@
+import time
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional
+
+from app.core.config import settings
+from app.utils.cache import LRUCache
+from app.utils.code_filter import short_code_filter
+from app.utils.http_cache import purge_codes
+from app.utils.invalidation import invalidation_bus
+
+
+class RedirectEntry(NamedTuple):
+    """
+    Everything the redirect path needs to answer for a short code,
+    without holding on to a Link ORM row.
+    """
+    id: int
+    short_code: str
+    destination: str
+    redirect_type: int
+    is_active: bool
+    expires_at: Optional[datetime]
+    requires_password: bool
+    require_login: bool
+    track_activity: bool
+
+    @property
+    def is_gated(self) -> bool:
+        return self.requires_password or self.require_login
+
+    def is_expired(self, now: Optional[datetime] = None) -> bool:
+        if not self.expires_at:
+            return False
+        now = now or datetime.utcnow()
+        return self.expires_at.replace(tzinfo=None) < now
+
+
+# short_code -> RedirectEntry
+redirect_cache = LRUCache(
+    maxsize=settings.REDIRECT_CACHE_SIZE,
+    ttl=settings.REDIRECT_CACHE_TTL,
+)
+
+
+# short_code -> True for codes recently looked up and not found
+missing_codes = LRUCache(
+    maxsize=settings.MISSING_CODE_CACHE_SIZE,
+    ttl=settings.MISSING_CODE_CACHE_TTL,
+)
+
+
+def known_missing(short_code: str) -> bool:
+    """True when a code can be answered as "not found" without touching the database."""
+    return short_code in missing_codes or not short_code_filter.might_contain(short_code)
+
+
+def record_missing(short_code: str):
+    """Call after the database confirmed a code doesn't exist."""
+    missing_codes.set(short_code, True)
+    short_code_filter.record_false_positive()
+
+
+# short_code -> when it last changed, kept while a redirect index is in use so
+# lookups skip index entries older than the change (see app/utils/redirect_index.py)
+changed_codes: Dict[str, float] = {}
+
+
+def _invalidate_local(*short_codes: str):
+    now = time.time()
+    for code in short_codes:
+        if code:
+            redirect_cache.invalidate(code)
+            missing_codes.invalidate(code)
+            short_code_filter.add(code)
+            if settings.REDIRECT_INDEX_PATH:
+                changed_codes[code] = now
+
+
+def invalidate_codes(*short_codes: str):
+    """
+    Drop cached entries for the given short codes (call after every link write),
+    here and, through the invalidation bus, in every other worker. Cached
+    redirects at the CDN are purged once, from the worker that made the change.
+    """
+    _invalidate_local(*short_codes)
+    invalidation_bus.publish("link", *short_codes)
+    purge_codes(short_codes)
+
+
+invalidation_bus.subscribe("link", _invalidate_local)
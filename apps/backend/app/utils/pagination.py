@@ -0,0 +1,81 @@
+"""
+Keyset ("cursor") pagination for the list endpoints.
+
+A page after a cursor is fetched with
+`WHERE (sort, id) < (last_sort, last_id) ORDER BY sort DESC, id DESC LIMIT n`.
+The indexes behind each listing end in the sort column (and, implicitly,
+the id), so the database seeks straight to the cursor and reads n rows.
+Page N costs what page 1 does, where OFFSET reads and discards every row
+before it. (Campaigns list oldest first and page by id alone.)
+
+Cursors are opaque to clients: the last row's sort key, JSON-encoded in
+URL-safe base64. The list endpoints return the next one in the
+X-Next-Cursor header when the page is full.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional, Sequence
+
+from sqlalchemy import String, literal, tuple_
+from sqlalchemy.orm import Session
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*key) -> str:
+    # Always with the fraction: isoformat() drops a zero one, which would then
+    # sort before the stored text of the very row the cursor names
+    values = [value.isoformat(sep=" ", timespec="microseconds") if isinstance(value, datetime) else value
+              for value in key]
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, *types: type) -> list:
+    """
+    The key in a cursor from encode_cursor, checked against the sort columns'
+    types. Datetimes stay in their text form (see `after`).
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        raise InvalidCursor(token)
+    if not isinstance(key, list) or len(key) != len(types):
+        raise InvalidCursor(token)
+    for value, python_type in zip(key, types):
+        if python_type is datetime:
+            try:
+                datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise InvalidCursor(token)
+        elif not isinstance(value, python_type) or isinstance(value, bool):
+            raise InvalidCursor(token)
+    return key
+
+
+def after(db: Session, columns: Sequence, key: list, descending: bool = True):
+    """Rows past a decoded `key` in (columns...) order, descending unless told otherwise."""
+    values = list(key)
+    for i, column in enumerate(columns):
+        if column.type.python_type is datetime:
+            instant = datetime.fromisoformat(values[i])
+            if db.get_bind().dialect.name == "sqlite":
+                # SQLite compares the stored text, which utcnow() and SQLAlchemy both write this way
+                values[i] = literal(instant.strftime("%Y-%m-%d %H:%M:%S.%f"), String)
+            else:
+                values[i] = instant
+    left, right = (columns[0], values[0]) if len(columns) == 1 else (tuple_(*columns), tuple_(*values))
+    return left < right if descending else left > right
+
+
+def next_cursor(rows: Sequence, limit: int, *attributes: str) -> Optional[str]:
+    """A cursor for the page after `rows`, or None if it is the last one."""
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(*(getattr(last, attribute) for attribute in attributes))
@@ -0,0 +1,312 @@
+"""
+Memory-mapped, read-only redirect index.
+
+A single file, shared by every worker through the OS page cache, mapping
+each short code to what the redirect path needs (a `RedirectEntry`):
+
+    header   32 bytes   magic, entry count, key width, built_at
+    entries  count * stride, sorted by key:
+             key (UTF-8, NUL-padded to the key width), link id, redirect
+             type, flags, expires_at (epoch seconds, 0 = none), destination
+             offset and length in the heap
+    heap     destinations, UTF-8, back to back
+
+Lookups bisect an in-memory list of every FENCE_EVERY-th key (C-level,
+no Python loop), then `find` the padded key within that one block of the
+map: nothing is copied out of the map until the entry is found, and there
+is never a Python object per indexed link. The index holds every live
+link, so a code it doesn't contain doesn't exist, as of `built_at`. Codes
+changed since then (locally or announced on the invalidation bus) are
+skipped and resolved from the database as usual; past
+REDIRECT_INDEX_MAX_CHANGED of them the index is set aside until a rebuild.
+
+Rebuilt with `python -m app.cli.redirect_index build`, which writes a new
+file and `os.replace`s it over the old one; workers notice the new file
+within REDIRECT_INDEX_RELOAD_INTERVAL seconds and map it, while lookups
+already holding the old map finish against it.
+"""
+import calendar
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.link import Link
+from app.utils.link_cache import RedirectEntry, changed_codes, redirect_cache
+
+MAGIC = b"NOLOIDX1"
+# magic, count, key width, reserved, built_at
+HEADER = struct.Struct("<8sIHHd8x")
+# link id, redirect type, flags, expires_at, destination offset, destination length
+FIELDS = struct.Struct("<IHHqII")
+# build-time record: key length, then FIELDS
+_RECORD = struct.Struct("<H")
+
+FLAG_ACTIVE = 1
+FLAG_PASSWORD = 2
+FLAG_LOGIN = 4
+FLAG_TRACKED = 8
+
+# Keys kept in memory per entry in the map: 1M links cost ~16K short bytes objects
+FENCE_EVERY = 64
+
+_index_columns = select(
+    Link.id, Link.short_code, Link.redirect_url, Link.original_url, Link.redirect_type, Link.is_active,
+    Link.expires_at, Link.password_hash, Link.require_login, Link.track_activity,
+    Link.utm_source, Link.utm_medium, Link.utm_campaign, Link.utm_term, Link.utm_content,
+).where(Link.is_deleted == False)
+
+
+class RedirectIndex:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.key_width, _, self.built_at = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a redirect index")
+        self.stride = self.key_width + FIELDS.size
+        self.heap_start = HEADER.size + self.count * self.stride
+        block = self.stride * FENCE_EVERY
+        # The first key of each block of FENCE_EVERY entries
+        self._fences = [
+            self._map[offset:offset + self.key_width] for offset in range(HEADER.size, self.heap_start, block)
+        ]
+        self.lookups = 0
+        self.found = 0
+
+    def _find(self, key: bytes) -> int:
+        """Offset of the entry for `key`, or -1."""
+        width = self.key_width
+        if len(key) > width:
+            return -1
+        padded = key.ljust(width, b"\0")
+        block = bisect_right(self._fences, padded) - 1
+        if block < 0:
+            return -1
+        stride = self.stride
+        start = HEADER.size + block * FENCE_EVERY * stride
+        end = min(start + FENCE_EVERY * stride, self.heap_start)
+        # Only a match at an entry boundary is the key; elsewhere it is field bytes that happen to match
+        offset = self._map.find(padded, start, end)
+        while offset >= 0 and (offset - HEADER.size) % stride:
+            offset = self._map.find(padded, offset + 1, end)
+        return offset
+
+    def get(self, short_code: str) -> Optional[RedirectEntry]:
+        self.lookups += 1
+        offset = self._find(short_code.encode("utf-8"))
+        if offset < 0:
+            return None
+        self.found += 1
+        link_id, redirect_type, flags, expires, dest_offset, dest_len = FIELDS.unpack_from(
+            self._map, offset + self.key_width
+        )
+        start = self.heap_start + dest_offset
+        return RedirectEntry(
+            id=link_id,
+            short_code=short_code,
+            destination=self._map[start:start + dest_len].decode("utf-8"),
+            redirect_type=redirect_type,
+            is_active=bool(flags & FLAG_ACTIVE),
+            expires_at=datetime.fromtimestamp(expires, timezone.utc).replace(tzinfo=None) if expires else None,
+            requires_password=bool(flags & FLAG_PASSWORD),
+            require_login=bool(flags & FLAG_LOGIN),
+            track_activity=bool(flags & FLAG_TRACKED),
+        )
+
+    def __len__(self) -> int:
+        return self.count
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "entries": self.count,
+            "key_width": self.key_width,
+            "bytes": len(self._map),
+            "built_at": self.built_at,
+            "lookups": self.lookups,
+            "found": self.found,
+        }
+
+
+def _epoch(value: Optional[datetime]) -> int:
+    # Naive datetimes are UTC throughout the app
+    return calendar.timegm(value.utctimetuple()) if value else 0
+
+
+def build_index(db: Session, path: Optional[str] = None, batch_size: int = 1000) -> dict:
+    """
+    Write a fresh index of every live link and swap it in at `path`.
+
+    Rows are streamed twice through temporary files (the key width is only
+    known at the end), so memory stays flat however many links there are.
+    """
+    from app.crud.link import build_redirect_url  # app.crud.link looks codes up through this module
+
+    path = path or settings.REDIRECT_INDEX_PATH
+    started = time.perf_counter()
+    # Anything changed after this instant is treated as stale by the workers
+    built_at = time.time()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    # Code point order == UTF-8 byte order, which the binary search relies on
+    order = Link.short_code.collate("C") if db.get_bind().dialect.name == "postgresql" else Link.short_code
+    count, key_width, heap_size, skipped = 0, 0, 0, 0
+    with tempfile.TemporaryFile(dir=directory) as records, tempfile.TemporaryFile(dir=directory) as heap:
+        for row in db.execute(_index_columns.order_by(order).execution_options(yield_per=batch_size)):
+            key = row.short_code.encode("utf-8")
+            if b"\0" in key or len(key) > 0xFFFF:
+                skipped += 1
+                continue
+            destination = (row.redirect_url or build_redirect_url(row)).encode("utf-8")
+            flags = (
+                (FLAG_ACTIVE if row.is_active else 0)
+                | (FLAG_PASSWORD if row.password_hash else 0)
+                | (FLAG_LOGIN if row.require_login else 0)
+                | (FLAG_TRACKED if row.track_activity else 0)
+            )
+            records.write(_RECORD.pack(len(key)) + key + FIELDS.pack(
+                row.id, row.redirect_type or 302, flags, _epoch(row.expires_at), heap_size, len(destination)
+            ))
+            heap.write(destination)
+            heap_size += len(destination)
+            key_width = max(key_width, len(key))
+            count += 1
+
+        # Keep the fixed-width fields 8-byte aligned
+        key_width = (key_width + 7) // 8 * 8 or 8
+        records.seek(0)
+        heap.seek(0)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(HEADER.pack(MAGIC, count, key_width, 0, built_at))
+            for _ in range(count):
+                (key_len,) = _RECORD.unpack(records.read(_RECORD.size))
+                out.write(records.read(key_len).ljust(key_width, b"\0"))
+                out.write(records.read(FIELDS.size))
+            while True:
+                chunk = heap.read(1 << 20)
+                if not chunk:
+                    break
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+    os.replace(tmp_path, path)
+    return {
+        "path": path,
+        "entries": count,
+        "skipped": skipped,
+        "key_width": key_width,
+        "bytes": os.path.getsize(path),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+class IndexHolder:
+    """
+    The worker's view of the index file: maps it on first use and remaps it
+    when the file is replaced (checked at most every `reload_interval` seconds).
+    """
+
+    def __init__(self):
+        self._index: Optional[RedirectIndex] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        # Indexes built before this were set aside along with the changes they'd need checking against
+        self._min_built_at = 0.0
+        self.reloads = 0
+        self.stale_skips = 0
+        self.overflows = 0
+
+    def current(self) -> Optional[RedirectIndex]:
+        path = settings.REDIRECT_INDEX_PATH
+        if not path:
+            return None
+        now = time.monotonic()
+        if now - self._last_check < settings.REDIRECT_INDEX_RELOAD_INTERVAL:
+            index = self._index
+            return index if index is None or index.built_at >= self._min_built_at else None
+        with self._lock:
+            self._last_check = now
+            if len(changed_codes) > settings.REDIRECT_INDEX_MAX_CHANGED:
+                # Too many codes to keep skipping: forget them, and stop using any
+                # index that predates the forgetting (the database answers until a rebuild)
+                self._min_built_at = time.time()
+                changed_codes.clear()
+                self.overflows += 1
+            try:
+                stat = os.stat(path)
+                identity = (stat.st_ino, stat.st_mtime_ns)
+            except OSError:
+                identity = None
+            index = self._index
+            if identity is None:
+                self._index = None
+            elif index is None or index.identity != identity or index.path != path:
+                try:
+                    self._index = RedirectIndex(path)
+                    self.reloads += 1
+                    # Changes older than the new index are in it
+                    for code, changed_at in list(changed_codes.items()):
+                        if changed_at < self._index.built_at:
+                            changed_codes.pop(code, None)
+                except Exception as e:
+                    print(f"Error loading redirect index '{path}': {e}")
+            # The old map is closed once the last lookup using it lets go
+            index = self._index
+            return index if index is None or index.built_at >= self._min_built_at else None
+
+    def lookup(self, short_code: str) -> Tuple[bool, Optional[RedirectEntry]]:
+        """
+        (answered, entry). Not answered when there is no index or the code
+        changed since it was built; the caller then goes to the database.
+        Entries found are put in the redirect cache.
+        """
+        index = self.current()
+        if index is None:
+            return False, None
+        changed_at = changed_codes.get(short_code)
+        if changed_at is not None and changed_at >= index.built_at:
+            self.stale_skips += 1
+            return False, None
+        entry = index.get(short_code)
+        if entry is not None:
+            redirect_cache.set(short_code, entry)
+        return True, entry
+
+    def reset(self):
+        with self._lock:
+            self._index = None
+            self._last_check = 0.0
+            self._min_built_at = 0.0
+        self.reloads = self.stale_skips = self.overflows = 0
+
+    def stats(self) -> dict:
+        index = self._index
+        if index is None:
+            return {"loaded": False}
+        return {
+            "loaded": True,
+            "set_aside": index.built_at < self._min_built_at,
+            "reloads": self.reloads,
+            "stale_skips": self.stale_skips,
+            "overflows": self.overflows,
+            **index.stats(),
+        }
+
+
+redirect_index = IndexHolder()
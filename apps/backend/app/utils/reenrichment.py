@@ -0,0 +1,261 @@
+"""
+Historical re-enrichment of click events.
+
+When the user agent parser or the GeoIP database is upgraded, already
+enriched rows keep the values the old ones produced. `ReenrichJob` walks
+click_events by primary key range, recomputes `device_type`, `os`,
+`browser` and `country_code` from the stored user agent and IP, and writes
+back only the rows whose values changed:
+
+- the main process reads one id window at a time (`id > lo AND id <= hi`,
+  never OFFSET) and hands the window's distinct user agents and IPs to a
+  process pool, which does the CPU work (UA parsing, range lookups) with
+  no database access
+- results are applied in window order with one executemany UPDATE per
+  window, moving the affected dimension rollup counts from the old values
+  to the new ones in the same transaction
+- after each commit the window's upper bound is written to a checkpoint
+  file, so an interrupted job resumes where it stopped; re-running a
+  committed window finds nothing changed, so a crash between the commit
+  and the checkpoint costs nothing but the rescan
+- an optional rows/sec ceiling throttles the scan to leave headroom for
+  live traffic; each window is its own short transaction
+
+Rows still waiting for the enrichment stage (`enriched = false`) are left
+to it (see app.utils.enrichment); it never touches enriched rows, so the
+two can run at the same time.
+"""
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.models.analytics import ClickEvent
+from app.utils.analytics import get_country_code, parse_user_agent
+from app.utils.rollups import RollupDelta, apply_rollups, dimension_table
+
+# What can be recomputed: "ua" from the stored user agent, "geo" from the stored IP.
+# The referrer is normalized in place at enrichment, so its raw value is gone.
+SOURCES = {
+    "ua": ("device_type", "os", "browser"),
+    "geo": ("country_code",),
+}
+COLUMNS = ("device_type", "os", "browser", "country_code")
+# click_events column -> rollup dimension
+_COLUMN_DIMENSIONS = {"device_type": "device", "os": "os", "browser": "browser", "country_code": "country"}
+
+click_events = ClickEvent.__table__
+
+# (id, link_id, ip_address, user_agent, device_type, os, browser, country_code)
+_window_columns = select(
+    ClickEvent.id, ClickEvent.link_id, ClickEvent.ip_address, ClickEvent.user_agent,
+    *(getattr(ClickEvent, column) for column in COLUMNS),
+).where(ClickEvent.enriched == True)
+
+# (id, link_id, old values, new values), values in COLUMNS order
+Change = Tuple[int, int, tuple, tuple]
+
+
+def resolve_values(user_agents: Sequence[str], ips: Sequence[Optional[str]], sources: Sequence[str]) -> Tuple[dict, dict]:
+    """
+    ({user agent: (device_type, os, browser)}, {ip: country_code}) for the
+    distinct values of a window. Runs in the pool's worker processes.
+    """
+    agents = {}
+    if "ua" in sources:
+        for ua in user_agents:
+            info = parse_user_agent(ua or "")
+            agents[ua] = (info.device_type, info.os, info.browser)
+    countries = {ip: get_country_code(ip) for ip in ips} if "geo" in sources else {}
+    return agents, countries
+
+
+def changed_rows(rows: Sequence[tuple], agents: dict, countries: dict) -> List[Change]:
+    """Rows (see `_window_columns`) whose derived values differ from the resolved ones."""
+    changes = []
+    for row_id, link_id, ip, ua, *old in rows:
+        new = list(old)
+        if agents:
+            new[0:3] = agents[ua]
+        if countries:
+            new[3] = countries[ip]
+        if new != old:
+            changes.append((row_id, link_id, tuple(old), tuple(new)))
+    return changes
+
+
+def load_checkpoint(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path: str, state: dict):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+class ReenrichJob:
+    def __init__(
+        self,
+        checkpoint_path: Optional[str],
+        chunk_size: int = 5000,
+        workers: Optional[int] = None,
+        max_rows_per_second: Optional[float] = None,
+        sources: Iterable[str] = tuple(SOURCES),
+        dry_run: bool = False,
+        report_interval: float = 10.0,
+        session_factory: Callable[[], Session] = SessionLocal,
+        log: Callable[[str], None] = print,
+    ):
+        self.sources = tuple(sources)
+        unknown = set(self.sources) - set(SOURCES)
+        if unknown or not self.sources:
+            raise ValueError(f"Unknown re-enrichment source(s) {sorted(unknown)}, expected some of {tuple(SOURCES)}")
+        self.columns = [column for source in self.sources for column in SOURCES[source]]
+        self.checkpoint_path = checkpoint_path
+        self.chunk_size = chunk_size
+        # 0 derives in this process (no pool)
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_rows_per_second = max_rows_per_second
+        self.dry_run = dry_run
+        self.report_interval = report_interval
+        self.session_factory = session_factory
+        self.log = log
+
+        self.scanned = 0
+        self.updated = 0
+        self.windows = 0
+
+    def _read_window(self, db: Session, lo: int, hi: int) -> List[tuple]:
+        return db.execute(
+            _window_columns.where(ClickEvent.id > lo, ClickEvent.id <= hi).order_by(ClickEvent.id)
+        ).all()
+
+    def _apply(self, db: Session, changes: List[Change]):
+        if not changes:
+            return
+        delta = RollupDelta()
+        params = []
+        for row_id, link_id, old, new in changes:
+            params.append({"_id": row_id, **{column: new[COLUMNS.index(column)] for column in self.columns}})
+            for column, before, after in zip(COLUMNS, old, new):
+                if before != after:
+                    dimension = _COLUMN_DIMENSIONS[column]
+                    delta.dimensions[(link_id, dimension, before or "")] -= 1
+                    delta.dimensions[(link_id, dimension, after or "")] += 1
+        db.execute(update(click_events).where(click_events.c.id == bindparam("_id")), params)
+        apply_rollups(db, delta)
+        # Values nothing maps to any more would otherwise linger in stats with 0 clicks
+        db.execute(delete(dimension_table).where(
+            dimension_table.c.link_id.in_({link_id for _, link_id, _, _ in changes}),
+            dimension_table.c.clicks <= 0,
+        ))
+
+    def _throttle(self, started: float, scanned: int):
+        if not self.max_rows_per_second:
+            return
+        ahead = scanned / self.max_rows_per_second - (time.perf_counter() - started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+    def run(self, db: Optional[Session] = None, restart: bool = False) -> dict:
+        """Re-enrich every enriched row up to the current maximum id (or the checkpoint's). Returns a summary."""
+        own_session = db is None
+        db = db or self.session_factory()
+        try:
+            state = None if restart or not self.checkpoint_path else load_checkpoint(self.checkpoint_path)
+            if state is None:
+                min_id, max_id = db.execute(select(func.min(ClickEvent.id), func.max(ClickEvent.id))).one()
+                # Rows added later are enriched by the live stage with whatever is deployed then
+                state = {"next_id": (min_id or 1) - 1, "max_id": max_id or 0, "scanned": 0, "updated": 0}
+            elif state.get("next_id", 0) >= state.get("max_id", 0):
+                self.log(f"Checkpoint {self.checkpoint_path} is complete; pass --restart to run again")
+            resumed_from = state["next_id"]
+            return self._run(db, state, resumed_from)
+        finally:
+            if own_session:
+                db.close()
+
+    def _run(self, db: Session, state: dict, resumed_from: int) -> dict:
+        started = last_report = time.perf_counter()
+        max_id = state["max_id"]
+        # Spawned, not forked: a forked child would share (and could close) our database connections
+        pool = (
+            ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            if self.workers > 0 else None
+        )
+        in_flight = deque()
+        lo = state["next_id"]
+        try:
+            while lo < max_id or in_flight:
+                # Keep every worker busy, without reading far ahead of what is committed
+                while lo < max_id and len(in_flight) < max(1, self.workers * 2):
+                    hi = min(lo + self.chunk_size, max_id)
+                    rows = self._read_window(db, lo, hi)
+                    # End the read transaction: nothing is held open while the window is resolved
+                    db.commit()
+                    # Only the distinct values cross the process boundary, once each
+                    args = ({row.user_agent for row in rows}, {row.ip_address for row in rows}, self.sources)
+                    resolved = pool.submit(resolve_values, *args) if pool is not None else resolve_values(*args)
+                    in_flight.append((hi, rows, resolved))
+                    lo = hi
+
+                hi, rows, resolved = in_flight.popleft()
+                changes = changed_rows(rows, *(resolved.result() if pool is not None else resolved))
+                scanned = len(rows)
+                if not self.dry_run:
+                    try:
+                        self._apply(db, changes)
+                        db.commit()
+                    except Exception:
+                        db.rollback()
+                        raise
+                self.scanned += scanned
+                self.updated += len(changes)
+                self.windows += 1
+                state.update(next_id=hi, scanned=state["scanned"] + scanned, updated=state["updated"] + len(changes))
+                if self.checkpoint_path and not self.dry_run:
+                    save_checkpoint(self.checkpoint_path, state)
+
+                now = time.perf_counter()
+                if now - last_report >= self.report_interval:
+                    last_report = now
+                    self.log(self._progress(state, now - started))
+                self._throttle(started, self.scanned)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+        elapsed = time.perf_counter() - started
+        return {
+            "resumed_from": resumed_from,
+            "next_id": state["next_id"],
+            "max_id": max_id,
+            "scanned": self.scanned,
+            "updated": self.updated,
+            "windows": self.windows,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(self.scanned / elapsed) if elapsed > 0 else 0,
+            "dry_run": self.dry_run,
+        }
+
+    def _progress(self, state: dict, elapsed: float) -> str:
+        rate = self.scanned / elapsed if elapsed > 0 else 0
+        return (
+            f"  id {state['next_id']}/{state['max_id']}: {self.scanned} rows scanned, "
+            f"{self.updated} {'would change' if self.dry_run else 'updated'} ({rate:,.0f} rows/s)"
+        )
@@ -0,0 +1,193 @@
+"""
+Pre-aggregated click rollups.
+
+`link_daily_clicks` is upserted in the same transaction that writes click
+events, `link_dimension_clicks` in the one that enriches them (see
+app.utils.enrichment), so stats reads cost O(rollup rows) instead of
+O(events). `rebuild_rollups` recomputes them from click_events.
+"""
+from collections import Counter
+from datetime import date
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, func, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.analytics import ClickEvent, LinkDailyClicks, LinkDimensionClicks
+from app.models.link import Link
+
+# Rollup dimension name -> click_events column
+DIMENSIONS = {
+    "country": "country_code",
+    "referrer": "referrer",
+    "device": "device_type",
+    "browser": "browser",
+    "os": "os",
+}
+
+daily_table = LinkDailyClicks.__table__
+dimension_table = LinkDimensionClicks.__table__
+links_table = Link.__table__
+
+
+class RollupDelta:
+    """Click count changes to apply to the rollup tables in one go."""
+
+    def __init__(self):
+        self.daily: Counter = Counter()      # (link_id, day) -> clicks
+        self.dimensions: Counter = Counter() # (link_id, dimension, value) -> clicks
+
+    def add_event(self, row: dict, n: int = 1):
+        """Counts an enriched click_events row (as a dict of column values)."""
+        self.add_daily(row, n)
+        self.add_dimensions(row, n)
+
+    def add_daily(self, row: dict, n: int = 1):
+        self.daily[(row["link_id"], row["timestamp"].date())] += n
+
+    def add_dimensions(self, row: dict, n: int = 1, dimensions: Iterable[str] = DIMENSIONS):
+        for dimension in dimensions:
+            value = row.get(DIMENSIONS[dimension]) or ""
+            self.dimensions[(row["link_id"], dimension, value)] += n
+
+    def __bool__(self) -> bool:
+        return bool(self.daily or self.dimensions)
+
+
+def _insert_for(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+
+def bump_stats_versions(db: Session, link_ids: Optional[Iterable[int]]):
+    """
+    Marks the links' stats as changed (all links if None), invalidating their
+    cached stats responses (see app.utils.stats_cache). Does not commit.
+    """
+    stmt = update(links_table).values(stats_version=links_table.c.stats_version + 1)
+    if link_ids is not None:
+        # Sorted, so concurrent writers lock the rows in the same order
+        link_ids = sorted(set(link_ids))
+        if not link_ids:
+            return
+        stmt = stmt.where(links_table.c.id.in_(link_ids))
+    db.execute(stmt)
+
+
+def apply_rollups(db: Session, delta: RollupDelta):
+    """
+    Upserts a delta into the rollup tables (clicks = clicks + excluded.clicks)
+    and bumps the stats version of every link it touches.
+    Does not commit: callers apply it inside their own event-writing transaction.
+    """
+    bump_stats_versions(
+        db, [link_id for link_id, _ in delta.daily] + [link_id for link_id, _, _ in delta.dimensions]
+    )
+    insert = _insert_for(db)
+    if delta.daily:
+        stmt = insert(daily_table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[daily_table.c.link_id, daily_table.c.day],
+            set_={"clicks": daily_table.c.clicks + stmt.excluded.clicks},
+        )
+        db.execute(stmt, [
+            {"link_id": link_id, "day": day, "clicks": n}
+            for (link_id, day), n in delta.daily.items() if n
+        ])
+    if delta.dimensions:
+        stmt = insert(dimension_table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[dimension_table.c.link_id, dimension_table.c.dimension, dimension_table.c.value],
+            set_={"clicks": dimension_table.c.clicks + stmt.excluded.clicks},
+        )
+        db.execute(stmt, [
+            {"link_id": link_id, "dimension": dimension, "value": value, "clicks": n}
+            for (link_id, dimension, value), n in delta.dimensions.items() if n
+        ])
+
+
+def _grouping_sets_counts(db: Session, link_ids: Optional[list], delta: RollupDelta):
+    """
+    Every breakdown from a single scan of click_events: one statement with
+    GROUPING SETS, aggregated in the server (PostgreSQL).
+    """
+    day_col = func.date(ClickEvent.timestamp)
+    columns = [day_col] + [getattr(ClickEvent, column) for column in DIMENSIONS.values()]
+    names = ["day"] + list(DIMENSIONS)
+    # GROUPING() sets a bit (leftmost argument first) for each column a row is *not* grouped by
+    full = (1 << len(columns)) - 1
+    set_for_mask = {full ^ (1 << (len(columns) - 1 - i)): name for i, name in enumerate(names)}
+
+    stmt = select(
+        ClickEvent.link_id,
+        func.grouping(*columns),
+        *columns,
+        func.count(),
+        # Rows still waiting for enrichment are counted when the enrichment stage claims them
+        func.count().filter(ClickEvent.enriched == True),
+    ).group_by(func.grouping_sets(*(tuple_(ClickEvent.link_id, column) for column in columns)))
+    if link_ids is not None:
+        stmt = stmt.where(ClickEvent.link_id.in_(link_ids))
+
+    for link_id, mask, *values, n, enriched in db.execute(stmt):
+        name = set_for_mask[mask]
+        value = values[names.index(name)]
+        if name == "day":
+            if value is not None:
+                delta.daily[(link_id, value)] += n
+        elif enriched:
+            delta.dimensions[(link_id, name, value or "")] += enriched
+
+
+def _group_by_counts(db: Session, link_ids: Optional[list], delta: RollupDelta):
+    """One GROUP BY per breakdown (SQLite has no GROUPING SETS)."""
+    def _scoped(stmt):
+        return stmt.where(ClickEvent.link_id.in_(link_ids)) if link_ids is not None else stmt
+
+    day_col = func.date(ClickEvent.timestamp)
+    for link_id, day, n in db.execute(_scoped(
+        select(ClickEvent.link_id, day_col, func.count()).group_by(ClickEvent.link_id, day_col)
+    )):
+        if day is not None:
+            delta.daily[(link_id, day if isinstance(day, date) else date.fromisoformat(day))] += n
+
+    # Rows still waiting for enrichment are counted when the enrichment stage claims them
+    for dimension, column_name in DIMENSIONS.items():
+        column = getattr(ClickEvent, column_name)
+        rows = db.execute(_scoped(
+            select(ClickEvent.link_id, column, func.count())
+            .where(ClickEvent.enriched == True)
+            .group_by(ClickEvent.link_id, column)
+        ))
+        for link_id, value, n in rows:
+            delta.dimensions[(link_id, dimension, value or "")] += n
+
+
+def rebuild_rollups(db: Session, link_ids: Optional[list] = None) -> int:
+    """
+    Recomputes rollups from click_events for the given links (all links if None)
+    with server-side aggregation. Does not commit. Returns the number of events counted.
+
+    On PostgreSQL every breakdown comes from one GROUPING SETS scan. Elsewhere
+    each breakdown is its own GROUP BY; on SQLite that breaks even with
+    streaming the events through Python once (benchmarks/bench_stats_engine.py).
+    """
+    def _scoped(stmt, column):
+        return stmt.where(column.in_(link_ids)) if link_ids is not None else stmt
+
+    db.execute(_scoped(delete(daily_table), daily_table.c.link_id))
+    db.execute(_scoped(delete(dimension_table), dimension_table.c.link_id))
+
+    delta = RollupDelta()
+    if db.get_bind().dialect.name == "postgresql":
+        _grouping_sets_counts(db, link_ids, delta)
+    else:
+        _group_by_counts(db, link_ids, delta)
+
+    apply_rollups(db, delta)
+    # Including links left with no events at all
+    bump_stats_versions(db, link_ids)
+    return sum(delta.daily.values())
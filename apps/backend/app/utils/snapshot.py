@@ -0,0 +1,258 @@
+"""
+Static redirect snapshot, for serving redirects at the edge without Python.
+
+Compiles every link that needs nothing from the app into lookup artifacts
+in SNAPSHOT_DIR:
+- redirects.tsv:  `short_code<TAB>status<TAB>destination`, sorted by code.
+                  The canonical copy; its header records the change cursor.
+- redirects.map:  nginx `map` blocks, one variable per redirect status.
+- redirects.json: {"short_code": [destination, status], ...}
+
+A link qualifies when it is active, not deleted, not gated (password or
+login), untracked and has no expiry: tracked visits must be recorded,
+gates checked and expiry enforced by `redirect_to_url`, so those links are
+left out and the edge falls through to the app for them.
+
+Rebuilds are incremental when possible: the `link_changes` rows past the
+snapshot's cursor name the short codes that changed; only those are
+re-read, and merged into the previous sorted table in one streaming pass.
+If the cursor predates the retained changes (pruned, or the table was
+reset) the snapshot is rebuilt in full.
+"""
+import heapq
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud.link import build_redirect_url
+from app.models.link import Link
+from app.models.link_change import LinkChange
+
+FORMATS = ("tsv", "nginx", "json")
+FILENAMES = {"tsv": "redirects.tsv", "nginx": "redirects.map", "json": "redirects.json"}
+HEADER_PREFIX = "# nololink-snapshot"
+REDIRECT_STATUSES = (301, 302, 307, 308)
+# nginx map values interpolate `$` and can't hold quotes, backslashes or whitespace
+_NGINX_UNSAFE = set('$"\\;{} \t\r\n')
+
+
+class SnapshotEntry(NamedTuple):
+    short_code: str
+    status: int
+    destination: str
+
+
+# Builds in this process share the temporary files, so one at a time
+_build_lock = threading.Lock()
+
+_snapshot_columns = select(
+    Link.short_code, Link.redirect_type, Link.redirect_url, Link.original_url,
+    Link.utm_source, Link.utm_medium, Link.utm_campaign, Link.utm_term, Link.utm_content,
+).where(
+    Link.is_deleted == False,
+    Link.is_active == True,
+    Link.track_activity == False,
+    Link.password_hash.is_(None),
+    Link.require_login == False,
+    Link.expires_at.is_(None),
+)
+
+
+def iter_entries(db: Session, short_codes: Optional[List[str]] = None, batch_size: int = 1000) -> Iterator[SnapshotEntry]:
+    """Eligible links in short code order, streamed `batch_size` rows at a time."""
+    # Code point order, which the incremental merge relies on (Postgres sorts by locale otherwise)
+    order = Link.short_code.collate("C") if db.get_bind().dialect.name == "postgresql" else Link.short_code
+    stmt = _snapshot_columns.order_by(order)
+    if short_codes is not None:
+        stmt = stmt.where(Link.short_code.in_(short_codes))
+    for row in db.execute(stmt.execution_options(yield_per=batch_size)):
+        status = row.redirect_type if row.redirect_type in REDIRECT_STATUSES else 302
+        yield SnapshotEntry(row.short_code, status, row.redirect_url or build_redirect_url(row))
+
+
+def _is_tsv_safe(entry: SnapshotEntry) -> bool:
+    return not any(c in "\t\r\n" for c in entry.short_code + entry.destination)
+
+
+def read_tsv(path: str) -> Tuple[Optional[int], Iterator[SnapshotEntry]]:
+    """(cursor, entries) of an existing snapshot table; (None, nothing) if there is none."""
+    if not os.path.exists(path):
+        return None, iter(())
+    with open(path, encoding="utf-8") as f:
+        header = f.readline()
+    cursor = None
+    if header.startswith(HEADER_PREFIX):
+        fields = dict(part.split("=", 1) for part in header.split()[2:] if "=" in part)
+        cursor = int(fields["cursor"]) if "cursor" in fields else None
+
+    def entries():
+        with open(path, encoding="utf-8") as f:
+            f.readline()
+            for line in f:
+                code, status, destination = line.rstrip("\n").split("\t", 2)
+                yield SnapshotEntry(code, int(status), destination)
+
+    return cursor, entries()
+
+
+class SnapshotWriter:
+    """Writes every requested format in a single pass, then swaps them all in."""
+
+    def __init__(self, out_dir: str, formats: Iterable[str], cursor: int):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        # The table is the base for the next incremental rebuild, so it is always written
+        self.formats = ["tsv"] + [fmt for fmt in formats if fmt != "tsv"]
+        self.cursor = cursor
+        self.files = {
+            fmt: open(os.path.join(out_dir, FILENAMES[fmt] + ".tmp"), "w", encoding="utf-8")
+            for fmt in self.formats
+        }
+        self.count = 0
+        self.skipped = 0
+        # nginx can't choose the return status from a variable, so one map per status,
+        # each spooled to its own temporary file and concatenated on commit
+        self._nginx_maps = (
+            {status: tempfile.TemporaryFile("w+", encoding="utf-8") for status in REDIRECT_STATUSES}
+            if "nginx" in self.files else None
+        )
+        generated = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        self.files["tsv"].write(f"{HEADER_PREFIX} cursor={cursor} generated={generated}\n")
+        if "json" in self.files:
+            self.files["json"].write("{")
+
+    def write(self, entry: SnapshotEntry):
+        if not _is_tsv_safe(entry):
+            self.skipped += 1
+            return
+        self.files["tsv"].write(f"{entry.short_code}\t{entry.status}\t{entry.destination}\n")
+        if "json" in self.files:
+            sep = "," if self.count else ""
+            self.files["json"].write(f"{sep}\n{json.dumps(entry.short_code)}:{json.dumps([entry.destination, entry.status])}")
+        if self._nginx_maps is not None and not _NGINX_UNSAFE.intersection(entry.short_code + entry.destination):
+            self._nginx_maps[entry.status].write(f'    "/{entry.short_code}" "{entry.destination}";\n')
+        self.count += 1
+
+    def _write_nginx(self, f):
+        f.write(
+            f"# Generated by NoloLink (cursor {self.cursor}). Include in the http block, then in the server:\n"
+            + "".join(f"#   if ($nolo_{s}) {{ return {s} $nolo_{s}; }}\n" for s in REDIRECT_STATUSES)
+            + "# Anything unmatched falls through to the app. Large maps need map_hash_max_size raised.\n"
+        )
+        for status, part in self._nginx_maps.items():
+            f.write(f"map $uri $nolo_{status} {{\n    default \"\";\n")
+            part.seek(0)
+            shutil.copyfileobj(part, f)
+            f.write("}\n")
+
+    def commit(self):
+        if "json" in self.files:
+            self.files["json"].write("\n}\n")
+        if self._nginx_maps is not None:
+            self._write_nginx(self.files["nginx"])
+            self._close_nginx_maps()
+        for fmt, f in self.files.items():
+            f.close()
+            path = os.path.join(self.out_dir, FILENAMES[fmt])
+            os.replace(path + ".tmp", path)
+
+    def _close_nginx_maps(self):
+        for part in (self._nginx_maps or {}).values():
+            part.close()
+
+    def abort(self):
+        self._close_nginx_maps()
+        for fmt, f in self.files.items():
+            f.close()
+            try:
+                os.remove(os.path.join(self.out_dir, FILENAMES[fmt] + ".tmp"))
+            except FileNotFoundError:
+                pass
+
+
+def _changed_codes(db: Session, cursor: int) -> Optional[List[str]]:
+    """Short codes changed after `cursor`, or None when the retained changes don't reach back that far."""
+    oldest, newest = db.execute(select(func.min(LinkChange.id), func.max(LinkChange.id))).one()
+    if newest is None:
+        return [] if cursor == 0 else None
+    if newest < cursor or oldest > cursor + 1:
+        return None
+    return sorted(set(db.execute(
+        select(LinkChange.key).where(LinkChange.id > cursor, LinkChange.kind == "link")
+    ).scalars()))
+
+
+def build_snapshot(
+    db: Session,
+    out_dir: Optional[str] = None,
+    formats: Iterable[str] = FORMATS,
+    full: bool = False,
+    batch_size: int = 1000,
+) -> dict:
+    """Rebuild the snapshot in `out_dir` (incrementally unless `full`) and return a summary."""
+    out_dir = out_dir or settings.SNAPSHOT_DIR
+    formats = list(formats)
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown snapshot format(s): {', '.join(sorted(unknown))}")
+    with _build_lock:
+        return _build(db, out_dir, formats, full, batch_size)
+
+
+def _build(db: Session, out_dir: str, formats: Iterable[str], full: bool, batch_size: int) -> dict:
+    started = time.perf_counter()
+    # Read the cursor first: changes made while we stream are picked up again next time
+    cursor = db.execute(select(func.coalesce(func.max(LinkChange.id), 0))).scalar()
+
+    previous_cursor, previous = read_tsv(os.path.join(out_dir, FILENAMES["tsv"]))
+    changed = None
+    # Only the database transport records changes in link_changes
+    if not full and previous_cursor is not None and settings.INVALIDATION_TRANSPORT == "database":
+        changed = _changed_codes(db, previous_cursor)
+
+    if changed == [] and all(os.path.exists(os.path.join(out_dir, FILENAMES[fmt])) for fmt in formats):
+        # Nothing to apply; leave the files (and their mtimes) alone
+        return {
+            "mode": "unchanged", "entries": None, "skipped": 0, "changed_codes": 0, "cursor": previous_cursor,
+            "formats": ["tsv"] + [fmt for fmt in formats if fmt != "tsv"], "out_dir": out_dir,
+            "elapsed_seconds": round(time.perf_counter() - started, 3),
+        }
+
+    if changed is None:
+        entries = iter_entries(db, batch_size=batch_size)
+        mode = "full"
+    else:
+        changed_set = set(changed)
+        fresh: List[SnapshotEntry] = []
+        for i in range(0, len(changed), batch_size):
+            fresh.extend(iter_entries(db, changed[i:i + batch_size], batch_size))
+        kept = (entry for entry in previous if entry.short_code not in changed_set)
+        entries = heapq.merge(kept, sorted(fresh))
+        mode = "incremental"
+
+    writer = SnapshotWriter(out_dir, formats, cursor)
+    try:
+        for entry in entries:
+            writer.write(entry)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.commit()
+    return {
+        "mode": mode,
+        "entries": writer.count,
+        "skipped": writer.skipped,
+        "changed_codes": len(changed) if changed is not None else None,
+        "cursor": cursor,
+        "formats": writer.formats,
+        "out_dir": out_dir,
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,80 @@
+"""
+Per-link stats cache.
+
+Every write that changes a link's click rollups (ingestion, enrichment,
+re-enrichment, rebuilds) bumps `links.stats_version` in the same
+transaction (see app.utils.rollups.bump_stats_versions). The stats endpoint
+already loads the link row, so the version comes for free; the aggregates
+are cached per (link, version, first day of the window) and only
+recomputed when one of those moves. Concurrent misses for the same key
+(a burst of refreshes of a viral link) run a single aggregation, through
+SingleFlight.
+
+Responses carry a strong ETag (a hash of the body) and are answered with
+304 when the client already has them.
+"""
+import hashlib
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.analytics import LinkDailyClicks, LinkDimensionClicks
+from app.utils.cache import LRUCache, SingleFlight
+from app.utils.enrichment import pending_dimension_counts
+
+STATS_WINDOW_DAYS = 30
+
+stats_cache = LRUCache(maxsize=settings.STATS_CACHE_SIZE)
+stats_single_flight = SingleFlight()
+
+
+def compute_link_stats(db: Session, link_id: int, since: date) -> dict:
+    """The stats endpoint's aggregates, read from the rollup tables."""
+    # Clicks not enriched yet aren't in the dimension rollup; derive theirs on the fly
+    pending = pending_dimension_counts(db, link_id)
+
+    def top_values(dimension: str, limit: Optional[int] = None):
+        counts = dict(db.query(LinkDimensionClicks.value, LinkDimensionClicks.clicks).filter(
+            LinkDimensionClicks.link_id == link_id,
+            LinkDimensionClicks.dimension == dimension,
+        ).all())
+        for (pending_dimension, value), n in pending.items():
+            if pending_dimension == dimension:
+                counts[value] = counts.get(value, 0) + n
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    clicks_over_time = db.query(LinkDailyClicks.day, LinkDailyClicks.clicks).filter(
+        LinkDailyClicks.link_id == link_id,
+        LinkDailyClicks.day >= since,
+    ).order_by(LinkDailyClicks.day).all()
+
+    return {
+        "clicks_over_time": [{"date": str(day), "count": clicks} for day, clicks in clicks_over_time],
+        "top_countries": [{"country": value or "Unknown", "count": n} for value, n in top_values("country", 10)],
+        "top_referrers": [{"referrer": value or "Direct", "count": n} for value, n in top_values("referrer", 10)],
+        "device_breakdown": [{"device": value or "Unknown", "count": n} for value, n in top_values("device")],
+    }
+
+
+def get_link_stats(db: Session, link) -> dict:
+    """Aggregates for `link` as of its loaded stats_version, from the cache when possible."""
+    since = (datetime.utcnow() - timedelta(days=STATS_WINDOW_DAYS)).date()
+    key = (link.id, link.stats_version or 0, since)
+    stats = stats_cache.get(key)
+    if stats is None:
+        stats = stats_single_flight.do(key, _compute_and_store, db, key)
+    return stats
+
+
+def _compute_and_store(db: Session, key: tuple) -> dict:
+    link_id, _, since = key
+    stats = compute_link_stats(db, link_id, since)
+    # Older versions of the link are never asked for again; the LRU ages them out
+    stats_cache.set(key, stats)
+    return stats
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
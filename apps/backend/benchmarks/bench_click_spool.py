@@ -0,0 +1,76 @@
+"""
+Click spool append throughput per fsync policy, and replay (read) speed.
+
+Usage (from apps/backend):
+    python -m benchmarks.bench_click_spool [--events 200000] [--dir /tmp/click-spool-bench]
+
+Appends realistic RawClicks from a single thread, the way capture_click
+does, and reports events/sec for "never" and "interval" (the default) and,
+on a smaller sample, "always" (one fsync per event). The target is at least
+50k events/sec with the default policy on local disk. Replay decodes every
+segment without a database, to show the drainer's own overhead.
+"""
+import argparse
+import os
+import shutil
+import time
+from datetime import datetime
+
+from app.utils.click_queue import RawClick
+from app.utils.click_spool import ClickSpool, read_segment
+
+AGENT = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1"
+
+
+def _spool(directory: str, fsync: str) -> ClickSpool:
+    shutil.rmtree(directory, ignore_errors=True)
+    return ClickSpool(directory, writer=lambda db, batch: None, fsync=fsync, session_factory=lambda: None)
+
+
+def bench_append(directory: str, fsync: str, events: int) -> float:
+    spool = _spool(directory, fsync)
+    clicks = [RawClick(i % 5000, f"203.0.113.{i % 250}", AGENT, "https://news.example.com/a/b", datetime.utcnow())
+              for i in range(min(events, 10000))]
+    started = time.perf_counter()
+    if fsync == "interval":
+        # What the drainer thread does in the background
+        deadline = started + spool.fsync_interval
+        for i in range(events):
+            spool.append(clicks[i % len(clicks)])
+            if i % 1000 == 0 and time.perf_counter() >= deadline:
+                spool.sync()
+                deadline = time.perf_counter() + spool.fsync_interval
+    else:
+        for i in range(events):
+            spool.append(clicks[i % len(clicks)])
+    spool.close()
+    return events / (time.perf_counter() - started)
+
+
+def bench_replay(directory: str) -> float:
+    started = time.perf_counter()
+    count = 0
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), "rb") as f:
+            for _ in read_segment(f):
+                count += 1
+    return count / (time.perf_counter() - started)
+
+
+def run(events: int, directory: str):
+    for fsync in ("never", "interval"):
+        rate = bench_append(directory, fsync, events)
+        print(f"append fsync={fsync:<8} {rate:>12,.0f} events/sec")
+    print(f"replay (decode)        {bench_replay(directory):>12,.0f} events/sec")
+    sample = max(1, events // 100)
+    rate = bench_append(directory, "always", sample)
+    print(f"append fsync=always    {rate:>12,.0f} events/sec ({sample} events)")
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--dir", default="/tmp/click-spool-bench")
+    args = parser.parse_args()
+    run(args.events, args.dir)
@@ -0,0 +1,57 @@
+"""
+GeoIP lookup throughput: local range database vs. nothing else on the path.
+
+Usage (from apps/backend):
+    python -m benchmarks.bench_geoip [--ranges 500000] [--lookups 1000000]
+
+Builds a synthetic database of non-overlapping IPv4/IPv6 ranges (about the
+size of a full country-level database) and reports lookups/sec.
+"""
+import argparse
+import random
+import time
+
+from app.utils.geoip import RangeDatabaseResolver
+
+COUNTRIES = ["US", "CA", "GB", "DE", "FR", "JP", "AU", "BR", "IN", "NL"]
+
+
+def synthetic_ranges(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    v4_bounds = sorted(rng.sample(range(1, 2 ** 32 - 1), count))
+    for i in range(0, len(v4_bounds) - 1, 2):
+        yield 4, v4_bounds[i], v4_bounds[i + 1], rng.choice(COUNTRIES)
+    base = 0x2000 << 112
+    for i in range(count // 10):
+        start = base + i * (1 << 96)
+        yield 6, start, start + (1 << 95), rng.choice(COUNTRIES)
+
+
+def run(ranges: int, lookups: int):
+    started = time.perf_counter()
+    resolver = RangeDatabaseResolver(synthetic_ranges(ranges))
+    load = time.perf_counter() - started
+    print(f"loaded {len(resolver)} ranges in {load:.2f}s")
+
+    rng = random.Random(11)
+    v4 = [f"{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}" for _ in range(10000)]
+    v6 = [f"2001:db8:{rng.randrange(65536):x}::{rng.randrange(65536):x}" for _ in range(10000)]
+
+    for label, sample in (("ipv4", v4), ("ipv6", v6)):
+        lookup = resolver.lookup
+        n = 0
+        started = time.perf_counter()
+        while n < lookups:
+            for ip in sample:
+                lookup(ip)
+            n += len(sample)
+        elapsed = time.perf_counter() - started
+        print(f"{label}: {n / elapsed:,.0f} lookups/sec ({elapsed / n * 1e6:.2f} us/lookup)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ranges", type=int, default=500000)
+    parser.add_argument("--lookups", type=int, default=1000000)
+    args = parser.parse_args()
+    run(args.ranges, args.lookups)
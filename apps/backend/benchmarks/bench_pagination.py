@@ -0,0 +1,89 @@
+"""
+Deep pages of the audit log: OFFSET vs. cursor.
+
+Usage (from apps/backend):
+    python -m benchmarks.bench_pagination [--entries 1000000] [--limit 50]
+
+Fills a throwaway SQLite file with audit entries (the admin view: no user
+filter, newest first) and times fetching a page at increasing depths
+through get_audit_logs, once with `skip` and once with the cursor the
+previous page would have handed out. OFFSET reads and discards every row
+before the page, so its cost grows with the depth; the cursor seeks to the
+page through ix_audit_logs_timestamp and stays flat.
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import app.cli  # noqa: F401  (registers the mappers)
+from app.crud.audit import get_audit_logs
+from app.db.base import Base
+from app.models.audit import AuditLog
+from app.models.user import User
+from app.utils.pagination import decode_cursor, encode_cursor
+
+TABLES = [User.__table__, AuditLog.__table__]
+
+
+def populate(session, entries: int):
+    session.add(User(email="bench@example.com", username="bench"))
+    session.commit()
+    started = datetime.utcnow()
+    batch = 50000
+    for start in range(0, entries, batch):
+        session.execute(insert(AuditLog.__table__), [
+            # A few entries per second, so timestamps tie the way real ones do
+            {"user_id": 1, "action": "update", "target_type": "link", "target_id": i,
+             "timestamp": started - timedelta(seconds=i // 3)}
+            for i in range(start, min(entries, start + batch))
+        ])
+        session.commit()
+
+
+def _time(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        begun = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - begun)
+    return best
+
+
+def run(entries: int, limit: int, path: str):
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine, tables=TABLES)
+    session = sessionmaker(bind=engine)()
+    try:
+        begun = time.perf_counter()
+        populate(session, entries)
+        print(f"{entries:,} audit entries (generated in {time.perf_counter() - begun:.1f}s), pages of {limit}")
+        depth = limit
+        while depth < entries:
+            # The entry just above the page, as the previous page's cursor names it
+            before = get_audit_logs(session, skip=depth - 1, limit=1)[0]
+            cursor = decode_cursor(encode_cursor(before.timestamp, before.id), datetime, int)
+            assert [e.id for e in get_audit_logs(session, cursor=cursor, limit=limit)] == \
+                [e.id for e in get_audit_logs(session, skip=depth, limit=limit)]
+            offset = _time(lambda: get_audit_logs(session, skip=depth, limit=limit))
+            keyset = _time(lambda: get_audit_logs(session, cursor=cursor, limit=limit))
+            print(f"  page {depth // limit + 1:>8,}  offset {offset * 1000:9.2f} ms  cursor {keyset * 1000:7.2f} ms")
+            depth *= 10
+    finally:
+        session.close()
+        engine.dispose()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--path", default="/tmp/bench-pagination.db", help="SQLite file to fill (removed afterwards)")
+    args = parser.parse_args()
+    run(args.entries, args.limit, args.path)
@@ -0,0 +1,184 @@
+"""
+Redirect throughput under concurrency, for three ways of serving /{short_code}:
+- sync:  the original `def` route (threadpool + sync session)
+- async: the async route (async engine, event loop), behind the full router
+- fast:  the raw ASGI fast path in front of the app (what main.app runs)
+
+Usage (from apps/backend):
+    python -m benchmarks.bench_redirect_load [--concurrency 500] [--requests 20000]
+        [--links 1000] [--cache-size 0]
+
+Each mode runs in its own uvicorn subprocess against the same throwaway
+SQLite database. Load comes from a minimal keep-alive HTTP/1.1 client on raw
+asyncio streams, which keeps the generator cheap enough not to be the
+bottleneck. --cache-size 0 disables the redirect cache so every request
+reaches the database.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _seed(db_path: str, links: int):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from app.db.base import Base
+    import app.cli # noqa: F401 (registers every model)
+    from app.models.link import Link
+    from app.models.user import User
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = User(keyn_id="bench", email="bench@example.com", username="bench")
+        session.add(user)
+        session.flush()
+        session.add_all(
+            Link(short_code=f"b{i}", original_url=f"https://example.com/{i}", owner_id=user.id)
+            for i in range(links)
+        )
+        session.commit()
+    engine.dispose()
+
+
+def _router_app(mode: str):
+    """The app without the fast path, with the API routes in front as in production."""
+    from fastapi import Depends, FastAPI, Request
+    from fastapi.responses import RedirectResponse
+    from sqlalchemy.orm import Session
+    from app.api.api import api_router
+    from app.api.endpoints import redirect
+    from app.crud import link as crud_link
+    from app.db.session import get_db
+    from app.utils.analytics import capture_click
+    from main import lifespan
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(api_router, prefix="/api")
+    if mode == "async":
+        app.include_router(redirect.router)
+        return app
+
+    # The redirect route as it was before: a plain `def` on the sync session
+    @app.get("/{short_code}")
+    def redirect_to_url(short_code: str, request: Request, db: Session = Depends(get_db)):
+        link = crud_link.get_redirect_entry(db, short_code=short_code)
+        if not link:
+            return RedirectResponse("/404", status_code=302)
+        crud_link.increment_clicks(link.id)
+        capture_click(link, request)
+        return RedirectResponse(link.destination, status_code=link.redirect_type)
+
+    return app
+
+
+def serve(mode: str, port: int):
+    import uvicorn
+    if mode == "fast":
+        from main import app
+    else:
+        app = _router_app(mode)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", backlog=2048)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _load(port: int, concurrency: int, total: int, links: int):
+    latencies = []
+    errors = 0
+    remaining = total
+    rng = random.Random(5)
+
+    async def connection():
+        nonlocal remaining, errors
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                writer.write(f"GET /b{rng.randrange(links)} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                if not head.startswith(b"HTTP/1.1 302"):
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+        except (OSError, asyncio.IncompleteReadError):
+            errors += 1
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connection() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000,
+        "errors": errors,
+    }
+
+
+def _wait_for(port: int, timeout: float = 20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def run(concurrency: int, requests: int, links: int, cache_size: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        _seed(db_path, links)
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", REDIRECT_CACHE_SIZE=str(cache_size), DEBUG="true")
+
+        for mode in ("sync", "async", "fast"):
+            port = _free_port()
+            server = subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.bench_redirect_load", "--serve", mode, "--port", str(port)],
+                env=env,
+            )
+            try:
+                _wait_for(port)
+                asyncio.run(_load(port, min(concurrency, 50), min(requests, 1000), links)) # warm up
+                result = asyncio.run(_load(port, concurrency, requests, links))
+            finally:
+                server.terminate()
+                server.wait()
+            print(f"{mode:>5}: {result['rps']:,.0f} req/sec  p50 {result['p50']:.1f}ms  "
+                  f"p99 {result['p99']:.1f}ms  errors {result['errors']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--links", type=int, default=1000)
+    parser.add_argument("--cache-size", type=int, default=0)
+    parser.add_argument("--serve", choices=("sync", "async", "fast"), help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve, args.port)
+    else:
+        run(args.concurrency, args.requests, args.links, args.cache_size)
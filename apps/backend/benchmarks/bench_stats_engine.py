@@ -0,0 +1,190 @@
+"""
+Link stats from raw click_events: one query per breakdown vs. a single pass.
+
+Usage (from apps/backend):
+    python -m benchmarks.bench_stats_engine [--sizes 10000,1000000]
+    python -m benchmarks.bench_stats_engine --sizes 10000000        # ~6 minutes to generate on SQLite
+    python -m benchmarks.bench_stats_engine --url postgresql://localhost/nolo_bench
+
+For each size, fills a throwaway database (a SQLite file by default; the
+click_events table is created and dropped at `--url` otherwise) with that
+many events on one link, correlated the way real traffic is (a few dozen
+user agent profiles, skewed countries and referrers, 90 days), and times:
+- four_queries:  what get_link_stats ran before rollups: clicks per day,
+                 top countries, top referrers, devices; a scan each
+- per_breakdown: rebuild_rollups' counting on SQLite, a GROUP BY for the
+                 days and for each of the five dimensions
+- grouping_sets: rebuild_rollups' counting on PostgreSQL, every breakdown
+                 from one GROUPING SETS scan (PostgreSQL only)
+- python_pass:   one streaming scan (yield_per, narrow columns), counting
+                 each distinct combination with Counter.update, then
+                 projecting the breakdowns
+- numpy_pass:    the same, projecting with dictionary encoding and a
+                 weighted bincount (if NumPy is installed)
+
+On SQLite the Python passes only break even with per_breakdown: reading
+every event into the interpreter costs about what the extra scans do. So
+rebuild_rollups leaves the single pass to the database where it has one.
+"""
+import argparse
+import os
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+import app.cli  # noqa: F401  (registers the mappers)
+from app.db.base import Base
+from app.models.analytics import ClickEvent, LinkDailyClicks, LinkDimensionClicks
+from app.models.link import Link
+from app.models.user import User
+from app.utils import rollups
+from app.utils.rollups import DIMENSIONS, RollupDelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# (device_type, os, browser) per user agent profile
+PROFILES = [
+    (device, os_name, browser)
+    for device, systems in (("mobile", ("iOS", "Android")), ("desktop", ("Windows", "Mac OS X", "Linux")), ("tablet", ("iOS", "Android")))
+    for os_name in systems
+    for browser in ("Chrome", "Safari", "Firefox", "Edge", "Samsung Internet")
+]
+COUNTRIES = ["US", "GB", "DE", "CA", "FR", "IN", "BR", "JP", "AU", "NL", "ES", "IT", "SE", "MX", "PL", None]
+REFERRERS = [None, "google.com", "t.co", "facebook.com", "linkedin.com", "reddit.com"] + [f"blog{i}.example" for i in range(200)]
+TABLES = [User.__table__, Link.__table__, ClickEvent.__table__, LinkDailyClicks.__table__, LinkDimensionClicks.__table__]
+
+
+def _zipf_choices(rng, values, k):
+    weights = [1 / (rank + 1) for rank in range(len(values))]
+    return rng.choices(values, weights=weights, k=k)
+
+
+def populate(session, events: int, seed: int = 3) -> int:
+    user = User(email="bench@example.com", username="bench")
+    session.add(user)
+    session.flush()
+    link = Link(short_code="bench", original_url="https://example.com", owner_id=user.id)
+    session.add(link)
+    session.commit()
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    batch = 50000
+    for start in range(0, events, batch):
+        n = min(batch, events - start)
+        profiles = _zipf_choices(rng, PROFILES, n)
+        countries = _zipf_choices(rng, COUNTRIES, n)
+        referrers = _zipf_choices(rng, REFERRERS, n)
+        session.execute(insert(ClickEvent.__table__), [
+            {
+                "link_id": link.id,
+                "timestamp": now - timedelta(minutes=rng.randrange(90 * 24 * 60)),
+                "country_code": country, "referrer": referrer,
+                "device_type": device, "os": os_name, "browser": browser,
+                "enriched": True,
+            }
+            for (device, os_name, browser), country, referrer in zip(profiles, countries, referrers)
+        ])
+        session.commit()
+    return link.id
+
+
+def four_queries(session, link_id: int):
+    since = datetime.utcnow() - timedelta(days=30)
+    session.query(func.date(ClickEvent.timestamp).label("date"), func.count(ClickEvent.id)).filter(
+        ClickEvent.link_id == link_id, ClickEvent.timestamp >= since
+    ).group_by("date").all()
+    for column, limit in ((ClickEvent.country_code, 10), (ClickEvent.referrer, 10), (ClickEvent.device_type, None)):
+        query = session.query(column, func.count(ClickEvent.id)).filter(ClickEvent.link_id == link_id).group_by(column)
+        query = query.order_by(func.count(ClickEvent.id).desc())
+        (query.limit(limit) if limit else query).all()
+
+
+def _combinations(session, link_id: int) -> Counter:
+    stmt = select(
+        func.date(ClickEvent.timestamp), *(getattr(ClickEvent, column) for column in DIMENSIONS.values())
+    ).where(ClickEvent.link_id == link_id, ClickEvent.enriched == True)
+    combinations = Counter()
+    for partition in session.connection().execute(stmt.execution_options(yield_per=10000)).partitions():
+        combinations.update(map(tuple, partition))
+    return combinations
+
+
+def python_pass(session, link_id: int) -> dict:
+    breakdowns = {name: Counter() for name in ["day", *DIMENSIONS]}
+    for values, n in _combinations(session, link_id).items():
+        for counts, value in zip(breakdowns.values(), values):
+            counts[value] += n
+    return breakdowns
+
+
+def numpy_pass(session, link_id: int) -> dict:
+    combinations = _combinations(session, link_id)
+    counts = np.fromiter(combinations.values(), dtype=np.int64, count=len(combinations))
+    breakdowns = {}
+    for name, column in zip(["day", *DIMENSIONS], zip(*combinations)):
+        codes = {}
+        encoded = np.fromiter((codes.setdefault(value, len(codes)) for value in column), dtype=np.int64, count=len(counts))
+        breakdowns[name] = dict(zip(codes, np.bincount(encoded, weights=counts).astype(np.int64).tolist()))
+    return breakdowns
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(sizes, url: str, repeat: int):
+    for size in sizes:
+        sqlite_path = url[len("sqlite:///"):] if url.startswith("sqlite:///") else None
+        if sqlite_path and os.path.exists(sqlite_path):
+            os.remove(sqlite_path)
+        engine = create_engine(url)
+        Base.metadata.create_all(engine, tables=TABLES)
+        session = sessionmaker(bind=engine)()
+        try:
+            started = time.perf_counter()
+            link_id = populate(session, size)
+            print(f"{size:,} events on {engine.dialect.name} (generated in {time.perf_counter() - started:.1f}s)")
+
+            methods = {
+                "four_queries": lambda: four_queries(session, link_id),
+                "per_breakdown": lambda: rollups._group_by_counts(session, [link_id], RollupDelta()),
+            }
+            if engine.dialect.name == "postgresql":
+                methods["grouping_sets"] = lambda: rollups._grouping_sets_counts(session, [link_id], RollupDelta())
+            methods["python_pass"] = lambda: python_pass(session, link_id)
+            if np is not None:
+                methods["numpy_pass"] = lambda: numpy_pass(session, link_id)
+            baseline = None
+            for name, fn in methods.items():
+                elapsed = _time(fn, repeat if size <= 1000000 else 1)
+                session.rollback()
+                baseline = baseline or elapsed
+                print(f"  {name:<13} {elapsed * 1000:10.1f} ms  {size / elapsed:12,.0f} events/s  x{baseline / elapsed:.2f}")
+        finally:
+            session.close()
+            Base.metadata.drop_all(engine, tables=TABLES)
+            engine.dispose()
+            if sqlite_path and os.path.exists(sqlite_path):
+                os.remove(sqlite_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,1000000", help="Comma-separated event counts")
+    parser.add_argument("--url", default="sqlite:////tmp/bench-stats.db", help="Database to fill (dropped afterwards)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run([int(size) for size in args.sizes.split(",")], args.url, args.repeat)
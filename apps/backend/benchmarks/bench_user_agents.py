@@ -0,0 +1,56 @@
+"""
+User agent parsing throughput: cold (user_agents.parse every time) vs.
+warm (memoized parse_user_agent).
+
+Usage (from apps/backend):
+    python -m benchmarks.bench_user_agents [--clicks 20000] [--distinct 50]
+
+Clicks are drawn from a small pool of distinct UA strings, which is what
+real redirect traffic looks like.
+"""
+import argparse
+import random
+import time
+
+import user_agents
+
+from app.utils.analytics import parse_user_agent, user_agent_cache
+
+BASE_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_{v} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 14; Pixel {v}) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_{v}) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15",
+    "Mozilla/5.0 (iPad; CPU OS 16_{v} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (compatible; Googlebot/2.{v}; +http://www.google.com/bot.html)",
+]
+
+
+def run(clicks: int, distinct: int):
+    pool = [BASE_AGENTS[i % len(BASE_AGENTS)].format(v=i) for i in range(distinct)]
+    rng = random.Random(3)
+    stream = [rng.choice(pool) for _ in range(clicks)]
+
+    started = time.perf_counter()
+    for ua in stream:
+        user_agents.parse(ua)
+    cold = time.perf_counter() - started
+
+    user_agent_cache.clear()
+    user_agent_cache.reset_stats()
+    started = time.perf_counter()
+    for ua in stream:
+        parse_user_agent(ua)
+    warm = time.perf_counter() - started
+
+    print(f"cold: {clicks / cold:,.0f} parses/sec")
+    print(f"warm: {clicks / warm:,.0f} parses/sec ({cold / warm:.0f}x)")
+    print(f"cache: {user_agent_cache.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clicks", type=int, default=20000)
+    parser.add_argument("--distinct", type=int, default=50)
+    args = parser.parse_args()
+    run(args.clicks, args.distinct)
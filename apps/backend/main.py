@@ -1,10 +1,45 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api.api import api_router
 from app.api.endpoints import redirect
+from app.api.fast_redirect import FastRedirectMiddleware
+from app.utils.click_counter import click_counter
+from app.utils.analytics import click_queue, click_spool
+from app.utils.enrichment import click_enricher
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.code_filter import short_code_filter
+from app.utils.invalidation import invalidation_bus
+from app.db.session import async_engine
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    invalidation_bus.start()
+    if settings.SHORT_CODE_FILTER_ENABLED:
+        short_code_filter.start()
+    click_counter.start()
+    click_queue.start()
+    if settings.CLICK_INGEST == "spool":
+        # Replays segments left behind by a crash or the previous deploy first
+        click_spool.start()
+    click_enricher.start()
+    yield
+    # Graceful shutdown: write out buffered clicks and queued/spooled click events
+    # (unenriched rows are picked up after the next start)
+    click_enricher.stop()
+    if settings.CLICK_INGEST == "spool":
+        click_spool.stop()
+    click_queue.stop()
+    click_counter.stop()
+    short_code_filter.stop()
+    invalidation_bus.stop()
+    await async_engine.dispose()
 
-app = FastAPI(title=settings.PROJECT_NAME, version=settings.PROJECT_VERSION)
+
+app = FastAPI(title=settings.PROJECT_NAME, version=settings.PROJECT_VERSION, lifespan=lifespan)
 
 # CORS
 origins = [
@@ -19,8 +54,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Outermost: short-code redirects are answered before routing; everything else passes through
+app.add_middleware(FastRedirectMiddleware)
+
 app.include_router(api_router, prefix="/api")
 app.include_router(redirect.router)
 
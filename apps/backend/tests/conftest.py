@@ -6,15 +6,25 @@ Provides:
 - FastAPI TestClient with auth dependency overrides
 - Pre-created test users (regular + superuser)
 - Helper factories for links and campaigns
+- A local stand-in HTTP server for outbound calls (KeyN, ip-api)
 """
 
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Before the app is imported: app.core.security refuses to start without a signing key
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
 
 from app.db.base import Base
-from app.db.session import get_db
+from app.db.session import get_db, get_async_db
 from app.api.deps import (
     get_current_user,
     get_current_active_user,
@@ -26,13 +36,28 @@ from app.models.link import Link
 from app.models.campaign import Campaign
 from app.models.analytics import ClickEvent
 from app.models.audit import AuditLog
+from app.utils.link_cache import redirect_cache, missing_codes, changed_codes
+from app.utils.code_filter import short_code_filter
+from app.utils.redirect_index import redirect_index
+from app.utils.click_counter import click_counter
+from app.utils.analytics import click_queue
+from app.utils.enrichment import click_enricher
+from app.utils.stats_cache import stats_cache
+from app.utils import geoip
+from app.api.deps import keyn_token_cache, keyn_negative_cache
+from app.crud.user import user_cache
+from app.core.http import http_client
+from app.utils.invalidation import invalidation_bus, LocalTransport
 from main import app
 
+# Invalidations stay in-process: the default database transport would write to the real DB
+invalidation_bus.use(LocalTransport())
+
 # ---------------------------------------------------------------------------
 # Database fixtures
 # ---------------------------------------------------------------------------
 
-SQLALCHEMY_TEST_URL = "sqlite:///file::memory:?cache=shared"
+SQLALCHEMY_TEST_URL = "sqlite:///file::memory:?cache=shared&uri=true"
 
 engine = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -60,6 +85,132 @@ def db():
     connection.close()
 
 
+@pytest.fixture(autouse=True)
+def reset_caches():
+    """In-process caches and buffers outlive the per-test rollback, so start every test cold."""
+    redirect_cache.clear()
+    redirect_cache.reset_stats()
+    missing_codes.clear()
+    short_code_filter.reset()
+    redirect_index.reset()
+    changed_codes.clear()
+    click_counter.reset()
+    click_queue.clear()
+    click_enricher.reset()
+    geoip.reset_resolver()
+    for cache in (keyn_token_cache, keyn_negative_cache, user_cache, stats_cache):
+        cache.clear()
+    stats_cache.reset_stats()
+    for name in ("keyn", "geoip"):
+        http_client.upstream(name).reset()
+    yield
+    redirect_cache.clear()
+    missing_codes.clear()
+    short_code_filter.reset()
+    redirect_index.reset()
+    changed_codes.clear()
+    click_counter.reset()
+    click_queue.clear()
+    geoip.reset_resolver()
+
+
+# ---------------------------------------------------------------------------
+# Stand-in upstream server
+# ---------------------------------------------------------------------------
+
+class StubServer:
+    """
+    Minimal HTTP/1.1 server on a random local port, standing in for KeyN or ip-api.
+
+    `respond()` queues canned responses per (method, path); the last queued
+    response for a route is repeated. Every request is recorded in `requests`.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.connections = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                stub.connections += 1
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode() if length else ""
+                path = self.path.split("?", 1)[0]
+                stub.requests.append({
+                    "method": self.command, "path": self.path,
+                    "headers": dict(self.headers), "body": body,
+                })
+                queue = stub.routes.get((self.command, path))
+                if not queue:
+                    status, payload, delay = 404, {}, 0
+                elif len(queue) > 1:
+                    status, payload, delay = queue.pop(0)
+                else:
+                    status, payload, delay = queue[0]
+                if delay:
+                    time.sleep(delay)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def respond(self, method: str, path: str, status: int = 200, json_data=None, delay: float = 0):
+        self.routes.setdefault((method, path), []).append((status, json_data or {}, delay))
+
+    def calls(self, method: str, path: str) -> int:
+        return sum(1 for r in self.requests if r["method"] == method and r["path"].split("?", 1)[0] == path)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture()
+def stub_server():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture()
+def keyn_server(stub_server, monkeypatch):
+    """Point the shared KeyN upstream at a stand-in server (no retry backoff)."""
+    upstream = http_client.upstream("keyn")
+    monkeypatch.setattr(upstream, "base_url", stub_server.url)
+    monkeypatch.setattr(upstream, "backoff", 0)
+    return stub_server
+
+
+@pytest.fixture()
+def geoip_server(stub_server, monkeypatch):
+    """Point the ip-api upstream at a stand-in server and select that provider."""
+    from app.core.config import settings
+    monkeypatch.setattr(http_client.upstream("geoip"), "base_url", stub_server.url)
+    monkeypatch.setattr(settings, "GEOIP_PROVIDER", "ip-api")
+    geoip.reset_resolver()
+    return stub_server
+
+
 # ---------------------------------------------------------------------------
 # User fixtures
 # ---------------------------------------------------------------------------
@@ -144,12 +295,39 @@ def unapproved_user(db: Session) -> User:
 # Client fixtures (with auth dependency overrides)
 # ---------------------------------------------------------------------------
 
-def _make_client(db: Session, user: User) -> TestClient:
-    """Build a TestClient with dependency overrides for the given user."""
+class AsyncSessionShim:
+    """
+    Presents the sync test session through the part of the AsyncSession API
+    the async routes use, so they see the same rolled-back test data.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    async def execute(self, *args, **kwargs):
+        return self.session.execute(*args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return self.session.get(*args, **kwargs)
 
+    async def commit(self):
+        self.session.commit()
+
+
+def _override_db(db: Session):
     def _override_get_db():
         yield db
 
+    async def _override_get_async_db():
+        yield AsyncSessionShim(db)
+
+    app.dependency_overrides[get_db] = _override_get_db
+    app.dependency_overrides[get_async_db] = _override_get_async_db
+
+
+def _make_client(db: Session, user: User) -> TestClient:
+    """Build a TestClient with dependency overrides for the given user."""
+
     def _override_get_current_user():
         return user
 
@@ -165,7 +343,7 @@ def _make_client(db: Session, user: User) -> TestClient:
     def _override_get_current_active_user_optional():
         return user
 
-    app.dependency_overrides[get_db] = _override_get_db
+    _override_db(db)
     app.dependency_overrides[get_current_user] = _override_get_current_user
     app.dependency_overrides[get_current_active_user] = _override_get_current_active_user
     app.dependency_overrides[get_current_active_superuser] = _override_get_current_active_superuser
@@ -202,13 +380,10 @@ def other_client(db: Session, other_user: User) -> TestClient:
 @pytest.fixture()
 def anon_client(db: Session) -> TestClient:
     """TestClient with no authenticated user (for optional auth endpoints)."""
-    def _override_get_db():
-        yield db
-
     def _override_no_user():
         return None
 
-    app.dependency_overrides[get_db] = _override_get_db
+    _override_db(db)
     app.dependency_overrides[get_current_active_user_optional] = _override_no_user
 
     c = TestClient(app)
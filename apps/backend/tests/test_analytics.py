@@ -12,24 +12,26 @@ class TestAnalyticsUtils:
         assert normalize_referrer(None) is None
         assert normalize_referrer("not-a-url") is None
 
-    @patch("requests.get")
-    def test_get_country_code_success(self, mock_get):
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"status": "success", "countryCode": "US"}
-        mock_get.return_value = mock_response
-        
+    def test_get_country_code_success(self, geoip_server):
+        geoip_server.respond("GET", "/json/8.8.8.8", json_data={"status": "success", "countryCode": "US"})
+
         assert get_country_code("8.8.8.8") == "US"
-        mock_get.assert_called_with("http://ip-api.com/json/8.8.8.8?fields=status,countryCode", timeout=2)
+        assert geoip_server.requests[0]["path"] == "/json/8.8.8.8?fields=status%2CcountryCode"
+
+    def test_get_country_code_fail(self, geoip_server):
+        geoip_server.respond("GET", "/json/8.8.8.8", status=404)
 
-    @patch("requests.get")
-    def test_get_country_code_fail(self, mock_get):
-        mock_response = MagicMock()
-        mock_response.status_code = 404
-        mock_get.return_value = mock_response
-        
         assert get_country_code("8.8.8.8") is None
 
+    def test_get_country_code_fails_fast_when_provider_down(self, geoip_server, monkeypatch):
+        from app.core.config import settings
+        from app.core.http import geoip_api
+        geoip_server.respond("GET", "/json/8.8.8.8", status=503)
+        for _ in range(settings.CIRCUIT_FAILURE_THRESHOLD + 3):
+            assert get_country_code("8.8.8.8") is None
+        assert geoip_server.calls("GET", "/json/8.8.8.8") == settings.CIRCUIT_FAILURE_THRESHOLD
+        assert geoip_api.stats()["short_circuited"] == 3
+
     def test_get_country_code_local(self):
         assert get_country_code("127.0.0.1") == "Local"
         assert get_country_code("localhost") == "Local"
@@ -57,3 +59,387 @@ class TestAnalyticsUtils:
         request.headers = {}
         request.client.host = "4.4.4.4"
         assert get_client_ip(request) == "4.4.4.4"
+
+
+class TestClickQueue:
+    def _click(self, link_id=1):
+        from datetime import datetime
+        from app.utils.click_queue import RawClick
+        return RawClick(link_id, "8.8.8.8", "Mozilla/5.0", "", datetime.utcnow())
+
+    def _queue(self, **kwargs):
+        from app.utils.click_queue import ClickEventQueue
+        written = []
+        queue = ClickEventQueue(writer=lambda db, batch: written.append(batch),
+                                session_factory=MagicMock, **kwargs)
+        return queue, written
+
+    def test_drop_policy_discards_new_clicks(self):
+        queue, _ = self._queue(maxsize=2, policy="drop")
+        assert queue.put(self._click(1)) and queue.put(self._click(2))
+        assert queue.put(self._click(3)) is False
+        assert [c.link_id for c in queue._items] == [1, 2]
+        assert queue.stats()["dropped"] == 1
+
+    def test_oldest_policy_evicts_head(self):
+        queue, _ = self._queue(maxsize=2, policy="oldest")
+        for i in (1, 2, 3):
+            queue.put(self._click(i))
+        assert [c.link_id for c in queue._items] == [2, 3]
+        assert queue.stats()["dropped"] == 1
+
+    def test_block_policy_times_out(self):
+        queue, _ = self._queue(maxsize=1, policy="block", block_timeout_ms=10)
+        queue.put(self._click(1))
+        assert queue.put(self._click(2)) is False
+        assert queue.stats()["dropped"] == 1
+
+    def test_unknown_policy_rejected(self):
+        with pytest.raises(ValueError):
+            self._queue(policy="lifo")
+
+    def test_drain_writes_in_batches(self):
+        queue, written = self._queue(batch_size=2)
+        for i in range(5):
+            queue.put(self._click(i))
+        assert queue.drain() == 5
+        assert [len(b) for b in written] == [2, 2, 1]
+        stats = queue.stats()
+        assert stats["depth"] == 0 and stats["inserted"] == 5 and stats["batches"] == 3
+
+    def test_workers_flush_on_interval_and_stop_drains(self):
+        import time
+        queue, written = self._queue(batch_size=100, flush_interval_ms=10)
+        queue.start()
+        queue.put(self._click(1))
+        for _ in range(100):
+            if written:
+                break
+            time.sleep(0.01)
+        queue.put(self._click(2))
+        queue.stop()
+        assert sum(len(b) for b in written) == 2
+
+    def test_failed_batch_is_counted(self):
+        from app.utils.click_queue import ClickEventQueue
+        def broken(db, batch):
+            raise RuntimeError("database is locked")
+        queue = ClickEventQueue(writer=broken, session_factory=MagicMock)
+        queue.put(self._click())
+        queue.drain()
+        assert queue.stats()["errors"] == 1 and queue.stats()["dropped"] == 1
+
+    @patch("app.utils.enrichment.get_country_code")
+    def test_write_click_batch_single_executemany(self, mock_geo, db, test_user):
+        from sqlalchemy import event
+        from app.models.analytics import ClickEvent
+        from app.utils.analytics import write_click_batch
+        from tests.conftest import create_test_link
+        link = create_test_link(db, owner_id=test_user.id, short_code="batched")
+
+        inserts = []
+        def _capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("INSERT INTO click_events"):
+                inserts.append(executemany)
+        bind = db.connection()
+        event.listen(bind, "before_cursor_execute", _capture)
+        try:
+            write_click_batch(db, [self._click(link.id) for _ in range(3)])
+        finally:
+            event.remove(bind, "before_cursor_execute", _capture)
+
+        assert inserts == [True]
+        # Stored raw: nothing is resolved on the ingest path
+        events = db.query(ClickEvent).filter(ClickEvent.link_id == link.id).all()
+        assert len(events) == 3 and not any(e.enriched for e in events)
+        mock_geo.assert_not_called()
+
+
+class TestClickSpool:
+    def _click(self, link_id=1, ip="8.8.8.8"):
+        from datetime import datetime
+        from app.utils.click_queue import RawClick
+        return RawClick(link_id, ip, "Mozilla/5.0 (Ünïcode)", "https://ref.example/x", datetime(2026, 1, 2, 3, 4, 5, 678000))
+
+    def _spool(self, tmp_path, writer=None, **kwargs):
+        from app.utils.click_spool import ClickSpool
+        written = []
+        spool = ClickSpool(str(tmp_path), writer=writer or (lambda db, batch: written.extend(batch)),
+                           session_factory=MagicMock, **kwargs)
+        return spool, written
+
+    def test_record_roundtrip(self):
+        from app.utils.click_spool import decode_click, encode_click
+        for click in (self._click(), self._click(ip=None)):
+            assert decode_click(encode_click(click)[8:]) == click
+
+    def test_unknown_fsync_policy_rejected(self, tmp_path):
+        with pytest.raises(ValueError):
+            self._spool(tmp_path, fsync="sometimes")
+
+    def test_drain_loads_and_deletes_segments(self, tmp_path):
+        spool, written = self._spool(tmp_path, segment_max_bytes=150, batch_size=2)
+        for i in range(5):
+            spool.append(self._click(i))
+        # Rotated by size while appending; drain() seals the full segments and the current one
+        assert len(list(tmp_path.glob("*.open"))) >= 2
+        assert spool.drain() == 5
+        assert [c.link_id for c in written] == [0, 1, 2, 3, 4]
+        assert list(tmp_path.iterdir()) == []
+        assert spool.stats()["inserted"] == 5
+
+    def test_append_leaves_disk_waits_to_drainer(self, tmp_path, monkeypatch):
+        import os
+        import threading
+        from app.utils import click_spool
+        spool, written = self._spool(tmp_path, segment_max_bytes=150)
+        spool.append(self._click(0))
+
+        # An "interval" fsync in flight on the drainer thread...
+        syncing, release, calls = threading.Event(), threading.Event(), []
+        def slow_fsync(fd):
+            calls.append(fd)
+            syncing.set()
+            release.wait(5)
+        monkeypatch.setattr(click_spool.os, "fsync", slow_fsync)
+        drainer = threading.Thread(target=spool.sync)
+        drainer.start()
+        assert syncing.wait(5)
+        # ... holds up neither appends nor their size rotation, which doesn't fsync or rename
+        renames = []
+        monkeypatch.setattr(click_spool.os, "rename", lambda *args: renames.append(args))
+        for i in range(1, 5):
+            spool.append(self._click(i))
+        assert len(calls) == 1 and renames == []
+        release.set()
+        drainer.join()
+
+        monkeypatch.setattr(click_spool.os, "rename", os.rename)
+        assert spool.drain() == 5
+        assert len(calls) > 1  # the full segments were synced when sealed
+
+    def test_crashed_writer_replayed(self, tmp_path):
+        import os
+        crashed, _ = self._spool(tmp_path, fsync="never")
+        crashed.append(self._click(1))
+        crashed.append(self._click(2))
+        os.close(crashed._fd)  # the process died: its lock is gone, the segment was never sealed
+
+        spool, written = self._spool(tmp_path)
+        spool.start()
+        spool.stop()
+        assert [c.link_id for c in written] == [1, 2]
+        assert spool.stats()["replayed"] == 2
+
+    def test_live_writers_segment_left_alone(self, tmp_path):
+        writer, _ = self._spool(tmp_path)
+        writer.append(self._click(1))
+        other, written = self._spool(tmp_path)
+        assert other.drain() == 0 and written == []
+        writer.close()
+        assert other.drain() == 1
+
+    def test_torn_tail_keeps_complete_records(self, tmp_path):
+        spool, written = self._spool(tmp_path)
+        spool.append(self._click(1))
+        spool.append(self._click(2))
+        spool.close()
+        segment = next(tmp_path.glob("*.seg"))
+        segment.write_bytes(segment.read_bytes()[:-5])
+        assert spool.drain() == 1
+        assert spool.stats()["corrupt_segments"] == 1
+
+    def test_failed_batch_resumes_from_offset(self, tmp_path):
+        written, calls = [], []
+
+        def flaky(db, batch):
+            calls.append(len(batch))
+            if len(calls) == 2:
+                raise RuntimeError("database is locked")
+            written.extend(batch)
+
+        spool, _ = self._spool(tmp_path, writer=flaky, batch_size=2)
+        for i in range(5):
+            spool.append(self._click(i))
+        with pytest.raises(RuntimeError):
+            spool.drain()
+        assert len(list(tmp_path.glob("*.seg"))) == 1
+        spool.drain()
+        # The committed first batch is not loaded twice
+        assert [c.link_id for c in written] == [0, 1, 2, 3, 4]
+
+    @patch("app.utils.enrichment.get_country_code", return_value="US")
+    def test_redirect_spooled_then_loaded(self, mock_geo, client, db, test_user, tmp_path, monkeypatch):
+        from app.core.config import settings
+        from app.models.analytics import ClickEvent
+        from app.utils import analytics
+        from app.utils.click_spool import ClickSpool
+        from tests.conftest import create_test_link
+        spool = ClickSpool(str(tmp_path), writer=analytics.write_click_batch)
+        monkeypatch.setattr(analytics, "click_spool", spool)
+        monkeypatch.setattr(settings, "CLICK_INGEST", "spool")
+        link = create_test_link(db, owner_id=test_user.id, short_code="spooled")
+        client.get("/spooled", headers={"User-Agent": "Mozilla/5.0"}, follow_redirects=False)
+        assert len(analytics.click_queue) == 0
+        assert spool.stats()["appended"] == 1
+        spool.drain(db)
+        from app.utils.enrichment import click_enricher
+        click_enricher.run_pending(db)
+        event = db.query(ClickEvent).filter(ClickEvent.link_id == link.id).one()
+        assert event.country_code == "US"
+
+
+class TestClickEnrichment:
+    def _write(self, db, link_id, ips):
+        from datetime import datetime
+        from app.utils.analytics import write_click_batch
+        from app.utils.click_queue import RawClick
+        write_click_batch(db, [
+            RawClick(link_id, ip, "Mozilla/5.0 (Windows NT 10.0; Win64; x64)", "https://www.google.com/", datetime.utcnow())
+            for ip in ips
+        ])
+
+    def _dimension(self, db, link_id, dimension):
+        from app.models.analytics import LinkDimensionClicks
+        rows = db.query(LinkDimensionClicks).filter_by(link_id=link_id, dimension=dimension).all()
+        return {row.value: row.clicks for row in rows}
+
+    @patch("app.utils.enrichment.get_country_code", side_effect={"8.8.8.8": "US", "1.1.1.1": "AU"}.get)
+    def test_batch_resolves_each_distinct_value_once(self, mock_geo, db, test_user):
+        from app.models.analytics import ClickEvent
+        from app.utils.enrichment import ClickEnricher
+        from tests.conftest import create_test_link
+        link = create_test_link(db, owner_id=test_user.id, short_code="enrich")
+        self._write(db, link.id, ["8.8.8.8"] * 5 + ["1.1.1.1"] * 3)
+
+        enricher = ClickEnricher(batch_size=100)
+        assert enricher.run_pending(db) == 8
+        assert mock_geo.call_count == 2
+        assert self._dimension(db, link.id, "country") == {"US": 5, "AU": 3}
+        assert self._dimension(db, link.id, "referrer") == {"google.com": 8}
+        assert db.query(ClickEvent).filter(ClickEvent.enriched == False).count() == 0
+        assert enricher.run_pending(db) == 0
+
+    @patch("app.utils.enrichment.get_country_code", return_value="US")
+    def test_rows_claimed_elsewhere_not_counted_twice(self, mock_geo, db, test_user, monkeypatch):
+        from app.models.analytics import ClickEvent
+        from app.utils import enrichment
+        from tests.conftest import create_test_link
+        link = create_test_link(db, owner_id=test_user.id, short_code="racing")
+        self._write(db, link.id, ["8.8.8.8"] * 4)
+
+        # Another worker claims the first two rows between our read and our UPDATE
+        real_enrich_rows = enrichment.enrich_rows
+        def racing(rows):
+            if not racing.raced:
+                racing.raced = True
+                assert enrichment.ClickEnricher(batch_size=2).enrich_batch(db) == 2
+            return real_enrich_rows(rows)
+        racing.raced = False
+        monkeypatch.setattr(enrichment, "enrich_rows", racing)
+
+        enricher = enrichment.ClickEnricher(batch_size=100)
+        assert enricher.enrich_batch(db) == 2
+        assert enricher.stats()["lost_claims"] == 2
+        assert self._dimension(db, link.id, "country") == {"US": 4}
+        assert db.query(ClickEvent).filter(ClickEvent.link_id == link.id, ClickEvent.enriched == True).count() == 4
+
+    @patch("app.utils.enrichment.get_country_code", return_value="US")
+    def test_rebuild_rollups_skips_pending_rows(self, mock_geo, db, test_user):
+        from app.utils.enrichment import click_enricher
+        from app.utils.rollups import rebuild_rollups
+        from tests.conftest import create_test_link
+        link = create_test_link(db, owner_id=test_user.id, short_code="halfway")
+        self._write(db, link.id, ["8.8.8.8"] * 2)
+        click_enricher.run_pending(db)
+        self._write(db, link.id, ["8.8.8.8"])
+
+        rebuild_rollups(db, [link.id])
+        db.commit()
+        # The pending click is in the daily total but left for the enricher to count
+        assert self._dimension(db, link.id, "country") == {"US": 2}
+        assert click_enricher.run_pending(db) == 1
+        assert self._dimension(db, link.id, "country") == {"US": 3}
+
+
+class TestGeoIP:
+    def _import(self, tmp_path, lines, fmt="range"):
+        from app.cli.geoip import main
+        source = tmp_path / "source.csv"
+        source.write_text("\n".join(lines) + "\n")
+        output = tmp_path / "geoip-ranges.csv"
+        assert main(["import", str(source), "--format", fmt, "--output", str(output)]) == 0
+        return output
+
+    def test_range_import_and_lookup(self, tmp_path):
+        from app.utils.geoip import RangeDatabaseResolver
+        db_path = self._import(tmp_path, [
+            "ip_start,ip_end,country",
+            "1.0.0.0,1.0.0.255,AU",
+            "8.8.8.0,8.8.8.255,US",
+            "16777472,16778239,CN",  # 1.0.1.0 - 1.0.3.255 as integers
+            "9.9.9.0,9.9.9.255,-",   # unknown country is skipped
+            "2001:4860::,2001:4860:ffff:ffff:ffff:ffff:ffff:ffff,US",
+        ])
+        resolver = RangeDatabaseResolver.from_file(str(db_path))
+        assert resolver.lookup("1.0.0.0") == "AU"
+        assert resolver.lookup("1.0.0.255") == "AU"
+        assert resolver.lookup("1.0.2.7") == "CN"
+        assert resolver.lookup("8.8.8.8") == "US"
+        assert resolver.lookup("8.8.9.0") is None
+        assert resolver.lookup("9.9.9.9") is None
+        assert resolver.lookup("2001:4860::8888") == "US"
+        assert resolver.lookup("2a00::1") is None
+        assert resolver.lookup("not-an-ip") is None
+        assert resolver.stats()["ipv6_ranges"] == 1
+
+    def test_cidr_import_merges_adjacent_ranges(self, tmp_path):
+        from app.utils.geoip import read_ranges
+        db_path = self._import(tmp_path, [
+            "203.0.113.0/25,NZ",
+            "203.0.113.128/25,NZ",
+            "198.51.100.0/24,CA",
+        ], fmt="cidr")
+        ranges = list(read_ranges(str(db_path)))
+        assert len(ranges) == 2
+        assert ranges[1][3] == "NZ"
+
+    def test_get_country_code_uses_local_database(self, tmp_path, monkeypatch, geoip_server):
+        from app.core.config import settings
+        from app.utils import geoip
+        db_path = self._import(tmp_path, ["8.8.8.0,8.8.8.255,US"])
+        monkeypatch.setattr(settings, "GEOIP_PROVIDER", "local")
+        monkeypatch.setattr(settings, "GEOIP_DB_PATH", str(db_path))
+        geoip.reset_resolver()
+        assert get_country_code("8.8.8.8") == "US"
+        assert geoip_server.requests == []
+
+    def test_local_provider_without_database(self, tmp_path, monkeypatch):
+        from app.core.config import settings
+        from app.utils import geoip
+        monkeypatch.setattr(settings, "GEOIP_PROVIDER", "local")
+        monkeypatch.setattr(settings, "GEOIP_DB_PATH", str(tmp_path / "missing.csv"))
+        geoip.reset_resolver()
+        assert get_country_code("8.8.8.8") is None
+
+
+class TestUserAgentParsing:
+    IPHONE = ("Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 "
+              "(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1")
+
+    def test_parse_returns_compact_tuple(self):
+        from app.utils.analytics import parse_user_agent
+        info = parse_user_agent(self.IPHONE)
+        assert info == ("mobile", "iOS", "Mobile Safari", False)
+        assert parse_user_agent("Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)").is_bot
+
+    def test_parse_is_memoized(self):
+        from app.utils.analytics import parse_user_agent, user_agent_cache
+        user_agent_cache.clear()
+        user_agent_cache.reset_stats()
+        with patch("app.utils.analytics.user_agents.parse", wraps=__import__("user_agents").parse) as mock_parse:
+            for _ in range(3):
+                parse_user_agent(self.IPHONE)
+            assert mock_parse.call_count == 1
+        stats = user_agent_cache.stats()
+        assert stats["hits"] == 2 and stats["misses"] == 1
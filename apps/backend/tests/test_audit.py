@@ -155,6 +155,66 @@ class TestAuditIsolation:
         app.dependency_overrides.clear()
 
 
+class TestAuditPagination:
+    def test_cursor_pages_match_offset_pages(self, db, test_user, test_superuser):
+        """Admins page through everyone's entries by cursor, newest first."""
+        from app.crud.audit import create_audit_entry
+        from tests.conftest import _make_client
+        from main import app
+
+        for i in range(5):
+            create_audit_entry(db, user_id=test_user.id, action="create", target_type="link", target_id=i)
+        admin = _make_client(db, test_superuser)
+
+        seen, cursor = [], None
+        while True:
+            resp = admin.get("/api/audit/", params={"limit": 2, **({"cursor": cursor} if cursor else {})})
+            assert resp.status_code == 200
+            seen += [entry["id"] for entry in resp.json()]
+            cursor = resp.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+        offset_pages = [admin.get("/api/audit/", params={"limit": 2, "skip": skip}).json() for skip in (0, 2, 4)]
+        assert seen == [entry["id"] for page in offset_pages for entry in page]
+        assert len(seen) == 5
+
+        assert admin.get("/api/audit/", params={"cursor": "e30"}).status_code == 400  # {}
+        app.dependency_overrides.clear()
+
+    def test_cursor_pages_through_whole_second_timestamps(self, db, test_user, test_superuser):
+        """Entries stamped on a whole second (a zero fraction) are not skipped."""
+        from datetime import datetime
+        from app.models.audit import AuditLog
+        from tests.conftest import _make_client
+        from main import app
+
+        entries = [AuditLog(user_id=test_user.id, action="create", target_type="link", target_id=i,
+                            timestamp=datetime(2026, 1, 1, 12)) for i in range(4)]
+        db.add_all(entries)
+        db.commit()
+        admin = _make_client(db, test_superuser)
+
+        seen, cursor = [], None
+        while True:
+            resp = admin.get("/api/audit/", params={"limit": 2, **({"cursor": cursor} if cursor else {})})
+            assert resp.status_code == 200
+            seen += [entry["id"] for entry in resp.json()]
+            cursor = resp.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+        assert seen == sorted((entry.id for entry in entries), reverse=True)
+        app.dependency_overrides.clear()
+
+    def test_default_timestamp_is_stored_like_bound_ones(self, db, test_user):
+        """The server default writes the same text form SQLAlchemy binds, fraction included."""
+        from sqlalchemy import text
+        from app.crud.audit import create_audit_entry
+
+        entry = create_audit_entry(db, user_id=test_user.id, action="create", target_type="link", target_id=1)
+        stored = db.execute(text("SELECT timestamp FROM audit_logs WHERE id = :id"), {"id": entry.id}).scalar()
+        assert len(stored) == len("2026-01-01 12:00:00.000000")
+
+
 class TestAuditDetailSummary:
     def test_audit_detail_summary(self, client, db, test_user):
         """Audit entries should contain a human-readable summary field."""
@@ -0,0 +1,211 @@
+"""Tests for self-issued session tokens and the auth endpoints (/api/auth/)."""
+
+import json
+
+import pytest
+from urllib.parse import urlparse, parse_qs
+from fastapi import HTTPException
+
+from app.api.deps import get_current_user
+from app.core import security
+from app.crud import refresh_token as crud_refresh_token
+
+
+class TestSessionTokens:
+    def test_access_token_roundtrip(self):
+        token = security.create_access_token("keyn-42")
+        assert security.is_nololink_token(token)
+        claims = security.decode_token(token, security.ACCESS)
+        assert claims["sub"] == "keyn-42"
+
+    def test_tampered_token_rejected(self):
+        header, payload, signature = security.create_access_token("keyn-42").split(".")
+        forged = security._encode({"iss": "nololink", "sub": "keyn-admin", "typ": "access", "exp": 9999999999})
+        with pytest.raises(security.TokenError):
+            security.decode_token(f"{header}.{forged.split('.')[1]}.{signature}")
+
+    def test_expired_token_rejected(self):
+        token = security.create_token("keyn-42", security.ACCESS, expires_in=-1)
+        with pytest.raises(security.TokenError, match="expired"):
+            security.decode_token(token)
+
+    def test_refresh_token_is_not_an_access_token(self):
+        token = security.create_refresh_token("keyn-42", "some-jti")
+        with pytest.raises(security.TokenError):
+            security.decode_token(token, security.ACCESS)
+
+    def test_signing_key_required_outside_debug(self):
+        with pytest.raises(RuntimeError, match="SECRET_KEY"):
+            security._signing_key(None, debug=False)
+        assert len(security._signing_key(None, debug=True)) == 32
+        assert security._signing_key("fixed", debug=False) == b"fixed"
+
+    def test_keyn_tokens_are_not_mistaken_for_ours(self):
+        assert not security.is_nololink_token("opaque-keyn-token")
+        assert not security.is_nololink_token("a.b.c")
+
+
+class TestGetCurrentUser:
+    def test_local_token_validated_without_keyn(self, keyn_server, db, test_user):
+        token = security.create_access_token(test_user.keyn_id)
+        assert get_current_user(db=db, token=token).id == test_user.id
+        assert keyn_server.requests == []
+
+    def test_invalid_local_token_401(self, db, test_user):
+        token = security.create_token(test_user.keyn_id, security.ACCESS, expires_in=-1)
+        with pytest.raises(HTTPException) as exc:
+            get_current_user(db=db, token=token)
+        assert exc.value.status_code == 401
+
+    def test_legacy_keyn_token_still_accepted(self, keyn_server, db, test_user):
+        keyn_server.respond("GET", "/api/user-scoped", json_data={"id": test_user.keyn_id})
+        assert get_current_user(db=db, token="opaque-keyn-token").id == test_user.id
+        assert keyn_server.calls("GET", "/api/user-scoped") == 1
+        assert keyn_server.requests[0]["headers"]["Authorization"] == "Bearer opaque-keyn-token"
+
+
+class TestAuthEndpoints:
+    def test_callback_issues_session_tokens(self, keyn_server, anon_client, db):
+        keyn_server.respond("POST", "/oauth/token", json_data={"access_token": "keyn-access"})
+        keyn_server.respond("GET", "/api/user-scoped", json_data={
+            "id": 777, "email": "new@example.com", "username": "newbie",
+        })
+        resp = anon_client.get("/api/auth/callback?code=abc&state=xyz", follow_redirects=False)
+        assert resp.status_code == 307
+        params = parse_qs(urlparse(resp.headers["location"]).query)
+        assert security.decode_token(params["token"][0])["sub"] == "777"
+        refresh_token = params["refresh_token"][0]
+        # The KeyN token stays server-side: the JWT only names the row holding it
+        assert "keyn-access" not in json.dumps(security.decode_token(refresh_token, security.REFRESH))
+        stored = crud_refresh_token.get_refresh_token(db, security.decode_token(refresh_token, security.REFRESH))
+        assert stored.keyn_token == "keyn-access"
+
+    def test_callback_token_exchange_not_retried(self, keyn_server, anon_client, db):
+        keyn_server.respond("POST", "/oauth/token", status=503)
+        resp = anon_client.get("/api/auth/callback?code=abc&state=xyz", follow_redirects=False)
+        assert resp.status_code == 400
+        assert keyn_server.calls("POST", "/oauth/token") == 1
+
+    def test_refresh_issues_new_access_token(self, keyn_server, anon_client, db, test_user):
+        keyn_server.respond("GET", "/api/user-scoped", json_data={"id": test_user.keyn_id})
+        refresh_token = crud_refresh_token.issue_refresh_token(db, test_user.keyn_id, "keyn-access")
+        resp = anon_client.post("/api/auth/refresh", json={"refresh_token": refresh_token})
+        assert resp.status_code == 200
+        data = resp.json()
+        assert security.decode_token(data["access_token"])["sub"] == test_user.keyn_id
+        assert data["expires_in"] > 0
+        assert keyn_server.requests[-1]["headers"]["Authorization"] == "Bearer keyn-access"
+
+    def test_refresh_rotates_refresh_token(self, keyn_server, anon_client, db, test_user):
+        keyn_server.respond("GET", "/api/user-scoped", json_data={"id": test_user.keyn_id})
+        first = crud_refresh_token.issue_refresh_token(db, test_user.keyn_id, "keyn-access")
+        second = anon_client.post("/api/auth/refresh", json={"refresh_token": first}).json()["refresh_token"]
+        assert second != first
+        assert anon_client.post("/api/auth/refresh", json={"refresh_token": first}).status_code == 401
+        assert anon_client.post("/api/auth/refresh", json={"refresh_token": second}).status_code == 200
+
+    def test_logout_revokes_refresh_token(self, keyn_server, anon_client, db, test_user):
+        keyn_server.respond("GET", "/api/user-scoped", json_data={"id": test_user.keyn_id})
+        refresh_token = crud_refresh_token.issue_refresh_token(db, test_user.keyn_id, "keyn-access")
+        for _ in range(2):
+            assert anon_client.post("/api/auth/logout", json={"refresh_token": refresh_token}).status_code == 204
+        assert anon_client.post("/api/auth/refresh", json={"refresh_token": refresh_token}).status_code == 401
+        assert keyn_server.calls("GET", "/api/user-scoped") == 0
+
+    def test_refresh_rejects_unknown_jti(self, anon_client, db, test_user):
+        """A correctly signed token whose row never existed (or was pruned) is refused."""
+        refresh_token = security.create_refresh_token(test_user.keyn_id, "no-such-jti")
+        assert anon_client.post("/api/auth/refresh", json={"refresh_token": refresh_token}).status_code == 401
+
+    def test_refresh_rejected_when_keyn_session_revoked(self, keyn_server, anon_client, db, test_user):
+        keyn_server.respond("GET", "/api/user-scoped", status=401)
+        refresh_token = crud_refresh_token.issue_refresh_token(db, test_user.keyn_id, "revoked")
+        resp = anon_client.post("/api/auth/refresh", json={"refresh_token": refresh_token})
+        assert resp.status_code == 401
+
+    def test_refresh_rejects_access_token(self, anon_client, db, test_user):
+        resp = anon_client.post("/api/auth/refresh", json={
+            "refresh_token": security.create_access_token(test_user.keyn_id),
+        })
+        assert resp.status_code == 401
+
+
+class TestKeyNIntrospectionCache:
+    def test_keyn_result_cached_per_token(self, keyn_server, db, test_user):
+        keyn_server.respond("GET", "/api/user-scoped", json_data={"id": test_user.keyn_id})
+        for _ in range(3):
+            get_current_user(db=db, token="opaque-keyn-token")
+        assert keyn_server.calls("GET", "/api/user-scoped") == 1
+
+    def test_rejected_token_negatively_cached(self, keyn_server, db):
+        keyn_server.respond("GET", "/api/user-scoped", status=401)
+        for _ in range(2):
+            with pytest.raises(HTTPException) as exc:
+                get_current_user(db=db, token="revoked-keyn-token")
+            assert exc.value.status_code == 401
+        assert keyn_server.calls("GET", "/api/user-scoped") == 1
+
+    def test_upstream_errors_not_cached(self, keyn_server, db, monkeypatch):
+        from app.core.http import keyn
+        monkeypatch.setattr(keyn, "retries", 0)
+        keyn_server.respond("GET", "/api/user-scoped", status=502)
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                get_current_user(db=db, token="some-keyn-token")
+        assert keyn_server.calls("GET", "/api/user-scoped") == 2
+
+    def test_only_keyn_rejections_negatively_cached(self, db, monkeypatch):
+        """An error that merely reads like a rejection is not remembered as one."""
+        from app.api import deps
+        calls = []
+
+        def lookalike(token):
+            calls.append(token)
+            raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+        monkeypatch.setattr(deps, "_introspect_keyn_token", lookalike)
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                get_current_user(db=db, token="some-keyn-token")
+        assert len(calls) == 2
+
+    def test_concurrent_requests_share_one_call(self, keyn_server):
+        import threading
+        from app.api.deps import fetch_keyn_user_info
+
+        keyn_server.respond("GET", "/api/user-scoped", json_data={"id": 5}, delay=0.1)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(fetch_keyn_user_info("burst-token")))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert keyn_server.calls("GET", "/api/user-scoped") == 1
+        assert results == [{"id": 5}] * 5
+
+
+class TestUserCache:
+    def test_cached_user_resolves_without_sql(self, db, test_user):
+        from sqlalchemy import event
+        token = security.create_access_token(test_user.keyn_id)
+        get_current_user(db=db, token=token)
+
+        statements = []
+        bind = db.connection()
+        listener = lambda *args: statements.append(args[2])
+        event.listen(bind, "before_cursor_execute", listener)
+        try:
+            user = get_current_user(db=db, token=token)
+        finally:
+            event.remove(bind, "before_cursor_execute", listener)
+        assert user.id == test_user.id and user.email == test_user.email
+        assert statements == []
+
+    def test_approval_change_invalidates_cached_user(self, db, unapproved_user):
+        from app.crud import user as crud_user
+        token = security.create_access_token(unapproved_user.keyn_id)
+        assert get_current_user(db=db, token=token).is_approved is False
+
+        crud_user.set_approval_status(db, db_user=unapproved_user, is_approved=True, request_status="approved")
+        assert get_current_user(db=db, token=token).is_approved is True
@@ -27,6 +27,15 @@ class TestReadCampaigns:
         assert "Camp A" in names
         assert "Camp B" in names
 
+    def test_read_campaigns_by_cursor(self, client, db, test_user):
+        for name in ("Page 1", "Page 2", "Page 3"):
+            create_test_campaign(db, owner_id=test_user.id, name=name)
+        first = client.get("/api/campaigns/", params={"limit": 2})
+        assert [c["name"] for c in first.json()] == ["Page 1", "Page 2"]
+        second = client.get("/api/campaigns/", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+        assert [c["name"] for c in second.json()] == ["Page 3"]
+        assert "X-Next-Cursor" not in second.headers
+
     def test_read_single_campaign(self, client, db, test_user):
         camp = create_test_campaign(db, owner_id=test_user.id, name="Single Camp")
         resp = client.get(f"/api/campaigns/{camp.id}")
@@ -0,0 +1,92 @@
+"""Tests for the shared outbound HTTP layer (app/core/http.py) against a local stand-in server."""
+
+import time
+
+import pytest
+import requests
+
+from app.core.http import CircuitBreaker, Upstream, UpstreamUnavailable
+
+
+@pytest.fixture()
+def upstream(stub_server):
+    return Upstream("stub", stub_server.url, timeout=1.0, retries=2, backoff=0,
+                    failure_threshold=3, reset_timeout=0.2)
+
+
+class TestUpstream:
+    def test_connections_are_reused(self, stub_server, upstream):
+        stub_server.respond("GET", "/ping", json_data={"ok": True})
+        for _ in range(5):
+            assert upstream.get("/ping").json() == {"ok": True}
+        assert stub_server.calls("GET", "/ping") == 5
+        assert stub_server.connections == 1
+
+    def test_timeout_enforced(self, stub_server, upstream):
+        stub_server.respond("GET", "/slow", delay=0.5)
+        started = time.monotonic()
+        with pytest.raises(requests.Timeout):
+            upstream.get("/slow", timeout=0.1, retries=0)
+        assert time.monotonic() - started < 0.4
+
+    def test_idempotent_request_retried_on_5xx(self, stub_server, upstream):
+        stub_server.respond("GET", "/flaky", status=503)
+        stub_server.respond("GET", "/flaky", json_data={"ok": True})
+        assert upstream.get("/flaky").status_code == 200
+        assert stub_server.calls("GET", "/flaky") == 2
+        assert upstream.stats()["retried"] == 1
+
+    def test_post_not_retried(self, stub_server, upstream):
+        stub_server.respond("POST", "/token", status=503)
+        assert upstream.post("/token", data={"a": 1}).status_code == 503
+        assert stub_server.calls("POST", "/token") == 1
+
+    def test_client_errors_do_not_trip_breaker(self, stub_server, upstream):
+        stub_server.respond("GET", "/missing", status=404)
+        for _ in range(5):
+            assert upstream.get("/missing").status_code == 404
+        assert upstream.breaker.state == CircuitBreaker.CLOSED
+        assert upstream.stats()["errors"] == 0
+
+    def test_circuit_opens_and_fails_fast(self, stub_server, upstream):
+        stub_server.respond("GET", "/down", status=500)
+        assert upstream.get("/down").status_code == 500 # 3 attempts, reaching the threshold
+        with pytest.raises(UpstreamUnavailable):
+            upstream.get("/down")
+        assert stub_server.calls("GET", "/down") == 3
+        stats = upstream.stats()
+        assert stats["circuit"] == "open"
+        assert stats["short_circuited"] == 1
+
+    def test_half_open_trial_closes_circuit(self, stub_server, upstream):
+        stub_server.respond("GET", "/recover", status=500)
+        stub_server.respond("GET", "/recover", status=500)
+        stub_server.respond("GET", "/recover", status=500)
+        stub_server.respond("GET", "/recover", json_data={"ok": True})
+        upstream.get("/recover")
+        assert upstream.breaker.state == CircuitBreaker.OPEN
+        time.sleep(0.25)
+        assert upstream.get("/recover").status_code == 200
+        assert upstream.breaker.state == CircuitBreaker.CLOSED
+
+    def test_unreachable_upstream_counts_as_failure(self):
+        upstream = Upstream("dead", "http://127.0.0.1:9", timeout=0.5, retries=0, failure_threshold=1)
+        with pytest.raises(requests.ConnectionError):
+            upstream.get("/")
+        with pytest.raises(UpstreamUnavailable):
+            upstream.get("/")
+        assert upstream.stats()["errors"] == 1
+
+    def test_latency_metrics(self, stub_server, upstream):
+        stub_server.respond("GET", "/ping", delay=0.05)
+        upstream.get("/ping")
+        latency = upstream.stats()["latency_ms"]
+        assert latency["max"] >= 50
+        assert latency["p50"] <= latency["p95"] <= latency["max"]
+
+
+class TestMetricsEndpoint:
+    def test_upstreams_reported(self, admin_client):
+        data = admin_client.get("/api/metrics/").json()
+        assert set(data["upstreams"]) >= {"keyn", "geoip"}
+        assert data["upstreams"]["keyn"]["circuit"] == "closed"
@@ -0,0 +1,140 @@
+"""Tests for cross-worker cache invalidation (app/utils/invalidation.py)."""
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app.models.link_change import LinkChange
+from app.utils.invalidation import DatabaseTransport, InvalidationBus, LocalTransport, invalidation_bus
+from tests.conftest import create_test_link
+
+
+@pytest.fixture()
+def other_worker():
+    """A second bus on the same local transport as the app's, standing in for another worker."""
+    other = InvalidationBus(invalidation_bus.transport, origin="other-worker")
+    invalidation_bus.start()
+    other.start()
+    yield other
+    invalidation_bus.stop()
+
+
+def _db_transport(db, **kwargs):
+    return DatabaseTransport(session_factory=lambda: Session(bind=db.connection()), **kwargs)
+
+
+class TestLocalTransport:
+    def test_published_keys_reach_other_subscribers_only(self):
+        transport = LocalTransport()
+        a, b = InvalidationBus(transport, origin="a"), InvalidationBus(transport, origin="b")
+        seen = {"a": [], "b": []}
+        a.subscribe("link", lambda *keys: seen["a"].extend(keys))
+        b.subscribe("link", lambda *keys: seen["b"].extend(keys))
+        a.start()
+        b.start()
+        a.publish("link", "x1", "x2", None)
+        assert seen == {"a": [], "b": ["x1", "x2"]}
+        assert a.stats()["published"] == 2 and b.stats()["received"] == 2
+
+    def test_link_edit_elsewhere_drops_cached_redirect(self, client, db, test_user, other_worker):
+        from app.utils.link_cache import redirect_cache
+        link = create_test_link(db, owner_id=test_user.id, short_code="shared",
+                                original_url="https://before.example")
+        client.get("/shared", follow_redirects=False)
+        assert "shared" in redirect_cache
+
+        # Another worker edits the row and publishes the change
+        link.original_url = link.redirect_url = "https://after.example"
+        db.commit()
+        other_worker.publish("link", "shared")
+        assert "shared" not in redirect_cache
+        assert client.get("/shared", follow_redirects=False).headers["location"] == "https://after.example"
+
+    def test_user_change_elsewhere_drops_cached_user(self, db, unapproved_user, other_worker):
+        from app.crud.user import get_cached_user_by_keyn_id, user_cache
+        get_cached_user_by_keyn_id(db, unapproved_user.keyn_id)
+        assert unapproved_user.keyn_id in user_cache
+        other_worker.publish("user", unapproved_user.keyn_id)
+        assert unapproved_user.keyn_id not in user_cache
+
+    def test_local_writes_are_published(self, client, other_worker):
+        received = []
+        other_worker.subscribe("link", lambda *keys: received.extend(keys))
+        client.post("/api/links/", json={"original_url": "https://pub.example", "short_code": "pub"})
+        assert received == ["pub"]
+
+
+class TestDatabaseTransport:
+    def test_changes_polled_past_cursor(self, db):
+        received = []
+        reader = InvalidationBus(_db_transport(db, poll_interval=3600), origin="reader")
+        writer = InvalidationBus(_db_transport(db), origin="writer")
+        reader.subscribe("link", lambda *keys: received.extend(keys))
+        reader.start()
+        try:
+            writer.publish("link", "old")  # before the reader's next poll, after its cursor
+            reader.publish("link", "mine")  # own changes are skipped
+            assert reader.transport.poll() == 2
+            assert received == ["old"]
+            assert reader.transport.poll() == 0
+        finally:
+            reader.stop()
+
+    def test_change_committed_below_cursor_still_delivered(self, db):
+        received = []
+        reader = InvalidationBus(_db_transport(db, poll_interval=3600), origin="reader")
+        reader.subscribe("link", lambda *keys: received.extend(keys))
+        reader.start()
+        try:
+            # Ids base+1 and base+2 were handed out together; base+2 commits first
+            base = reader.transport.cursor
+            db.add(LinkChange(id=base + 2, kind="link", key="early", origin="writer"))
+            db.commit()
+            assert reader.transport.poll() == 1
+            db.add(LinkChange(id=base + 1, kind="link", key="late", origin="writer"))
+            db.commit()
+            assert reader.transport.poll() == 1
+            assert reader.transport.poll() == 0
+            assert received == ["early", "late"]
+            assert reader.stats()["late"] == 1
+        finally:
+            reader.stop()
+
+    def test_background_poll_bounds_staleness(self, db):
+        received = []
+        reader = InvalidationBus(_db_transport(db, poll_interval=0.05), origin="reader")
+        reader.subscribe("link", lambda *keys: received.extend(keys))
+        reader.start()
+        try:
+            InvalidationBus(_db_transport(db), origin="writer").publish("link", "soon")
+            deadline = time.monotonic() + 2
+            while not received and time.monotonic() < deadline:
+                time.sleep(0.02)
+        finally:
+            reader.stop()
+        assert received == ["soon"]
+
+    def test_prune_drops_old_rows(self, db):
+        db.add(LinkChange(kind="link", key="ancient", origin="x", created_at=datetime.utcnow() - timedelta(days=30)))
+        db.add(LinkChange(kind="link", key="recent", origin="x"))
+        db.commit()
+        _db_transport(db, retention=timedelta(days=7)).prune(db)
+        assert [c.key for c in db.query(LinkChange).all()] == ["recent"]
+
+    def test_ids_not_reused_after_pruning_everything(self, db):
+        received = []
+        db.add(LinkChange(kind="link", key="ancient", origin="x", created_at=datetime.utcnow() - timedelta(days=30)))
+        db.commit()
+        reader = InvalidationBus(_db_transport(db, poll_interval=3600, retention=timedelta(days=7)), origin="reader")
+        reader.subscribe("link", lambda *keys: received.extend(keys))
+        reader.start()
+        try:
+            reader.transport.prune(db)
+            assert db.query(LinkChange).count() == 0
+            InvalidationBus(_db_transport(db), origin="writer").publish("link", "after-prune")
+            assert reader.transport.poll() == 1
+            assert received == ["after-prune"]
+        finally:
+            reader.stop()
@@ -1,6 +1,8 @@
 """Tests for the Links API endpoints (/api/links/)."""
 
 import pytest
+from datetime import datetime
+from unittest.mock import patch
 from tests.conftest import create_test_link, create_test_campaign
 
 
@@ -118,6 +120,43 @@ class TestReadLinks:
         assert "inactive1" not in codes
 
 
+def _pages(client, url, limit, **params):
+    """Follow X-Next-Cursor from the first page to the last; returns the pages."""
+    pages, cursor = [], None
+    while True:
+        resp = client.get(url, params={**params, "limit": limit, **({"cursor": cursor} if cursor else {})})
+        assert resp.status_code == 200
+        pages.append(resp.json())
+        cursor = resp.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+
+
+class TestCursorPagination:
+    def test_pages_follow_the_cursor(self, client, db, test_user):
+        # Four links share a created_at (the server default has one-second resolution);
+        # two more carry microseconds, stored in SQLAlchemy's format
+        links = [create_test_link(db, owner_id=test_user.id, short_code=f"page{i}") for i in range(4)]
+        for link, created_at in zip(links[:2], [datetime(2030, 1, 1, 0, 0, 0, 250000), datetime(2020, 1, 1)]):
+            link.created_at = created_at
+        db.commit()
+
+        pages = _pages(client, "/api/links/", limit=2)
+        assert [len(page) for page in pages] == [2, 2, 0]
+        codes = [l["short_code"] for page in pages for l in page]
+        assert codes == [l["short_code"] for l in client.get("/api/links/").json()]
+        assert codes == ["page0", "page3", "page2", "page1"]
+
+        # Filters apply to every page
+        pages = _pages(client, "/api/links/", limit=1, search="page", is_active=True)
+        assert [l["short_code"] for page in pages for l in page] == codes
+
+    def test_invalid_cursor(self, client):
+        for cursor in ("not-a-cursor", "WzEsMl0", "WyJ4IiwxXQ"):  # garbage, [1,2], ["x",1]
+            resp = client.get("/api/links/", params={"cursor": cursor})
+            assert resp.status_code == 400
+
+
 class TestUpdateLink:
     def test_update_link(self, client, db, test_user):
         link = create_test_link(db, owner_id=test_user.id, short_code="upd1",
@@ -200,6 +239,176 @@ class TestLinkStats:
         assert "clicks" in data
         assert "clicks_over_time" in data
 
+    def _raw_click(self, link_id, ua="Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
+                   referrer="https://www.google.com/", days_ago=0, ip="8.8.8.8"):
+        from datetime import datetime, timedelta
+        from app.utils.click_queue import RawClick
+        return RawClick(link_id, ip, ua, referrer, datetime.utcnow() - timedelta(days=days_ago))
+
+    def _local_geoip(self, tmp_path, monkeypatch):
+        from app.core.config import settings
+        from app.utils import geoip
+        path = tmp_path / "geoip-ranges.csv"
+        geoip.write_ranges(str(path), [(4, geoip.ip_to_int(ip)[1], geoip.ip_to_int(ip)[1], country)
+                                       for ip, country in (("1.1.1.1", "CA"), ("8.8.8.8", "US"))])
+        monkeypatch.setattr(settings, "GEOIP_PROVIDER", "local")
+        monkeypatch.setattr(settings, "GEOIP_DB_PATH", str(path))
+        geoip.reset_resolver()
+
+    def test_stats_read_from_rollups_written_at_ingest(self, client, db, test_user, tmp_path, monkeypatch):
+        from app.utils.analytics import write_click_batch
+        from app.utils.enrichment import click_enricher
+        self._local_geoip(tmp_path, monkeypatch)
+        link = create_test_link(db, owner_id=test_user.id, short_code="rolled")
+        iphone = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148 Safari/604.1"
+        write_click_batch(db, [
+            self._raw_click(link.id),
+            self._raw_click(link.id, ua=iphone),
+            self._raw_click(link.id, referrer="", ip="1.1.1.1"),
+        ])
+        write_click_batch(db, [self._raw_click(link.id, days_ago=45, ip="10.0.0.1")])
+
+        # Not enriched yet: dimensions are derived from the pending rows on the fly
+        pending = client.get("/api/links/rolled/stats").json()
+        assert click_enricher.run_pending(db) == 4
+        # Enriched: read from the dimension rollup, each click counted once
+        data = client.get("/api/links/rolled/stats").json()
+
+        for stats in (pending, data):
+            assert sum(d["count"] for d in stats["clicks_over_time"]) == 3  # 45-day-old click is outside the window
+            assert stats["top_countries"][0] == {"country": "US", "count": 2}
+            assert {"country": "Unknown", "count": 1} in stats["top_countries"]
+            assert {"referrer": "Direct", "count": 1} in stats["top_referrers"]
+            assert {"device": "mobile", "count": 1} in stats["device_breakdown"]
+        assert data["top_countries"] == pending["top_countries"]
+
+    def test_pending_stats_skip_remote_geoip(self, geoip_server, client, db, test_user):
+        """With ip-api as the provider, a stats read leaves pending rows' countries to the enricher."""
+        from app.utils.analytics import write_click_batch
+        link = create_test_link(db, owner_id=test_user.id, short_code="remotegeo")
+        write_click_batch(db, [self._raw_click(link.id, ip=f"8.8.8.{i}") for i in range(5)])
+
+        stats = client.get("/api/links/remotegeo/stats").json()
+        assert stats["top_countries"] == [{"country": "Unknown", "count": 5}]
+        assert {"referrer": "google.com", "count": 5} in stats["top_referrers"]
+        assert geoip_server.requests == []
+
+    def test_rebuild_rollups_from_existing_events(self, client, db, test_user):
+        from datetime import datetime
+        from app.models.analytics import ClickEvent, LinkDimensionClicks
+        from app.utils.rollups import rebuild_rollups
+        link = create_test_link(db, owner_id=test_user.id, short_code="legacy")
+        for country in ("DE", "DE", "FR"):
+            db.add(ClickEvent(link_id=link.id, country_code=country, device_type="desktop",
+                              timestamp=datetime.utcnow()))
+        db.commit()
+
+        assert rebuild_rollups(db, [link.id]) == 3
+        assert rebuild_rollups(db, [link.id]) == 3  # idempotent
+        db.commit()
+
+        data = client.get("/api/links/legacy/stats").json()
+        assert data["top_countries"] == [{"country": "DE", "count": 2}, {"country": "FR", "count": 1}]
+        assert data["clicks_over_time"][0]["count"] == 3
+        browsers = db.query(LinkDimensionClicks).filter_by(link_id=link.id, dimension="browser").all()
+        assert [(b.value, b.clicks) for b in browsers] == [("", 3)]
+
+
+    def test_grouping_sets_rows_mapped_to_rollups(self):
+        # PostgreSQL only, so feed it the rows such a query returns: GROUPING() has a bit
+        # set, leftmost column first, for each of (day, country, referrer, device, browser, os)
+        # a row is not grouped by
+        from datetime import date
+        from unittest.mock import MagicMock
+        from app.utils.rollups import RollupDelta, _grouping_sets_counts
+        db = MagicMock()
+        db.execute.return_value = [
+            (7, 0b011111, date(2026, 1, 2), None, None, None, None, None, 5, 3),
+            (7, 0b101111, None, "DE", None, None, None, None, 4, 3),
+            (7, 0b101111, None, None, None, None, None, None, 1, 0),  # only pending rows
+            (7, 0b110111, None, None, None, None, None, None, 5, 3),  # direct visits
+            (7, 0b111110, None, None, None, None, None, "iOS", 5, 3),
+        ]
+        delta = RollupDelta()
+        _grouping_sets_counts(db, [7], delta)
+        assert delta.daily == {(7, date(2026, 1, 2)): 5}
+        assert delta.dimensions == {(7, "country", "DE"): 3, (7, "referrer", ""): 3, (7, "os", "iOS"): 3}
+        sql = str(db.execute.call_args[0][0])
+        assert sql.count("FROM click_events") == 1 and "GROUPING SETS" in sql
+
+
+class TestStatsCache:
+    def _click(self, link_id):
+        from datetime import datetime
+        from app.utils.click_queue import RawClick
+        return RawClick(link_id, "8.8.8.8", "Mozilla/5.0 (Windows NT 10.0; Win64; x64)", "", datetime.utcnow())
+
+    def test_unchanged_stats_served_from_cache_then_304(self, client, db, test_user):
+        from app.utils.stats_cache import stats_cache
+        create_test_link(db, owner_id=test_user.id, short_code="cached")
+        first = client.get("/api/links/cached/stats")
+        etag = first.headers["etag"]
+        assert first.status_code == 200 and not etag.startswith("W/")
+        assert first.headers["cache-control"] == "private, no-cache"
+
+        second = client.get("/api/links/cached/stats")
+        assert second.json() == first.json() and second.headers["etag"] == etag
+        assert stats_cache.hits == 1
+
+        revalidated = client.get("/api/links/cached/stats", headers={"If-None-Match": etag})
+        assert revalidated.status_code == 304 and revalidated.content == b""
+        assert revalidated.headers["etag"] == etag
+
+    @patch("app.utils.enrichment.get_country_code", return_value="FR")
+    def test_ingestion_bumps_version(self, mock_geo, client, db, test_user):
+        from app.utils.analytics import write_click_batch
+        from app.utils.enrichment import click_enricher
+        link = create_test_link(db, owner_id=test_user.id, short_code="viral")
+        etag = client.get("/api/links/viral/stats").headers["etag"]
+
+        write_click_batch(db, [self._click(link.id), self._click(link.id)])
+        db.refresh(link)
+        assert link.stats_version == 1
+        resp = client.get("/api/links/viral/stats", headers={"If-None-Match": etag})
+        assert resp.status_code == 200 and resp.headers["etag"] != etag
+        assert sum(d["count"] for d in resp.json()["clicks_over_time"]) == 2
+
+        # Enrichment moves the dimension rollups, so it bumps the version too
+        click_enricher.run_pending(db)
+        db.refresh(link)
+        assert link.stats_version == 2
+        assert client.get("/api/links/viral/stats").json()["top_countries"] == [{"country": "FR", "count": 2}]
+
+    def test_link_edit_changes_etag(self, client, db, test_user):
+        link = create_test_link(db, owner_id=test_user.id, short_code="renamed")
+        etag = client.get("/api/links/renamed/stats").headers["etag"]
+        client.put(f"/api/links/{link.id}", json={"original_url": link.original_url, "short_code": "renamed", "title": "New"})
+        resp = client.get("/api/links/renamed/stats", headers={"If-None-Match": etag})
+        assert resp.status_code == 200 and resp.json()["title"] == "New"
+
+    def test_concurrent_misses_aggregate_once(self, monkeypatch):
+        import threading
+        import time
+        from types import SimpleNamespace
+        from app.utils import stats_cache
+        calls = []
+        def slow_compute(db, link_id, since):
+            calls.append(link_id)
+            time.sleep(0.05)
+            return {"clicks_over_time": []}
+        monkeypatch.setattr(stats_cache, "compute_link_stats", slow_compute)
+
+        link = SimpleNamespace(id=42, stats_version=7)
+        shared_before, hits_before = stats_cache.stats_single_flight.shared, stats_cache.stats_cache.hits
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(stats_cache.get_link_stats(None, link))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert calls == [42] and len(results) == 8
+        # Every other caller either waited on the one aggregation or found its result cached
+        assert stats_cache.stats_single_flight.shared - shared_before + stats_cache.stats_cache.hits - hits_before == 7
 
 class TestOwnershipIsolation:
     def test_link_ownership_isolation(self, db, test_user, other_user):
@@ -0,0 +1,247 @@
+"""
+Query plans of the hot queries: each one is captured as the code issues it
+and run through EXPLAIN QUERY PLAN, so a dropped or mismatched index fails
+here rather than as a slow page in production.
+
+TestQueryPlanRegressions runs every query of the CRUD modules and of the
+stats and export endpoints against a synthetic dataset and fails on a full
+table scan or a temp B-tree sort. A new filter or ordering needs an index to
+go with it. The dataset is not ANALYZEd: deployments never run ANALYZE, so
+their planner goes by the schema alone, as it does here.
+"""
+
+import io
+import re
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+
+from app.crud import audit as crud_audit
+from app.crud import campaign as crud_campaign
+from app.crud import link as crud_link
+from app.crud import user as crud_user
+from app.models.analytics import ClickEvent
+from app.models.audit import AuditLog
+from app.models.campaign import Campaign
+from app.models.link import Link
+from app.models.user import User
+from app.schemas.campaign import CampaignCreate, CampaignUpdate
+from app.schemas.link import LinkBulkUpdate, LinkCreate, LinkUpdate
+from app.schemas.user import UserCreate, UserUpdate
+from app.utils.enrichment import pending_dimension_counts
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.rollups import rebuild_rollups
+from app.utils.stats_cache import compute_link_stats
+from tests.conftest import create_test_link, engine
+
+EXPLAINED = ("SELECT", "UPDATE", "DELETE")
+# "SCAN links" reads the whole table; "SCAN links USING INDEX ..." walks an index in order
+FULL_SCAN = re.compile(r"^SCAN \w+$")
+TEMP_SORT = re.compile(r"USE TEMP B-TREE FOR .*ORDER BY")
+
+
+@contextmanager
+def captured_statements(kinds=("SELECT",)):
+    """Records (sql, parameters) for every statement of the given kinds executed inside the block."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(kinds):
+            statements.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def query_plan(db, statement, parameters) -> list:
+    rows = db.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+    return [row[3] for row in rows]
+
+
+def plans_for(db, fn, *args, **kwargs) -> list:
+    with captured_statements() as statements:
+        fn(db, *args, **kwargs)
+    return [query_plan(db, statement, parameters) for statement, parameters in statements]
+
+
+def plan_problems(plan) -> list:
+    return [step for step in plan if FULL_SCAN.match(step) or TEMP_SORT.search(step)]
+
+
+class TestHotQueryPlans:
+    def test_get_links_walks_live_owner_index(self, db, test_user):
+        create_test_link(db, owner_id=test_user.id, short_code="plan1")
+        for filters in (None, {"is_active": True, "search": "x"}):
+            [plan] = plans_for(db, crud_link.get_links, test_user.id, filters=filters)
+            assert plan == ["SEARCH links USING INDEX ix_links_owner_created_live (owner_id=?)"]
+        # A campaign's links are in created_at order in either index; SQLite may take either
+        [plan] = plans_for(db, crud_link.get_links, test_user.id, filters={"campaign_id": 1})
+        assert plan in (
+            ["SEARCH links USING INDEX ix_links_owner_created_live (owner_id=?)"],
+            ["SEARCH links USING INDEX ix_links_campaign_created (campaign_id=?)"],
+        )
+
+    def test_audit_logs_filtered_by_user_or_action(self, db, test_user):
+        crud_audit.create_audit_entry(db, test_user.id, "create", "link", 1)
+        [by_user] = plans_for(db, crud_audit.get_audit_logs, user_id=test_user.id)
+        assert by_user == ["SEARCH audit_logs USING INDEX ix_audit_logs_user_id_timestamp (user_id=?)"]
+        [by_action] = plans_for(db, crud_audit.get_audit_logs, action="create")
+        assert by_action == ["SEARCH audit_logs USING INDEX ix_audit_logs_action_timestamp (action=?)"]
+        [everyone] = plans_for(db, crud_audit.get_audit_logs)
+        assert everyone == ["SCAN audit_logs USING INDEX ix_audit_logs_timestamp"]
+
+    def test_click_event_queries_by_link(self, db, test_user):
+        link = create_test_link(db, owner_id=test_user.id, short_code="plan2")
+        [pending, *_] = plans_for(db, pending_dimension_counts, link.id)
+        assert pending == ["SEARCH click_events USING INDEX ix_click_events_pending_link (link_id=?)"]
+        # Clicks per day come from the (link_id, timestamp) index alone
+        [daily, *_] = plans_for(db, rebuild_rollups, [link.id])
+        assert daily[0] == "SEARCH click_events USING COVERING INDEX ix_click_events_link_id_timestamp (link_id=?)"
+
+    def test_stats_read_rollups_by_key(self, db, test_user):
+        link = create_test_link(db, owner_id=test_user.id, short_code="plan3")
+        plans = plans_for(db, compute_link_stats, link.id, date(2026, 1, 1))
+        for plan in plans:
+            assert plan and all(step.startswith("SEARCH") for step in plan), plan
+            assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+# ---------------------------------------------------------------------------
+# Regression harness
+# ---------------------------------------------------------------------------
+
+USERS, CAMPAIGNS_PER_USER, LINKS_PER_USER, EVENTS_PER_LINK, AUDIT_PER_USER = 20, 10, 100, 5, 50
+
+
+@pytest.fixture()
+def dataset(db, test_user):
+    """
+    test_user plus USERS others, each with campaigns, links (one in ten
+    deleted, half in a campaign), clicks (the latest per link still pending
+    enrichment) and audit entries.
+    """
+    now = datetime.utcnow()
+    users = [{"keyn_id": f"plan-{i}", "email": f"plan{i}@example.com", "username": f"plan{i}",
+              "is_approved": True, "request_status": "approved"} for i in range(USERS)]
+    db.execute(insert(User), users)
+    user_ids = [test_user.id] + [u.id for u in db.query(User.id).filter(User.keyn_id.like("plan-%"))]
+
+    db.execute(insert(Campaign), [
+        {"name": f"c{user_id}-{i}", "owner_id": user_id, "created_at": now - timedelta(days=i)}
+        for user_id in user_ids for i in range(CAMPAIGNS_PER_USER)
+    ])
+    campaigns = {}
+    for campaign_id, owner_id in db.query(Campaign.id, Campaign.owner_id):
+        campaigns.setdefault(owner_id, []).append(campaign_id)
+    # Half of the links in a campaign
+    db.execute(insert(Link), [
+        {"short_code": f"p{user_id}x{i}", "original_url": f"https://example.com/{i}", "owner_id": user_id,
+         "is_active": True, "is_deleted": i % 10 == 0, "clicks": EVENTS_PER_LINK,
+         "campaign_id": campaigns[user_id][i % CAMPAIGNS_PER_USER] if i % 2 else None,
+         "created_at": now - timedelta(hours=i)}
+        for user_id in user_ids for i in range(LINKS_PER_USER)
+    ])
+    link_ids = [link_id for (link_id,) in db.query(Link.id)]
+    db.execute(insert(ClickEvent), [
+        {"link_id": link_id, "timestamp": now - timedelta(hours=n), "ip_address": "8.8.8.8",
+         "referrer": "google.com", "device_type": "desktop", "os": "Linux", "browser": "Firefox",
+         "country_code": "US", "enriched": n > 0}
+        for link_id in link_ids for n in range(EVENTS_PER_LINK)
+    ])
+    db.execute(insert(AuditLog), [
+        {"user_id": user_id, "action": ("create", "update", "delete")[i % 3], "target_type": "link",
+         "target_id": i, "timestamp": now - timedelta(minutes=i)}
+        for user_id in user_ids for i in range(AUDIT_PER_USER)
+    ])
+    rebuild_rollups(db)
+    db.commit()
+    return test_user
+
+
+def _key(row, *attributes) -> list:
+    """The decoded cursor a list endpoint would hand out after `row`."""
+    return decode_cursor(encode_cursor(*(getattr(row, a) for a in attributes)), *(type(getattr(row, a)) for a in attributes))
+
+
+class TestQueryPlanRegressions:
+    @pytest.fixture(autouse=True)
+    def _check(self, db):
+        self.db = db
+
+    @contextmanager
+    def checked(self):
+        """Fails if any statement run inside the block scans a whole table or sorts in a temp B-tree."""
+        with captured_statements(EXPLAINED) as statements:
+            yield
+        assert statements, "nothing was captured"
+        problems = []
+        for statement, parameters in statements:
+            bad = plan_problems(query_plan(self.db, statement, parameters))
+            if bad:
+                problems.append(f"{' '.join(statement.split())}\n    -> {bad}")
+        assert not problems, "\n".join(problems)
+
+    def test_crud_link(self, db, dataset):
+        link = db.query(Link).filter_by(owner_id=dataset.id, is_deleted=False).filter(Link.campaign_id != None).first()
+        with self.checked():
+            crud_link.get_link(db, link.id)
+            crud_link.get_link_by_code(db, link.short_code)
+            crud_link.get_redirect_entry(db, link.short_code)
+            crud_link.get_links(db, dataset.id, skip=50, limit=20)
+            crud_link.get_links(db, dataset.id, filters={"campaign_id": 1, "is_active": True, "search": "example"})
+            crud_link.get_links(db, dataset.id, limit=20, cursor=_key(link, "created_at", "id"))
+            crud_link.get_links(db, dataset.id, filters={"campaign_id": link.campaign_id}, cursor=_key(link, "created_at", "id"))
+            created = crud_link.create_link(db, LinkCreate(original_url="https://new.example.com"), dataset.id)
+            crud_link.update_link(db, created, LinkUpdate(original_url="https://new.example.com/2", short_code="plannew"))
+            crud_link.create_links_bulk(db, [LinkCreate(original_url="https://bulk.example.com")], dataset.id)
+            crud_link.update_links_bulk(db, LinkBulkUpdate(link_ids=[link.id, created.id], is_active=False), dataset.id)
+            crud_link.delete_link(db, created)
+
+    def test_crud_audit(self, db, dataset):
+        with self.checked():
+            crud_audit.create_audit_entry(db, dataset.id, "create", "link", 1, {"short_code": "x"})
+            crud_audit.get_audit_logs(db)
+            crud_audit.get_audit_logs(db, skip=100, limit=50)
+            crud_audit.get_audit_logs(db, user_id=dataset.id)
+            crud_audit.get_audit_logs(db, action="update", target_type="link")
+            crud_audit.get_audit_logs(db, user_id=dataset.id, action="delete")
+            entry = crud_audit.get_audit_logs(db, limit=100)[-1]
+            for user_id, action in ((None, None), (dataset.id, None), (None, "update")):
+                crud_audit.get_audit_logs(db, user_id=user_id, action=action, cursor=_key(entry, "timestamp", "id"))
+
+    def test_crud_campaign(self, db, dataset):
+        campaign = db.query(Campaign).filter_by(owner_id=dataset.id).first()
+        with self.checked():
+            crud_campaign.get_campaign(db, campaign.id)
+            crud_campaign.get_campaigns(db, dataset.id)
+            crud_campaign.get_campaigns(db, dataset.id, limit=5, cursor=_key(campaign, "id"))
+            created = crud_campaign.create_campaign(db, CampaignCreate(name="plan"), dataset.id)
+            crud_campaign.update_campaign(db, created, CampaignUpdate(color="#fff"))
+            crud_campaign.delete_campaign(db, created)
+
+    def test_crud_user(self, db, dataset):
+        with self.checked():
+            crud_user.get_user(db, dataset.id)
+            crud_user.get_user_by_email(db, dataset.email)
+            crud_user.get_user_by_keyn_id(db, dataset.keyn_id)
+            crud_user.get_cached_user_by_keyn_id(db, "plan-3")
+            crud_user.set_approval_status(db, dataset, is_approved=True, request_status="approved")
+            created = crud_user.create_user(db, UserCreate(keyn_id="plan-new", email="plan-new@example.com", username="plannew"))
+            crud_user.update_user(db, created, UserUpdate(full_name="Plan New", avatar_url="https://example.com/a.png"))
+
+    def test_stats_endpoint(self, db, dataset, client):
+        link = db.query(Link).filter_by(owner_id=dataset.id, is_deleted=False).first()
+        with self.checked():
+            assert client.get(f"/api/links/{link.short_code}/stats").status_code == 200
+
+    def test_export_endpoints(self, db, dataset, client):
+        csv = "original_url,short_code,campaign_name\nhttps://import.example.com,planimp,c1-1\n"
+        with self.checked():
+            assert client.get("/api/export/csv").status_code == 200
+            resp = client.post("/api/export/csv", files={"file": ("links.csv", io.BytesIO(csv.encode()), "text/csv")})
+            assert resp.status_code == 200
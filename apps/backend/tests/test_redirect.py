@@ -5,7 +5,7 @@ from datetime import datetime, timedelta
 from passlib.context import CryptContext
 from app.models.link import Link
 from app.models.analytics import ClickEvent
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 from tests.conftest import create_test_link
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -68,7 +68,7 @@ class TestRedirectStats:
         assert resp.status_code == 302
         assert "/stats/info" in resp.headers["location"]
 
-    @patch("app.utils.analytics.get_country_code")
+    @patch("app.utils.enrichment.get_country_code")
     def test_redirect_click_tracking(self, mock_geo, client, db, test_user):
         mock_geo.return_value = "CA"
         link = create_test_link(db, owner_id=test_user.id, short_code="cnt",
@@ -78,11 +78,392 @@ class TestRedirectStats:
         initial_events = db.query(ClickEvent).filter(ClickEvent.link_id == link.id).count()
         
         client.get("/cnt", headers={"referer": "https://www.google.com/search?q=test"}, follow_redirects=False)
-        
-        # A ClickEvent should have been created with normalized data
+
+        # Events are queued on the request path and written by the queue workers
+        from app.utils.analytics import click_queue
+        assert click_queue.stats()["depth"] == 1
+        click_queue.drain(db)
+
+        # Written raw, then enriched in the background
+        from app.utils.enrichment import click_enricher
         event = db.query(ClickEvent).filter(ClickEvent.link_id == link.id).order_by(ClickEvent.id.desc()).first()
-        assert event is not None
+        assert event is not None and not event.enriched and event.country_code is None
+        assert click_enricher.run_pending(db) == 1
+
+        # The ClickEvent now has normalized data
+        db.refresh(event)
+        assert event.enriched
         assert event.referrer == "google.com"
         assert event.country_code == "CA"
         assert event.device_type == "desktop"  # Default for TestClient UA
 
+
+class TestRedirectCache:
+    def test_repeat_redirect_served_from_cache(self, client, db, test_user):
+        from app.utils.link_cache import redirect_cache
+        link = create_test_link(db, owner_id=test_user.id, short_code="hot",
+                                original_url="https://hot.example.com", track_activity=False)
+        client.get("/hot", follow_redirects=False)
+        assert redirect_cache.misses == 1
+
+        # Remove the row behind the cache's back: a warm entry must not touch the DB
+        db.delete(link)
+        db.commit()
+        resp = client.get("/hot", follow_redirects=False)
+        assert resp.headers["location"] == "https://hot.example.com"
+        assert redirect_cache.hits == 1
+
+    def test_update_invalidates_cache(self, client, db, test_user):
+        link = create_test_link(db, owner_id=test_user.id, short_code="moving",
+                                original_url="https://old.example.com")
+        client.get("/moving", follow_redirects=False)
+        client.put(f"/api/links/{link.id}", json={
+            "original_url": "https://new.example.com", "short_code": "moving",
+        })
+        resp = client.get("/moving", follow_redirects=False)
+        assert resp.headers["location"] == "https://new.example.com"
+
+    def test_delete_invalidates_cache(self, client, db, test_user):
+        link = create_test_link(db, owner_id=test_user.id, short_code="gone")
+        client.get("/gone", follow_redirects=False)
+        client.delete(f"/api/links/{link.id}")
+        resp = client.get("/gone", follow_redirects=False)
+        assert "/404" in resp.headers["location"]
+
+    def test_bulk_update_invalidates_cache(self, client, db, test_user):
+        link = create_test_link(db, owner_id=test_user.id, short_code="bulkoff")
+        client.get("/bulkoff", follow_redirects=False)
+        client.put("/api/links/bulk", json={"link_ids": [link.id], "is_active": False})
+        resp = client.get("/bulkoff", follow_redirects=False)
+        assert "type=disabled" in resp.headers["location"]
+
+    def test_expiry_checked_on_cached_entry(self, client, db, test_user):
+        from app.utils.link_cache import redirect_cache
+        create_test_link(db, owner_id=test_user.id, short_code="soon",
+                         expires_at=datetime.utcnow() + timedelta(days=1))
+        client.get("/soon", follow_redirects=False)
+        entry = redirect_cache.get("soon")
+        redirect_cache.set("soon", entry._replace(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        resp = client.get("/soon", follow_redirects=False)
+        assert "type=expired" in resp.headers["location"]
+
+    def test_cache_metrics_admin_only(self, admin_client):
+        resp = admin_client.get("/api/metrics/")
+        assert resp.status_code == 200
+        assert set(resp.json()["redirect_cache"]) >= {"hits", "misses", "hit_rate"}
+
+    def test_cache_metrics_forbidden_for_regular_user(self, client):
+        resp = client.get("/api/metrics/")
+        assert resp.status_code == 400
+
+    def test_lru_eviction_and_ttl(self):
+        from app.utils.cache import LRUCache
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)  # evicts "b", the least recently used
+        assert "b" not in cache and cache.get("a") == 1
+        assert cache.evictions == 1
+
+        cache.set("short", 1, ttl=-1)
+        assert cache.get("short") is None
+
+
+class TestClickCounter:
+    def test_redirects_are_buffered_then_flushed(self, client, db, test_user):
+        from app.utils.click_counter import click_counter
+        link = create_test_link(db, owner_id=test_user.id, short_code="counted",
+                                track_activity=False)
+        for _ in range(3):
+            client.get("/counted", follow_redirects=False)
+        db.refresh(link)
+        assert link.clicks == 0
+        assert click_counter.stats()["pending_clicks"] == 3
+
+        assert click_counter.flush(db) == 3
+        db.refresh(link)
+        assert link.clicks == 3
+
+    def test_flush_is_one_batched_update(self, db, test_user):
+        from sqlalchemy import event
+        from app.utils.click_counter import ClickCounter
+        a = create_test_link(db, owner_id=test_user.id, short_code="ca")
+        b = create_test_link(db, owner_id=test_user.id, short_code="cb")
+        counter = ClickCounter(max_pending=1000)
+        counter.add(a.id)
+        counter.add(b.id, 4)
+        counter.add(a.id)
+
+        statements = []
+        def _capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, executemany))
+        bind = db.connection()
+        event.listen(bind, "before_cursor_execute", _capture)
+        try:
+            counter.flush(db)
+        finally:
+            event.remove(bind, "before_cursor_execute", _capture)
+
+        updates = [s for s in statements if s[0].startswith("UPDATE links")]
+        assert len(updates) == 1 and updates[0][1] is True
+        db.refresh(a)
+        db.refresh(b)
+        assert (a.clicks, b.clicks) == (2, 4)
+
+    def test_threshold_triggers_flush(self, db, test_user):
+        from sqlalchemy.orm import Session
+        from app.utils.click_counter import ClickCounter
+        link = create_test_link(db, owner_id=test_user.id, short_code="burst")
+        counter = ClickCounter(max_pending=5, session_factory=lambda: Session(bind=db.connection()))
+        for _ in range(5):
+            counter.add(link.id)
+        assert counter.stats()["pending_clicks"] == 0
+        db.refresh(link)
+        assert link.clicks == 5
+
+    def test_failed_flush_keeps_clicks(self, db):
+        from app.utils.click_counter import ClickCounter
+        broken = MagicMock()
+        broken.execute.side_effect = RuntimeError("database is locked")
+        counter = ClickCounter(session_factory=lambda: broken)
+        counter.add(1, 2)
+        with pytest.raises(RuntimeError):
+            counter.flush()
+        assert counter.stats()["pending_clicks"] == 2
+        assert counter.errors == 1
+
+
+class TestAsyncRedirect:
+    def test_route_runs_on_event_loop(self):
+        import inspect
+        from app.api.endpoints.redirect import redirect_to_url
+        assert inspect.iscoroutinefunction(redirect_to_url)
+
+    def test_async_url_derived_from_sync_url(self):
+        from app.db.session import to_async_url
+        assert to_async_url("sqlite:///./nololink.db") == "sqlite+aiosqlite:///./nololink.db"
+        assert to_async_url("postgresql+psycopg2://u:p@db/nolo") == "postgresql+asyncpg://u:p@db/nolo"
+
+    def test_missing_async_driver_named(self):
+        import importlib.util
+        from app.db.session import _create_async_engine
+        if importlib.util.find_spec("asyncpg"):
+            pytest.skip("asyncpg is installed")
+        with pytest.raises(RuntimeError, match="'asyncpg'.*ASYNC_DATABASE_URL"):
+            _create_async_engine("postgresql+asyncpg://u:p@db/nolo")
+
+    def test_lookup_on_aiosqlite_engine(self, tmp_path):
+        import asyncio
+        from sqlalchemy import create_engine
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        from sqlalchemy.orm import Session
+        from app.db.base import Base
+        from app.models.user import User
+        from app.crud.link import get_redirect_entry_async
+
+        url = f"sqlite:///{tmp_path / 'async.db'}"
+        sync_engine = create_engine(url)
+        Base.metadata.create_all(sync_engine)
+        with Session(sync_engine) as session:
+            user = User(keyn_id="k1", email="a@example.com", username="a")
+            session.add(user)
+            session.flush()
+            session.add(Link(short_code="live", original_url="https://live.example", owner_id=user.id,
+                             utm_source="news"))
+            session.add(Link(short_code="dead", original_url="https://dead.example", owner_id=user.id,
+                             is_deleted=True))
+            session.commit()
+        sync_engine.dispose()
+
+        async def lookup():
+            engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+            try:
+                async with async_sessionmaker(engine)() as session:
+                    return (await get_redirect_entry_async(session, "live"),
+                            await get_redirect_entry_async(session, "dead"))
+            finally:
+                await engine.dispose()
+
+        live, dead = asyncio.run(lookup())
+        assert live.destination == "https://live.example?utm_source=news"
+        assert dead is None
+
+
+class TestFastPath:
+    def test_redirect_answered_before_router(self, client, db, test_user):
+        create_test_link(db, owner_id=test_user.id, short_code="quick", original_url="https://quick.example")
+        # Only the router's catch-all route resolves through get_redirect_entry_async
+        with patch("app.crud.link.get_redirect_entry_async", side_effect=AssertionError("router ran")):
+            resp = client.get("/quick", follow_redirects=False)
+        assert resp.status_code == 302
+        assert resp.headers["location"] == "https://quick.example"
+
+    def test_capture_error_logged_not_raised(self, client, db, test_user, caplog, capsys):
+        create_test_link(db, owner_id=test_user.id, short_code="oops", original_url="https://oops.example")
+        with patch("app.api.endpoints.redirect.capture_click", side_effect=RuntimeError("disk full")):
+            resp = client.get("/oops", follow_redirects=False)
+        assert resp.status_code == 302
+        assert "Error capturing click analytics" in caplog.text and "disk full" in caplog.text
+        assert capsys.readouterr().out == ""
+
+    def test_head_request(self, client, db, test_user):
+        create_test_link(db, owner_id=test_user.id, short_code="peek", original_url="https://peek.example")
+        resp = client.head("/peek", follow_redirects=False)
+        assert resp.status_code == 302
+        assert resp.headers["location"] == "https://peek.example"
+
+    def test_reserved_names_served_statically(self, client):
+        assert client.get("/favicon.ico").status_code == 404
+        resp = client.get("/robots.txt")
+        assert resp.status_code == 200
+        assert "Disallow: /api/" in resp.text
+
+    def test_app_routes_pass_through(self, client):
+        assert client.get("/openapi.json").json()["info"]["title"] == "NoloLink"
+        assert client.get("/").json() == {"message": "Welcome to NoloLink API"}
+        assert client.post("/somecode").status_code == 405
+
+    def test_non_ascii_destination_is_escaped(self, client, db, test_user):
+        create_test_link(db, owner_id=test_user.id, short_code="cafe", original_url="https://example.com/café")
+        resp = client.get("/cafe", follow_redirects=False)
+        assert resp.headers["location"] == "https://example.com/caf%C3%A9"
+
+
+def _count_sql(db, fn):
+    from sqlalchemy import event
+    statements = []
+    bind = db.connection()
+    listener = lambda *args: statements.append(args[2])
+    event.listen(bind, "before_cursor_execute", listener)
+    try:
+        result = fn()
+    finally:
+        event.remove(bind, "before_cursor_execute", listener)
+    return result, statements
+
+
+class TestUnknownCodes:
+    def test_bloom_filter_has_no_false_negatives(self):
+        from app.utils.bloom import BloomFilter
+        bloom = BloomFilter(capacity=5000, error_rate=0.01)
+        codes = [f"code{i}" for i in range(5000)]
+        bloom.update(codes)
+        assert all(code in bloom for code in codes)
+        false_positives = sum(f"other{i}" in bloom for i in range(20000))
+        assert false_positives / 20000 < 0.02
+        assert 0.005 < bloom.estimated_false_positive_rate() < 0.02
+        assert bloom.memory_bytes < 7000
+
+    def test_unknown_code_answered_without_sql(self, client, db, test_user):
+        from app.utils.code_filter import short_code_filter
+        create_test_link(db, owner_id=test_user.id, short_code="known")
+        short_code_filter.build(db)
+        resp, statements = _count_sql(db, lambda: client.get("/wp-login.php", follow_redirects=False))
+        assert "/404" in resp.headers["location"]
+        assert statements == []
+        assert client.get("/known", follow_redirects=False).headers["location"] == "https://example.com"
+
+    def test_recent_miss_negatively_cached(self, client, db):
+        client.get("/nothere", follow_redirects=False)
+        resp, statements = _count_sql(db, lambda: client.get("/nothere", follow_redirects=False))
+        assert "/404" in resp.headers["location"]
+        assert statements == []
+
+    def test_resolvers_reject_before_the_index(self, db):
+        import asyncio
+        from app.crud.link import get_redirect_entry, get_redirect_entry_async
+        from app.utils.link_cache import record_missing
+        record_missing("gone")
+        # The negative cache answers for both resolvers; the index is never asked
+        with patch("app.utils.redirect_index.redirect_index.lookup", side_effect=AssertionError("index asked")):
+            assert get_redirect_entry(db, "gone") is None
+            assert asyncio.run(get_redirect_entry_async(None, "gone")) is None
+
+    def test_new_link_visible_after_miss(self, client, db, test_user):
+        from app.utils.code_filter import short_code_filter
+        short_code_filter.build(db)
+        client.get("/fresh", follow_redirects=False)
+        client.post("/api/links/", json={"original_url": "https://fresh.example", "short_code": "fresh"})
+        resp = client.get("/fresh", follow_redirects=False)
+        assert resp.headers["location"] == "https://fresh.example"
+
+    def test_filter_metrics(self, admin_client, db):
+        from app.utils.code_filter import short_code_filter
+        short_code_filter.build(db)
+        admin_client.get("/does-not-exist", follow_redirects=False)
+        stats = admin_client.get("/api/metrics/").json()["short_code_filter"]
+        assert stats["ready"] is True
+        assert stats["rejected"] == 1
+        assert stats["memory_bytes"] > 0
+        assert set(stats) >= {"estimated_fp_rate", "observed_fp_rate", "target_fp_rate"}
+
+
+class TestHttpCaching:
+    def _link(self, db, user, code, **kwargs):
+        redirect_type = kwargs.pop("redirect_type", 301)
+        link = create_test_link(db, owner_id=user.id, short_code=code, track_activity=False, **kwargs)
+        link.redirect_type = redirect_type
+        db.commit()
+        return link
+
+    def test_permanent_redirect_is_cacheable(self, client, db, test_user):
+        self._link(db, test_user, "perm")
+        resp = client.get("/perm", follow_redirects=False)
+        assert resp.status_code == 301
+        assert resp.headers["cache-control"] == "public, max-age=86400"
+        assert resp.headers["etag"].startswith('W/"')
+        assert resp.headers["surrogate-key"] == "code-perm"
+
+    def test_max_age_capped_by_expiry(self, client, db, test_user):
+        self._link(db, test_user, "soon", expires_at=datetime.utcnow() + timedelta(hours=1))
+        max_age = int(client.get("/soon", follow_redirects=False).headers["cache-control"].split("=")[1])
+        assert 3500 < max_age <= 3600
+
+    def test_temporary_redirect_revalidates(self, client, db, test_user):
+        self._link(db, test_user, "temp", redirect_type=302)
+        assert client.get("/temp", follow_redirects=False).headers["cache-control"] == "no-cache"
+
+    def test_tracked_and_gated_links_not_stored(self, client, db, test_user):
+        create_test_link(db, owner_id=test_user.id, short_code="tracked")
+        self._link(db, test_user, "gated", require_login=True)
+        assert client.get("/tracked", follow_redirects=False).headers["cache-control"] == "no-store"
+        resp = client.get("/gated", follow_redirects=False)
+        assert resp.headers["cache-control"] == "no-store"
+        assert "vary" not in resp.headers  # the same verify redirect for everyone
+        assert "etag" not in resp.headers
+        assert client.get("/nowhere", follow_redirects=False).headers["cache-control"] == "no-store"
+        assert client.get("/gated+", follow_redirects=False).headers["cache-control"] == "no-store"
+
+    def test_conditional_request_gets_304(self, client, db, test_user):
+        self._link(db, test_user, "cond")
+        etag = client.get("/cond", follow_redirects=False).headers["etag"]
+        resp = client.get("/cond", headers={"If-None-Match": etag}, follow_redirects=False)
+        assert resp.status_code == 304
+        assert resp.headers["etag"] == etag
+        assert "location" not in resp.headers
+        assert client.get("/cond", headers={"If-None-Match": 'W/"other"'},
+                          follow_redirects=False).status_code == 301
+
+    def test_edit_changes_etag_and_purges(self, client, db, test_user, monkeypatch):
+        from app.utils import http_cache
+        purged = []
+        hook = http_cache.PurgeHook()
+        hook.purge = purged.extend
+        monkeypatch.setattr(http_cache, "purge_hook", hook)
+        link = self._link(db, test_user, "edit")
+        before = client.get("/edit", follow_redirects=False).headers["etag"]
+        client.put(f"/api/links/{link.id}", json={"original_url": "https://edited.example",
+                                                 "track_activity": False})
+        assert purged == ["code-edit"]
+        assert client.get("/edit", follow_redirects=False).headers["etag"] != before
+
+    def test_http_purge_hook(self, stub_server):
+        from app.utils.http_cache import HTTPPurgeHook
+        stub_server.respond("POST", "/purge/code-a", 200, {"status": "ok"})
+        stub_server.respond("POST", "/purge/code-b", 200, {"status": "ok"})
+        hook = HTTPPurgeHook(stub_server.url + "/purge/{key}", token="secret", background=False)
+        hook.purge(["code-a", "code-b"])
+        assert [r["path"] for r in stub_server.requests] == ["/purge/code-a", "/purge/code-b"]
+        assert stub_server.requests[0]["headers"]["Authorization"] == "Bearer secret"
+        assert hook.stats() == {"hook": "http", "purged": 2, "errors": 0}
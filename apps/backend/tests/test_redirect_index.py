@@ -0,0 +1,142 @@
+"""Tests for the memory-mapped redirect index (app/utils/redirect_index.py)."""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.models.link import Link
+from app.utils.redirect_index import FENCE_EVERY, RedirectIndex, build_index, redirect_index
+from tests.conftest import create_test_link
+from tests.test_redirect import _count_sql
+
+
+@pytest.fixture()
+def index_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "redirects.idx")
+    monkeypatch.setattr(settings, "REDIRECT_INDEX_PATH", path)
+    monkeypatch.setattr(settings, "REDIRECT_INDEX_RELOAD_INTERVAL", 0)
+    return path
+
+
+class TestIndexFile:
+    def test_lookup_every_code(self, db, test_user, tmp_path):
+        expires = datetime(2030, 1, 2, 3, 4, 5)
+        codes = ["b", "a", "ab", "zz9", "é-code", "Z"]
+        for code in codes:
+            create_test_link(db, owner_id=test_user.id, short_code=code, original_url=f"https://{code}.example")
+        create_test_link(db, owner_id=test_user.id, short_code="flags", password_hash="x", require_login=True,
+                         is_active=False, track_activity=False, expires_at=expires, utm_source="idx")
+        path = str(tmp_path / "i.idx")
+        result = build_index(db, path)
+        assert result["entries"] == 7 and result["key_width"] == 8
+
+        index = RedirectIndex(path)
+        for code in codes:
+            entry = index.get(code)
+            assert (entry.short_code, entry.destination) == (code, f"https://{code}.example")
+            assert entry.is_active and entry.track_activity and not entry.is_gated
+        flagged = index.get("flags")
+        assert flagged.destination == "https://example.com?utm_source=idx"
+        assert (flagged.is_active, flagged.requires_password, flagged.require_login, flagged.track_activity) == \
+            (False, True, True, False)
+        assert flagged.expires_at == expires
+        for missing in ("", "c", "aa", "abc", "zz", "a-much-longer-code-than-any"):
+            assert index.get(missing) is None
+
+    def test_lookup_across_fence_blocks(self, db, test_user, tmp_path):
+        codes = [f"c{i:04d}" for i in range(0, FENCE_EVERY * 3 * 2, 2)]
+        for code in codes:
+            create_test_link(db, owner_id=test_user.id, short_code=code)
+        path = str(tmp_path / "i.idx")
+        build_index(db, path)
+        index = RedirectIndex(path)
+        assert all(index.get(code).short_code == code for code in codes)
+        assert [index.get(f"c{i:04d}") for i in (-1, 1, FENCE_EVERY * 2 + 1, FENCE_EVERY * 6)] == [None] * 4
+
+    def test_match_inside_fields_is_not_a_key(self, db, test_user, tmp_path):
+        # Link id 0x61616161, redirect type 302 and flags (active, tracked) are the bytes "aaaa.\x01\x09\x00"
+        create_test_link(db, owner_id=test_user.id, short_code="a")
+        link = create_test_link(db, owner_id=test_user.id, short_code="trapcode")
+        db.execute(update(Link).where(Link.id == link.id).values(id=0x61616161))
+        path = str(tmp_path / "i.idx")
+        build_index(db, path)
+        index = RedirectIndex(path)
+        assert index.get("trapcode").id == 0x61616161
+        assert index.get("aaaa.\x01\x09") is None
+
+    def test_deleted_links_left_out(self, db, test_user, tmp_path):
+        link = create_test_link(db, owner_id=test_user.id, short_code="gone")
+        link.is_deleted = True
+        db.commit()
+        path = str(tmp_path / "i.idx")
+        assert build_index(db, path)["entries"] == 0
+        assert RedirectIndex(path).get("gone") is None
+
+    def test_rejects_other_files(self, tmp_path):
+        path = tmp_path / "not.idx"
+        path.write_bytes(b"\0" * 64)
+        with pytest.raises(ValueError):
+            RedirectIndex(str(path))
+
+
+class TestIndexServing:
+    def test_redirect_served_without_sql(self, client, db, test_user, index_path):
+        create_test_link(db, owner_id=test_user.id, short_code="mapped", original_url="https://mapped.example")
+        build_index(db, index_path)
+        resp, statements = _count_sql(db, lambda: client.get("/mapped", follow_redirects=False))
+        assert resp.headers["location"] == "https://mapped.example"
+        assert statements == []
+        # Codes missing from the index are answered as not found, also without SQL
+        resp, statements = _count_sql(db, lambda: client.get("/absent", follow_redirects=False))
+        assert "/404" in resp.headers["location"]
+        assert statements == []
+
+    def test_changed_code_falls_back_to_database(self, client, db, test_user, index_path):
+        link = create_test_link(db, owner_id=test_user.id, short_code="moved", original_url="https://old.example")
+        build_index(db, index_path)
+        client.put(f"/api/links/{link.id}", json={"original_url": "https://new.example"})
+        client.post("/api/links/", json={"original_url": "https://born.example", "short_code": "born"})
+        assert client.get("/moved", follow_redirects=False).headers["location"] == "https://new.example"
+        assert client.get("/born", follow_redirects=False).headers["location"] == "https://born.example"
+        assert redirect_index.stats()["stale_skips"] == 2
+
+    def test_too_many_changes_set_index_aside(self, client, db, test_user, index_path, monkeypatch):
+        from app.utils.link_cache import changed_codes
+        monkeypatch.setattr(settings, "REDIRECT_INDEX_MAX_CHANGED", 1)
+        link = create_test_link(db, owner_id=test_user.id, short_code="busy", original_url="https://old.example")
+        build_index(db, index_path)
+        assert redirect_index.current() is not None
+        client.put(f"/api/links/{link.id}", json={"original_url": "https://new.example"})
+        client.post("/api/links/", json={"original_url": "https://born.example", "short_code": "born"})
+
+        # Set aside: the changes are forgotten and the database answers
+        assert redirect_index.current() is None and changed_codes == {}
+        assert client.get("/busy", follow_redirects=False).headers["location"] == "https://new.example"
+        assert redirect_index.stats()["overflows"] == 1
+        # A rebuild (after the changes) is used again
+        build_index(db, index_path)
+        assert redirect_index.current().get("born") is not None
+
+    def test_rebuilt_index_swapped_in(self, client, db, test_user, index_path):
+        link = create_test_link(db, owner_id=test_user.id, short_code="swap", original_url="https://one.example")
+        build_index(db, index_path)
+        first = redirect_index.current()
+        assert first.get("swap").destination == "https://one.example"
+
+        # Changed behind the app's back (another tool), then the index is rebuilt
+        link.original_url = link.redirect_url = "https://two.example"
+        db.commit()
+        build_index(db, index_path)
+        assert client.get("/swap", follow_redirects=False).headers["location"] == "https://two.example"
+        assert redirect_index.current() is not first
+        # The old mapping still answers for anyone holding it
+        assert first.get("swap").destination == "https://one.example"
+
+    def test_metrics(self, admin_client, db, index_path):
+        build_index(db, index_path)
+        admin_client.get("/anything", follow_redirects=False)
+        stats = admin_client.get("/api/metrics/").json()["redirect_index"]
+        assert stats["loaded"] is True
+        assert stats["lookups"] == 1 and stats["found"] == 0
@@ -0,0 +1,115 @@
+"""Tests for historical re-enrichment (app/utils/reenrichment.py)."""
+
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from app.models.analytics import ClickEvent, LinkDimensionClicks
+from app.utils import reenrichment
+from app.utils.reenrichment import ReenrichJob, load_checkpoint
+from app.utils.rollups import rebuild_rollups
+from tests.conftest import create_test_link
+
+IPHONE = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148 Safari/604.1"
+WINDOWS = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+
+def _events(db, link, agents, enriched=True):
+    # Enriched by an older parser / GeoIP database that didn't know these values
+    events = [
+        ClickEvent(link_id=link.id, ip_address="8.8.8.8", user_agent=ua, referrer="google.com",
+                   device_type="unknown", os="Other", browser="Other", country_code=None,
+                   timestamp=datetime.utcnow(), enriched=enriched)
+        for ua in agents
+    ]
+    db.add_all(events)
+    db.commit()
+    rebuild_rollups(db, [link.id])
+    db.commit()
+    return events
+
+
+def _dimension(db, link, dimension):
+    rows = db.query(LinkDimensionClicks).filter_by(link_id=link.id, dimension=dimension).all()
+    return {row.value: row.clicks for row in rows}
+
+
+@pytest.fixture
+def link(db, test_user):
+    return create_test_link(db, owner_id=test_user.id, short_code="history")
+
+
+@patch("app.utils.reenrichment.get_country_code", return_value="NZ")
+class TestReenrichJob:
+    def test_changed_rows_updated_and_rollups_moved(self, mock_geo, db, link, tmp_path):
+        events = _events(db, link, [IPHONE, IPHONE, WINDOWS])
+        job = ReenrichJob(str(tmp_path / "ck.json"), chunk_size=2, workers=0)
+        result = job.run(db)
+        assert result["scanned"] == 3 and result["updated"] == 3
+        assert mock_geo.call_count == 2  # once per window, for its one distinct IP
+
+        for event in events:
+            db.refresh(event)
+        assert [e.device_type for e in events] == ["mobile", "mobile", "desktop"]
+        assert {e.country_code for e in events} == {"NZ"}
+        assert _dimension(db, link, "device") == {"mobile": 2, "desktop": 1}
+        assert _dimension(db, link, "country") == {"NZ": 3}
+        # The rollups match a rebuild from the rewritten events (no zero rows left behind)
+        before = {d: _dimension(db, link, d) for d in ("device", "os", "browser", "country", "referrer")}
+        rebuild_rollups(db, [link.id])
+        assert {d: _dimension(db, link, d) for d in before} == before
+
+        # Nothing left to change
+        assert ReenrichJob(None, workers=0).run(db)["updated"] == 0
+
+    def test_only_geo_and_pending_rows_left_alone(self, mock_geo, db, link):
+        done = _events(db, link, [IPHONE])[0]
+        pending = _events(db, link, [IPHONE], enriched=False)[0]
+        result = ReenrichJob(None, workers=0, sources=["geo"]).run(db)
+        assert result["scanned"] == 1
+        db.refresh(done)
+        db.refresh(pending)
+        assert (done.country_code, done.device_type) == ("NZ", "unknown")
+        assert pending.country_code is None
+        with pytest.raises(ValueError):
+            ReenrichJob(None, sources=["referrer"])
+
+    def test_dry_run_writes_nothing(self, mock_geo, db, link, tmp_path):
+        event = _events(db, link, [WINDOWS])[0]
+        checkpoint = tmp_path / "ck.json"
+        assert ReenrichJob(str(checkpoint), workers=0, dry_run=True).run(db)["updated"] == 1
+        db.refresh(event)
+        assert event.country_code is None
+        assert not checkpoint.exists()
+
+    def test_resumes_from_checkpoint(self, mock_geo, db, link, tmp_path, monkeypatch):
+        events = _events(db, link, [IPHONE] * 5)
+        checkpoint = str(tmp_path / "ck.json")
+        real_changed_rows = reenrichment.changed_rows
+        windows = []
+        def interrupted(*args):
+            windows.append(1)
+            if len(windows) == 3:
+                raise KeyboardInterrupt
+            return real_changed_rows(*args)
+        monkeypatch.setattr(reenrichment, "changed_rows", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            ReenrichJob(checkpoint, chunk_size=2, workers=0).run(db)
+
+        state = load_checkpoint(checkpoint)
+        assert state["next_id"] == events[3].id and state["updated"] == 4
+        monkeypatch.setattr(reenrichment, "changed_rows", real_changed_rows)
+        result = ReenrichJob(checkpoint, chunk_size=2, workers=0).run(db)
+        assert result["resumed_from"] == events[3].id and result["updated"] == 1
+        assert load_checkpoint(checkpoint)["updated"] == 5
+        assert _dimension(db, link, "device") == {"mobile": 5}
+
+
+def test_process_pool(db, link):
+    events = _events(db, link, [IPHONE, WINDOWS])
+    result = ReenrichJob(None, chunk_size=1, workers=1, sources=["ua"]).run(db)
+    assert result["updated"] == 2
+    for event in events:
+        db.refresh(event)
+    assert [e.browser for e in events] == ["Mobile Safari", "Chrome"]
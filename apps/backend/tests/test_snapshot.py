@@ -0,0 +1,115 @@
+"""Tests for the static redirect snapshot (app/utils/snapshot.py)."""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.models.link_change import LinkChange
+from app.utils.snapshot import build_snapshot, read_tsv
+from tests.conftest import create_test_link
+
+
+def _link(db, user, code, url="https://example.com", **kwargs):
+    kwargs.setdefault("track_activity", False)
+    return create_test_link(db, owner_id=user.id, short_code=code, original_url=url, **kwargs)
+
+
+def _changed(db, *codes):
+    # What the database invalidation transport records on every link write
+    for code in codes:
+        db.add(LinkChange(kind="link", key=code, origin="test"))
+    db.commit()
+
+
+def _table(out_dir):
+    return [tuple(entry) for entry in read_tsv(str(out_dir / "redirects.tsv"))[1]]
+
+
+class TestFullBuild:
+    def test_only_links_servable_without_app(self, db, test_user, tmp_path):
+        _link(db, test_user, "b-plain", "https://b.example")
+        _link(db, test_user, "a-utm", "https://a.example", utm_source="news")
+        _link(db, test_user, "tracked", track_activity=True)
+        _link(db, test_user, "locked", password_hash="x")
+        _link(db, test_user, "members", require_login=True)
+        _link(db, test_user, "off", is_active=False)
+        _link(db, test_user, "later", expires_at=datetime.utcnow() + timedelta(days=1))
+        result = build_snapshot(db, out_dir=str(tmp_path), full=True)
+        assert result["mode"] == "full" and result["entries"] == 2
+        # Sorted by code, destinations with UTM parameters applied
+        assert _table(tmp_path) == [("a-utm", 302, "https://a.example?utm_source=news"),
+                                    ("b-plain", 302, "https://b.example")]
+
+    def test_json_and_nginx_formats(self, db, test_user, tmp_path):
+        link = _link(db, test_user, "perm", "https://perm.example")
+        link.redirect_type = 301
+        _link(db, test_user, "odd", 'https://odd.example/?q="$x"')
+        db.commit()
+        build_snapshot(db, out_dir=str(tmp_path), full=True)
+        data = json.loads((tmp_path / "redirects.json").read_text())
+        assert data == {"odd": ['https://odd.example/?q="$x"', 302], "perm": ["https://perm.example", 301]}
+        nginx = (tmp_path / "redirects.map").read_text()
+        assert 'map $uri $nolo_301 {\n    default "";\n    "/perm" "https://perm.example";\n}' in nginx
+        # Values nginx would interpolate or can't quote are left to the app
+        assert "/odd" not in nginx
+
+    def test_unknown_format_rejected(self, db, tmp_path):
+        with pytest.raises(ValueError):
+            build_snapshot(db, out_dir=str(tmp_path), formats=["xml"])
+
+
+class TestIncrementalBuild:
+    @pytest.fixture(autouse=True)
+    def database_transport(self, monkeypatch):
+        monkeypatch.setattr(settings, "INVALIDATION_TRANSPORT", "database")
+
+    def test_changes_merged_into_previous_table(self, db, test_user, tmp_path):
+        _link(db, test_user, "keep", "https://keep.example")
+        edited = _link(db, test_user, "edit", "https://old.example")
+        gone = _link(db, test_user, "gone")
+        _changed(db, "keep", "edit", "gone")
+        build_snapshot(db, out_dir=str(tmp_path))
+
+        edited.original_url = edited.redirect_url = "https://new.example"
+        gone.is_deleted = True
+        _link(db, test_user, "added", "https://added.example")
+        _changed(db, "edit", "gone", "added")
+        result = build_snapshot(db, out_dir=str(tmp_path))
+        assert result["mode"] == "incremental" and result["changed_codes"] == 3
+        assert _table(tmp_path) == [("added", 302, "https://added.example"),
+                                    ("edit", 302, "https://new.example"),
+                                    ("keep", 302, "https://keep.example")]
+        assert read_tsv(str(tmp_path / "redirects.tsv"))[0] == result["cursor"]
+
+    def test_no_changes_leaves_files_alone(self, db, test_user, tmp_path):
+        _link(db, test_user, "still")
+        build_snapshot(db, out_dir=str(tmp_path))
+        assert build_snapshot(db, out_dir=str(tmp_path))["mode"] == "unchanged"
+        assert _table(tmp_path) == [("still", 302, "https://example.com")]
+
+    def test_pruned_cursor_forces_full_rebuild(self, db, test_user, tmp_path):
+        _link(db, test_user, "one")
+        _changed(db, "one", "x", "y")
+        build_snapshot(db, out_dir=str(tmp_path))
+        _changed(db, "two", "three")
+        # Retention pruned everything up to and including the first change after the cursor
+        db.query(LinkChange).filter(LinkChange.key != "three").delete()
+        db.commit()
+        assert build_snapshot(db, out_dir=str(tmp_path))["mode"] == "full"
+
+
+class TestSnapshotEndpoint:
+    def test_build_and_download(self, admin_client, db, test_user, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "SNAPSHOT_DIR", str(tmp_path))
+        _link(db, test_user, "edge", "https://edge.example")
+        resp = admin_client.post("/api/snapshot/", params={"formats": ["json"]})
+        assert resp.json()["entries"] == 1
+        assert resp.json()["formats"] == ["tsv", "json"]
+        assert admin_client.get("/api/snapshot/json").json() == {"edge": ["https://edge.example", 302]}
+        assert admin_client.get("/api/snapshot/nginx").status_code == 404
+
+    def test_forbidden_for_regular_user(self, client):
+        assert client.post("/api/snapshot/").status_code == 400
+        assert client.get("/api/snapshot/json").status_code == 400
@@ -4,6 +4,7 @@ import pytest
 from tests.conftest import create_test_link, create_test_campaign
 import io
 import csv
+from unittest.mock import patch
 
 class TestUTMBuilder:
     def test_create_link_with_utm(self, client):
@@ -91,3 +92,41 @@ class TestUTMBuilder:
         for link_data in resp.json():
             assert link_data["utm_source"] == "bulk_source"
             assert link_data["utm_medium"] == "bulk_medium"
+
+
+class TestMaterializedRedirectUrl:
+    def test_redirect_url_stored_on_create(self, client, db):
+        from app.models.link import Link
+        resp = client.post("/api/links/", json={
+            "original_url": "https://example.com/p?x=1", "short_code": "mat", "utm_source": "news",
+        })
+        link = db.get(Link, resp.json()["id"])
+        assert link.redirect_url == "https://example.com/p?x=1&utm_source=news"
+
+    def test_redirect_url_recomputed_on_update(self, client, db, test_user):
+        link = create_test_link(db, owner_id=test_user.id, short_code="matup")
+        client.put(f"/api/links/{link.id}", json={
+            "original_url": "https://example.com/new", "utm_medium": "email",
+        })
+        db.refresh(link)
+        assert link.redirect_url == "https://example.com/new?utm_medium=email"
+
+        client.put("/api/links/bulk", json={"link_ids": [link.id], "utm_source": "bulk"})
+        db.refresh(link)
+        assert link.redirect_url == "https://example.com/new?utm_source=bulk&utm_medium=email"
+
+    def test_csv_import_stores_redirect_url(self, client, db):
+        from app.models.link import Link
+        files = {"file": ("import.csv", "original_url,short_code,utm_source\nhttps://imp.example,impmat,csv\n", "text/csv")}
+        client.post("/api/export/csv", files=files)
+        link = db.query(Link).filter(Link.short_code == "impmat").first()
+        assert link.redirect_url == "https://imp.example?utm_source=csv"
+
+    def test_redirect_reads_stored_url(self, client, db, test_user):
+        link = create_test_link(db, owner_id=test_user.id, short_code="stored", utm_source="ignored")
+        link.redirect_url = "https://stored.example/final"
+        db.commit()
+        with patch("app.crud.link.build_redirect_url") as build:
+            resp = client.get("/stored", follow_redirects=False)
+        assert resp.headers["location"] == "https://stored.example/final"
+        build.assert_not_called()
@@ -19,6 +19,17 @@ class TestPasswordVerification:
         assert resp.status_code == 200
         assert resp.json()["original_url"] == "https://secret.example.com"
 
+    def test_verify_success_counts_click(self, client, db, test_user):
+        from app.utils.click_counter import click_counter
+        link = create_test_link(
+            db, owner_id=test_user.id, short_code="pwdcnt",
+            password_hash=pwd_context.hash("correct"),
+        )
+        client.post("/api/verify/pwdcnt", json={"password": "correct"})
+        click_counter.flush(db)
+        db.refresh(link)
+        assert link.clicks == 1
+
     def test_verify_wrong_password(self, client, db, test_user):
         create_test_link(
             db, owner_id=test_user.id, short_code="pwdbad",
@@ -25,6 +25,9 @@ interface AuthContextType {
 
 const AuthContext = createContext<AuthContextType | undefined>(undefined);
 
+// Access tokens are short-lived (15 min by default); renew well before expiry
+const TOKEN_REFRESH_INTERVAL_MS = 10 * 60 * 1000;
+
 export const AuthProvider = ({ children }: { children: ReactNode }) => {
     const [user, setUser] = useState<User | null>(null);
     const [token, setToken] = useState<string | null>(null);
@@ -46,6 +49,10 @@ export const AuthProvider = ({ children }: { children: ReactNode }) => {
                     console.log("AuthContext: Setting token from URL");
                     setToken(urlToken);
                     localStorage.setItem('token', urlToken);
+                    const urlRefreshToken = params.get('refresh_token');
+                    if (urlRefreshToken) {
+                        localStorage.setItem('refreshToken', urlRefreshToken);
+                    }
 
                     // Wait for profile fetch (and potential logout on failure)
                     await fetchUserProfile(urlToken);
@@ -68,7 +75,36 @@ export const AuthProvider = ({ children }: { children: ReactNode }) => {
         initAuth();
     }, []);
 
-    const fetchUserProfile = async (authToken: string) => {
+    useEffect(() => {
+        if (!token || !localStorage.getItem('refreshToken')) return;
+        const interval = setInterval(refreshAccessToken, TOKEN_REFRESH_INTERVAL_MS);
+        return () => clearInterval(interval);
+    }, [token]);
+
+    // Exchanges the stored refresh token for a new access token; returns null if that fails
+    const refreshAccessToken = async (): Promise<string | null> => {
+        const refreshToken = localStorage.getItem('refreshToken');
+        if (!refreshToken) return null;
+        try {
+            const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:3071';
+            const response = await fetch(`${apiUrl}/api/auth/refresh`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ refresh_token: refreshToken })
+            });
+            if (!response.ok) return null;
+            const data = await response.json();
+            setToken(data.access_token);
+            localStorage.setItem('token', data.access_token);
+            localStorage.setItem('refreshToken', data.refresh_token);
+            return data.access_token;
+        } catch (error) {
+            console.error("Failed to refresh access token", error);
+            return null;
+        }
+    };
+
+    const fetchUserProfile = async (authToken: string, allowRefresh = true) => {
         try {
             const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:3071';
             const response = await fetch(`${apiUrl}/api/users/me`, {
@@ -80,6 +116,13 @@ export const AuthProvider = ({ children }: { children: ReactNode }) => {
                 const userData = await response.json();
                 setUser(userData);
                 localStorage.setItem('user', JSON.stringify(userData));
+            } else if (response.status === 401 && allowRefresh) {
+                const freshToken = await refreshAccessToken();
+                if (freshToken) {
+                    await fetchUserProfile(freshToken, false);
+                } else {
+                    logout();
+                }
             } else {
                 logout();
             }
@@ -98,9 +141,20 @@ export const AuthProvider = ({ children }: { children: ReactNode }) => {
     };
 
     const logout = () => {
+        const refreshToken = localStorage.getItem('refreshToken');
+        if (refreshToken) {
+            // Revoke it server-side too; signing out locally doesn't wait on this
+            const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:3071';
+            fetch(`${apiUrl}/api/auth/logout`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ refresh_token: refreshToken })
+            }).catch((error) => console.error("Failed to revoke refresh token", error));
+        }
         setUser(null);
         setToken(null);
         localStorage.removeItem('token');
+        localStorage.removeItem('refreshToken');
         localStorage.removeItem('user');
     };
 